@@ -1,3 +1,4 @@
+import argparse
 from datetime import datetime
 from zoneinfo import ZoneInfo
 
@@ -5,6 +6,9 @@ import fsspec
 import numcodecs
 import xarray as xr
 
+from data2ipfs.encoding import add_time_encoding
+from data2ipfs.virtual import write_references
+
 
 def get_chunks(dimensions):
     if "DEPTH" in dimensions:
@@ -24,7 +28,7 @@ def get_encoding(dataset):
     numcodecs.blosc.set_nthreads(1)  # IMPORTANT FOR DETERMINISTIC CIDs
     codec = numcodecs.Blosc("zstd", shuffle=1, clevel=6)
 
-    return {
+    encoding = {
         var: {
             "chunks": get_chunks(dataset[var].dims),
             "compressor": codec,
@@ -33,8 +37,10 @@ def get_encoding(dataset):
         if var not in dataset.dims
     }
 
+    return add_time_encoding(dataset, encoding)
+
 
-def main():
+def main(virtual=False):
     ncfiles = (
         "met_203_vmadcp_38khz.nc",
         "met_203_vmadcp_75khz.nc",
@@ -42,11 +48,8 @@ def main():
 
     root = "ipns://latest.orcestra-campaign.org"
     for ncfile in ncfiles:
-        ds = xr.open_dataset(
-            fsspec.open_local(
-                f"simplecache::{root}/raw/METEOR/ADCP/{ncfile}", chunks={}
-            )
-        )
+        url = f"{root}/raw/METEOR/ADCP/{ncfile}"
+        ds = xr.open_dataset(fsspec.open_local(f"cidcache::{url}"), chunks={})
         ds.attrs = {k: v for k, v in ds.attrs.items() if str(v) != "void"}
 
         ds.attrs["creator_name"] = "Daniel Klocke, Marcus Dengler, Robert Kopte"
@@ -82,6 +85,10 @@ def main():
             f"; {now}: converted to Zarr by Lukas Kluft (lukas.kluft@mpimet.mpg.de)"
         )
 
+        if virtual:
+            write_references(ds, url, ncfile.replace(".nc", ".zarr.json"))
+            continue
+
         ds.to_zarr(
             ncfile.replace(".nc", ".zarr"),
             mode="w",
@@ -91,4 +98,12 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(prog="met_203_vmadcp")
+    parser.add_argument(
+        "--virtual",
+        action="store_true",
+        help="write a reference manifest to the chunks of the input instead",
+    )
+    args = parser.parse_args()
+
+    main(virtual=args.virtual)
@@ -4,6 +4,9 @@ import numcodecs
 import numpy as np
 import xarray as xr
 
+from data2ipfs.encoding import add_fixed_point, add_time_encoding
+from data2ipfs.timeindex import write_time_index
+
 
 def fix_time(ds, gps_time_offset=np.timedelta64(18, "s")):
     fid = ds.attrs["flightname"]
@@ -26,16 +29,18 @@ def get_encoding(dataset):
     numcodecs.blosc.set_nthreads(1)  # IMPORTANT FOR DETERMINISTIC CIDs
     codec = numcodecs.Blosc("zstd", shuffle=1, clevel=6)
 
-    return {
+    encoding = {
         var: {
             "chunks": (2**17,),
             "compressor": codec,
         }
         if var not in dataset.dims
-        else {"chunks": -1}
+        else {"chunks": (2**17,)}
         for var in dataset.variables
     }
 
+    return add_time_encoding(dataset, encoding)
+
 
 def main():
     ds = xr.open_mfdataset(
@@ -71,9 +76,11 @@ def main():
     ds.attrs["references"] = "https://halo-db.pa.op.dlr.de/dataset/10435"
     ds.attrs["license"] = "CC-BY-4.0"
 
+    encoding = add_fixed_point(ds, get_encoding(ds), {"IRS_LAT": 1e-6, "IRS_LON": 1e-6})
     ds.chunk(TIME=-1).to_zarr(
-        "BACARDI.zarr", encoding=get_encoding(ds), mode="w", zarr_format=2
+        "BACARDI.zarr", encoding=encoding, mode="w", zarr_format=2
     )
+    write_time_index("BACARDI.zarr", dim="TIME")
 
 
 if __name__ == "__main__":
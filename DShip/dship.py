@@ -1,7 +1,12 @@
+import argparse
+
 import fsspec
 import numcodecs
 import xarray as xr
 
+from data2ipfs.encoding import add_fixed_point, add_time_encoding
+from data2ipfs.virtual import write_references
+
 
 def get_chunks(dimensions):
     match dimensions:
@@ -17,7 +22,7 @@ def get_encoding(dataset):
     numcodecs.blosc.set_nthreads(1)  # IMPORTANT FOR DETERMINISTIC CIDs
     codec = numcodecs.Blosc("zstd", shuffle=1, clevel=6)
 
-    return {
+    encoding = {
         var: {
             "chunks": get_chunks(dataset[var].dims),
             "compressor": codec,
@@ -26,14 +31,16 @@ def get_encoding(dataset):
         if var not in dataset.dims
     }
 
+    return add_time_encoding(dataset, encoding)
+
 
-def main():
-    root = "QmSvZMKWETVTymrLN32cQZqjpN1xsQkWHFj3g5jfdzzbyi"
+def main(virtual=False):
+    url = "ipfs://QmSvZMKWETVTymrLN32cQZqjpN1xsQkWHFj3g5jfdzzbyi"
     ds = xr.open_dataset(
-        fsspec.open_local(f"simplecache::ipfs://{root}"),
+        fsspec.open_local(f"cidcache::{url}"),
         engine="netcdf4",
         chunks={"time": -1},
-    ).load()
+    )
     ds.attrs["history"] = "Converted to Zarr by Lukas Kluft (lukas.kluft@mpimet.mpg.de)"
 
     ds.attrs["featureType"] = "trajectory"
@@ -47,8 +54,22 @@ def main():
     ds.attrs["history"] = "Converted to Zarr by Lukas Kluft (lukas.kluft@mpimet.mpg.de)"
     ds.attrs["license"] = "CC-BY-4.0"
 
-    ds.to_zarr("DShip.zarr", mode="w", encoding=get_encoding(ds), zarr_format=2)
+    if virtual:
+        write_references(ds, url, "DShip.zarr.json")
+        return
+
+    ds = ds.load()
+    encoding = add_fixed_point(ds, get_encoding(ds), {"lat": 1e-6, "lon": 1e-6})
+    ds.to_zarr("DShip.zarr", mode="w", encoding=encoding, zarr_format=2)
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(prog="dship")
+    parser.add_argument(
+        "--virtual",
+        action="store_true",
+        help="write a reference manifest to the chunks of the input instead",
+    )
+    args = parser.parse_args()
+
+    main(virtual=args.virtual)
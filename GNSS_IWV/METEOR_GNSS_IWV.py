@@ -1,3 +1,4 @@
+import argparse
 from datetime import datetime
 from zoneinfo import ZoneInfo
 
@@ -5,6 +6,9 @@ import fsspec
 import numcodecs
 import xarray as xr
 
+from data2ipfs.encoding import add_time_encoding
+from data2ipfs.virtual import write_references
+
 
 def get_chunks(dimensions):
     chunks = {
@@ -18,7 +22,7 @@ def get_encoding(dataset):
     numcodecs.blosc.set_nthreads(1)  # IMPORTANT FOR DETERMINISTIC CIDs
     codec = numcodecs.Blosc("zstd", shuffle=1, clevel=6)
 
-    return {
+    encoding = {
         var: {
             "chunks": get_chunks(dataset[var].dims),
             "compressor": codec,
@@ -26,15 +30,15 @@ def get_encoding(dataset):
         for var in dataset.variables
     }
 
+    return add_time_encoding(dataset, encoding)
+
 
-def main():
+def main(virtual=False):
     root = "ipns://latest.orcestra-campaign.org"
-    ds = xr.open_dataset(
-        fsspec.open_local(
-            f"simplecache::{root}/raw/METEOR/GNSS_IWV/METEOR_GNSS_IWV_20240813_000030_20240923_195300.nc"
-        ),
-        chunks={},
+    url = (
+        f"{root}/raw/METEOR/GNSS_IWV/METEOR_GNSS_IWV_20240813_000030_20240923_195300.nc"
     )
+    ds = xr.open_dataset(fsspec.open_local(f"cidcache::{url}"), chunks={})
     ds.attrs["featureType"] = "trajectory"
 
     ds.attrs["title"] = "IWV data from GNSS antenna on R/V METEOR"
@@ -52,8 +56,20 @@ def main():
         f"; {now}: converted to Zarr by Lukas Kluft (lukas.kluft@mpimet.mpg.de)"
     )
 
+    if virtual:
+        write_references(ds, url, "METEOR_GNSS_IWV.zarr.json")
+        return
+
     ds.to_zarr("METEOR_GNSS_IWV.zarr", mode="w", encoding=get_encoding(ds))
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(prog="METEOR_GNSS_IWV")
+    parser.add_argument(
+        "--virtual",
+        action="store_true",
+        help="write a reference manifest to the chunks of the input instead",
+    )
+    args = parser.parse_args()
+
+    main(virtual=args.virtual)
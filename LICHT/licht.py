@@ -1,8 +1,17 @@
+import argparse
+import glob
 from datetime import datetime
 from zoneinfo import ZoneInfo
 
 import numcodecs
-import xarray as xr
+
+from data2ipfs.append import Appender
+from data2ipfs.bitround import add_bitround, apply_bitround, print_report
+from data2ipfs.encoding import add_time_encoding
+
+
+# Information level to preserve with `--bitround` (backscatter variables)
+BITROUND = {"*bsc*": 0.99}
 
 
 def get_chunks(dimensions):
@@ -35,7 +44,7 @@ def get_encoding(dataset):
     numcodecs.blosc.set_nthreads(1)  # IMPORTANT FOR DETERMINISTIC CIDs
     codec = numcodecs.Blosc("zstd", shuffle=1, clevel=6)
 
-    return {
+    encoding = {
         var: {
             "chunks": get_chunks(dataset[var].dims),
             "compressor": codec,
@@ -44,19 +53,34 @@ def get_encoding(dataset):
         if var not in dataset.dims
     }
 
+    return add_bitround(dataset, add_time_encoding(dataset, encoding))
+
 
-def main():
+def main(append=False, bitround=False):
     for dataset in ("LICHT-LIDAR_b", "LICHT-LIDAR_t"):
-        ds = xr.open_mfdataset(
-            f"ql24??/{dataset}-*.nc",
+        appender = Appender(
+            f"{dataset}.zarr",
+            sorted(glob.glob(f"ql24??/{dataset}-*.nc")),
+            append=append,
+            bitround=BITROUND if bitround else {},
+        )
+        if appender.up_to_date:
+            continue
+
+        ds = appender.open_mfdataset(
             chunks={"time": -1, "alt": -1},
             combine_attrs="drop_conflicts",
         ).load()
-        ds.attrs["start_time"] = str(ds.time.values[0])
-        ds.attrs["stop_time"] = str(ds.time.values[-1])
+        start_time, stop_time = appender.bounds(ds)
+        ds.attrs["start_time"] = str(start_time)
+        ds.attrs["stop_time"] = str(stop_time)
 
         ds.attrs["featureType"] = "trajectoryProfile"
 
+        # Keeps the bits recorded in the store when appending to it
+        ds, report = apply_bitround(ds, appender.bitround)
+        print_report(report)
+
         if dataset.endswith("_b"):
             ds.attrs["title"] = (
                 "Raman LiDAR LICHT fast product (2min smoothing) during METEOR cruise M203"
@@ -78,8 +102,21 @@ def main():
             f"; {now}: converted to Zarr by Lukas Kluft (lukas.kluft@mpimet.mpg.de)"
         )
 
-        ds.to_zarr(f"{dataset}.zarr", mode="w", encoding=get_encoding(ds))
+        appender.to_zarr(ds, encoding=get_encoding(ds))
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(prog="licht")
+    parser.add_argument(
+        "--append",
+        action="store_true",
+        help="only append input files that are new since the last run",
+    )
+    parser.add_argument(
+        "--bitround",
+        action="store_true",
+        help="round mantissa bits without significant information (lossy)",
+    )
+    args = parser.parse_args()
+
+    main(append=args.append, bitround=args.bitround)
@@ -4,6 +4,8 @@ import pathlib
 import numcodecs
 import xarray as xr
 
+from data2ipfs.encoding import add_fixed_point, add_narrowing
+
 
 def get_encoding(dataset):
     numcodecs.blosc.set_nthreads(1)  # IMPORTANT FOR DETERMINISTIC CIDs
@@ -37,7 +39,14 @@ def merge_datasets(datasets, outfile):
 
     ds = ds.drop_vars("trajectory").load().dropna("time").chunk(time=2**18)
 
-    ds.to_zarr(outfile, encoding=get_encoding(ds), mode="w")
+    precision = {
+        var: 1e-6
+        for var in ds.variables
+        if ds[var].attrs.get("standard_name") in ("latitude", "longitude")
+    }
+    encoding = add_narrowing(ds, add_fixed_point(ds, get_encoding(ds), precision))
+
+    ds.to_zarr(outfile, encoding=encoding, mode="w")
 
 
 if __name__ == "__main__":
@@ -1,6 +1,8 @@
 import numcodecs
 import xarray as xr
 
+from data2ipfs.encoding import add_time_encoding
+
 
 def get_chunks(sizes):
     match tuple(sizes.keys()):
@@ -32,7 +34,7 @@ def get_encoding(dataset):
     numcodecs.blosc.set_nthreads(1)  # IMPORTANT FOR DETERMINISTIC CIDs
     compressor = numcodecs.Blosc("lz4")
 
-    return {
+    encoding = {
         var: {
             "compressor": compressor,
             "chunks": get_chunks(dataset[var].sizes),
@@ -40,6 +42,8 @@ def get_encoding(dataset):
         for var in dataset.variables
     }
 
+    return add_time_encoding(dataset, encoding)
+
 
 def _main():
     mrr_rainflag = xr.open_dataset(
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+import argparse
+import base64
+import concurrent.futures
+import hashlib
+import html.parser
+import json
+import pathlib
+import urllib.error
+import urllib.parse
+import urllib.request
+
+
+BASE_URL = "https://seapol.colostate.edu/data/PICCOLO/qc_data/level4/"
+BLOCKSIZE = 2**20
+
+
+class _LinkParser(html.parser.HTMLParser):
+    def __init__(self):
+        super().__init__()
+        self.links = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "a":
+            self.links += [value for name, value in attrs if name == "href" and value]
+
+
+def list_files(url, suffix=".nc"):
+    """List files in a (recursive) HTTP directory index without leaving `url`."""
+    with urllib.request.urlopen(url) as response:
+        parser = _LinkParser()
+        parser.feed(response.read().decode(errors="replace"))
+
+    files = []
+    for link in parser.links:
+        target = urllib.parse.urljoin(url, link.split("?")[0].split("#")[0])
+        if not target.startswith(url) or target == url:
+            continue  # Do not ascend to parent directories (`wget -np`)
+        if target.endswith("/"):
+            files += list_files(target, suffix)
+        elif target.endswith(suffix):
+            files.append(target)
+
+    return sorted(set(files))
+
+
+def get_digest(headers):
+    """Return the SHA-256 digest announced by the server (RFC 9530 or 3230)."""
+    for header in ("Repr-Digest", "Digest"):
+        for item in headers.get(header, "").split(","):
+            algorithm, _, value = item.strip().partition("=")
+            if algorithm.lower() == "sha-256" and value:
+                return base64.b64decode(value.strip(":")).hex()
+
+
+def get_remote_info(url):
+    request = urllib.request.Request(
+        url, method="HEAD", headers={"Want-Repr-Digest": "sha-256=10"}
+    )
+    with urllib.request.urlopen(request) as response:
+        size = response.headers.get("Content-Length")
+        return {
+            "url": url,
+            "size": int(size) if size is not None else None,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "digest": get_digest(response.headers),
+        }
+
+
+def get_validator(remote):
+    """Return a validator for `If-Range`, which has to be strong if an ETag."""
+    if remote["etag"] and not remote["etag"].startswith("W/"):
+        return remote["etag"]
+    return remote["last_modified"]
+
+
+def sha256sum(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as fp:
+        while block := fp.read(BLOCKSIZE):
+            digest.update(block)
+
+    return digest.hexdigest()
+
+
+def is_up_to_date(path, remote, entry, verify=False):
+    if entry is None or not path.exists():
+        return False
+
+    keys = ("size", "etag", "last_modified", "digest")
+    if all(remote[k] is None for k in keys):
+        return False  # nothing tells whether the remote file changed
+    if any(entry.get(k) != remote[k] for k in keys):
+        return False
+
+    if remote["size"] is not None and path.stat().st_size != remote["size"]:
+        return False
+
+    return not verify or sha256sum(path) == entry["sha256"]
+
+
+def download(url, path, remote):
+    """Download `url` to `path`, resuming a previous partial download.
+
+    The validator of the remote file is stored next to the partial download.
+    A partial download of a different version of the file is discarded, and
+    the range request is only served if the file did not change (`If-Range`).
+    """
+    partfile = path.with_name(path.name + ".part")
+    statefile = path.with_name(path.name + ".part.json")
+    validator = get_validator(remote)
+
+    offset = 0
+    if partfile.exists() and statefile.exists() and validator is not None:
+        with open(statefile) as fp:
+            if json.load(fp).get("validator") == validator:
+                offset = partfile.stat().st_size
+    if offset == 0:
+        with open(statefile, "w") as fp:
+            json.dump({"validator": validator}, fp)
+
+    size = remote["size"]
+    if size is None or offset < size:
+        headers = {}
+        if offset > 0:
+            headers = {"Range": f"bytes={offset}-", "If-Range": validator}
+        request = urllib.request.Request(url, headers=headers)
+        with urllib.request.urlopen(request) as response:
+            # Servers answer with the full file (200) if they do not support
+            # ranges or if the file changed, so start from the beginning
+            mode = "ab" if response.status == 206 else "wb"
+            with open(partfile, mode) as fp:
+                while block := response.read(BLOCKSIZE):
+                    fp.write(block)
+
+    actual = partfile.stat().st_size
+    if size is not None and actual != size:
+        if actual > size:
+            partfile.unlink()
+        raise OSError(f"Size mismatch for {url}: expected {size}, got {actual}")
+
+    digest = sha256sum(partfile)
+    if remote["digest"] is not None and digest != remote["digest"]:
+        partfile.unlink()
+        raise OSError(f"Checksum mismatch for {url}")
+
+    partfile.replace(path)
+    statefile.unlink()
+
+    return digest
+
+
+def fetch(url, datadir, entry=None, verify=False, retries=3):
+    path = datadir / pathlib.PurePosixPath(urllib.parse.urlparse(url).path).name
+    remote = get_remote_info(url)
+
+    if is_up_to_date(path, remote, entry, verify):
+        return entry, False
+
+    for attempt in range(retries):
+        try:
+            digest = download(url, path, remote)
+            break
+        except (OSError, urllib.error.URLError) as e:
+            if attempt == retries - 1:
+                raise
+            print(f"Retrying {url} ({e})")
+
+    return {**remote, "sha256": digest}, True
+
+
+def fetch_all(url, datadir, jobs=4, verify=False):
+    datadir.mkdir(parents=True, exist_ok=True)
+    manifest_path = datadir / "download_manifest.json"
+
+    manifest = {}
+    if manifest_path.exists():
+        with open(manifest_path) as fp:
+            manifest = json.load(fp)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as pool:
+        futures = {
+            pool.submit(fetch, f, datadir, manifest.get(f), verify): f
+            for f in list_files(url)
+        }
+        for future in concurrent.futures.as_completed(futures):
+            entry, fetched = future.result()
+            manifest[futures[future]] = entry
+            print(f"{futures[future]}: {'fetched' if fetched else 'up to date'}")
+
+            # Write manifest after each file, so that interrupted runs keep track
+            with open(manifest_path, "w") as fp:
+                json.dump(manifest, fp, indent=2, sort_keys=True)
+
+    return manifest
+
+
+def _main():
+    parser = argparse.ArgumentParser(prog="get_data")
+    parser.add_argument("--url", "-u", default=BASE_URL)
+    parser.add_argument(
+        "--data",
+        "-d",
+        type=pathlib.Path,
+        default="./data",
+    )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=4,
+        help="number of concurrent downloads",
+    )
+    parser.add_argument(
+        "--verify",
+        action="store_true",
+        help="re-compute checksums of already downloaded files",
+    )
+    args = parser.parse_args()
+
+    fetch_all(args.url, args.data, args.jobs, args.verify)
+
+
+if __name__ == "__main__":
+    _main()
@@ -1,2 +0,0 @@
-#!/bin/bash
-wget --recursive -nd -np --random-wait -A .nc -P data https://seapol.colostate.edu/data/PICCOLO/qc_data/level4/
@@ -2,11 +2,22 @@
 #SBATCH --account=mh0010
 #SBATCH --partition=compute
 #SBATCH --time=01:00:00
+import argparse
+import concurrent.futures
+import json
+import math
+import os
 import pathlib
+import time
 
+import dask
 import numcodecs
 import xarray as xr
 
+from data2ipfs import regions
+from data2ipfs.bitround import add_bitround, apply_bitround, print_report
+from data2ipfs.checkpoint import Journal
+
 
 common_summary = (
     "To facilitate data analysis, Level 4 products are gridded on to 1, 2 or 3D Cartesian grids. Gridding was perfomed using the [Daisho](https://github.com/mmbell/Daisho.jl) Julia package developed by Michael Bell. Daisho uses a novel beam weighting instead of the traditional linear interpolation or distance weighting. The constant range and expanding azimuthal beam volume are considered to retain finer detail near the ship and more accurately represent the measured spatial resolution at longer range. Different weightings are used depending on the desired grid spacing and geometry.\n\n"
@@ -14,6 +25,19 @@ common_summary = (
     "Data are indexed at a time resolution of 5 minutes based on the start time of the volume. The exact start and end time of each volume are also recorded for more fine-scale time analysis. Volumes without a 0.5 elevation angle were not included in the rain rate product, but were included in the other 2D and 3D products.\n\n"
 )
 
+# "missing" data flag, where the radar did not scan (see `common_summary`)
+NOT_SCANNED = -32768
+# It is declared as `_FillValue` (see `get_fill_value`), which readers mask
+NOT_SCANNED_COMMENT = (
+    'Grid cells where the radar did not scan ("missing", -32768) are stored as'
+    " _FillValue and read as missing values (NaN)."
+)
+# "empty" data flag, where no data was recorded (kept exactly by `--bitround`)
+EMPTY = -9999
+
+# Information level to preserve with `--bitround` (reflectivity)
+BITROUND = {"DBZ*": 0.99}
+
 GLOBAL_ATTRS = {
     "PICCOLO_level4_rainrate_2D.nc": {
         "title": "Level 4 Gridded SEA-POL Radar Data (rainrate 2D)",
@@ -88,20 +112,80 @@ def get_compressor():
     return numcodecs.Blosc("zstd", clevel=6)
 
 
+def get_fill_value(da):
+    """Return the "not scanned" flag as fill value for gridded radar fields.
+
+    Chunks that are entirely "not scanned" (blanking sector, out of range) are
+    then equal to the fill value and not written at all (`write_empty_chunks`).
+    The "empty" flag (`-9999`) is kept as is, as it carries information.
+    Readers decode "not scanned" cells as NaN (and integer fields as floats),
+    which `open_level4` notes in the `comment` of these variables.
+    """
+    if da.ndim > 1 and da.dims[0] == "time" and da.dtype.kind in "fi":
+        return {"_FillValue": NOT_SCANNED}
+
+    return {}
+
+
 def get_encoding(dataset):
     numcodecs.blosc.set_nthreads(1)  # IMPORTANT FOR DETERMINISTIC CIDs
 
-    return {
+    encoding = {
         var: {
             "compressor": get_compressor(),
             "chunks": get_chunks(dataset[var].sizes),
+            **get_fill_value(dataset[var]),
         }
         for var in dataset.variables
     }
 
+    return add_bitround(dataset, encoding)
+
+
+def count_skipped_chunks(store):
+    """Count chunks that were not written because they only hold fill values."""
+    skipped = 0
+    for zarray in pathlib.Path(store).glob("*/.zarray"):
+        with open(zarray) as fp:
+            meta = json.load(fp)
+
+        expected = math.prod(
+            math.ceil(s / c) for s, c in zip(meta["shape"], meta["chunks"])
+        )
+        written = sum(
+            1
+            for f in zarray.parent.rglob("*")
+            if f.is_file() and not f.name.startswith(".")
+        )
+        skipped += expected - written
+
+    return skipped
+
+
+def get_store_size(store):
+    return sum(f.stat().st_size for f in pathlib.Path(store).rglob("*") if f.is_file())
 
-for ncfile in pathlib.Path("./data").glob("*.nc"):
-    print(ncfile)
+
+def get_pool_sizes(ncfiles, jobs=None):
+    """Return number of worker processes and dask threads per worker.
+
+    Each worker holds a few chunks per thread in memory, but `volume_3D` and
+    `latlon_3D` are large enough that we keep the pool small enough to fit
+    twice the largest input file per worker into physical memory.
+    """
+    ncpus = os.cpu_count() or 1
+    memory = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    largest = max((f.stat().st_size for f in ncfiles), default=1)
+
+    workers = min(len(ncfiles), ncpus, max(1, memory // (2 * largest)))
+    if jobs is not None:
+        workers = min(workers, jobs)
+    workers = max(1, workers)
+
+    return workers, max(1, ncpus // workers)
+
+
+def open_level4(ncfile, bitround=False):
     ds = xr.open_dataset(ncfile, chunks={"time": 256})
     ds.attrs.update(creator_name=ds.creator_name.replace(" and", ""))
 
@@ -110,10 +194,209 @@ for ncfile in pathlib.Path("./data").glob("*.nc"):
         if varname not in ds.dims and da.dims == ("time",):
             ds[varname] = da.chunk(time=-1)
 
-    ds.to_zarr(
-        ncfile.with_suffix(".zarr"),
-        mode="w",
-        encoding=get_encoding(ds),
-        zarr_format=2,
-        compute=True,
+    for da in ds.variables.values():
+        if get_fill_value(da):
+            da.attrs["comment"] = " ".join(
+                filter(None, [da.attrs.get("comment"), NOT_SCANNED_COMMENT])
+            )
+
+    if bitround:
+        ds, report = apply_bitround(ds, BITROUND, preserve=(EMPTY,))
+        print(f"{ncfile}:")
+        print_report(report)
+
+    return ds
+
+
+def get_store(ncfile, outdir=None):
+    return pathlib.Path(outdir or ncfile.parent) / ncfile.with_suffix(".zarr").name
+
+
+def get_regions_manifest(store):
+    return store.with_suffix(".regions.json")
+
+
+def get_batches(todo, size):
+    """Group consecutive regions, so that each write keeps all threads busy."""
+    batch = []
+    for region in todo:
+        if len(batch) == size or (batch and batch[-1][1] != region[0]):
+            yield batch
+            batch = []
+        batch.append(region)
+    if batch:
+        yield batch
+
+
+def convert(ncfile, outdir=None, threads=1, resume=False, verify=False, bitround=False):
+    """Convert a single SEA-POL level-4 netCDF file to Zarr.
+
+    With `resume`, data is written in chunk-aligned time regions, which are
+    recorded in a checkpoint journal next to the store. Regions that are
+    already present (and match their digests with `verify`) are skipped.
+    Otherwise, the file is written at once.
+    """
+    start = time.perf_counter()
+    store = get_store(ncfile, outdir)
+    ds = open_level4(ncfile, bitround)
+    encoding = get_encoding(ds)
+    kwargs = dict(zarr_format=2, write_empty_chunks=False)
+    journal = Journal(store)
+
+    # Chunk-level parallelism within the file (compression is single-threaded)
+    with dask.config.set(scheduler="threads", num_workers=threads):
+        if not resume:
+            journal.reset()
+            ds.to_zarr(store, encoding=encoding, mode="w", **kwargs)
+        else:
+            if journal.exists():
+                variables, todo = regions.get_regions(ds, encoding)
+                done = journal.completed(verify)
+            else:
+                variables, todo = regions.prepare(ds, store, encoding, **kwargs)
+                done = set()
+
+            todo = [r for r in todo if f"time[{r[0]}:{r[1]}]" not in done]
+            for batch in get_batches(todo, threads):
+                region = (batch[0][0], batch[-1][1])
+                regions.write_region(ds, store, "time", variables, region, **kwargs)
+                for r in batch:
+                    journal.record(f"time[{r[0]}:{r[1]}]", variables, "time", r)
+
+    return {
+        "source": str(ncfile),
+        "store": str(store),
+        "seconds": round(time.perf_counter() - start, 3),
+        "bytes": get_store_size(store),
+        "skipped_chunks": count_skipped_chunks(store),
+    }
+
+
+def convert_all(
+    ncfiles, outdir=None, jobs=None, resume=False, verify=False, bitround=False
+):
+    ncfiles = sorted(ncfiles, key=lambda f: f.stat().st_size, reverse=True)
+    workers, threads = get_pool_sizes(ncfiles, jobs)
+    print(f"Converting {len(ncfiles)} files ({workers} workers x {threads} threads)")
+
+    manifest = []
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(convert, f, outdir, threads, resume, verify, bitround)
+            for f in ncfiles
+        ]
+        for future in concurrent.futures.as_completed(futures):
+            entry = future.result()
+            print(
+                f"{entry['source']}: {entry['seconds']:.1f} s"
+                f" ({entry['skipped_chunks']} empty chunks skipped)"
+            )
+            manifest.append(entry)
+
+    return sorted(manifest, key=lambda entry: entry["source"])
+
+
+def distributed(mode, ncfiles, outdir=None, bitround=False):
+    """Split the conversion of each file into regions written by many workers.
+
+    Run `plan` once, then `work` in any number of processes on nodes sharing
+    the output directory (e.g. `srun -n 16 sea_pol.py --distributed work`).
+    """
+    for ncfile in sorted(ncfiles):
+        store = get_store(ncfile, outdir)
+        manifest = get_regions_manifest(store)
+
+        match mode:
+            case "plan":
+                ds = open_level4(ncfile, bitround)
+                n = regions.plan(
+                    ds,
+                    store,
+                    manifest,
+                    encoding=get_encoding(ds),
+                    zarr_format=2,
+                    write_empty_chunks=False,
+                )
+                print(f"{ncfile}: {n} regions")
+            case "work":
+                n = regions.work(open_level4(ncfile), manifest)
+                print(f"{ncfile}: wrote {n} regions")
+            case "status":
+                print(f"{ncfile}: {regions.status(manifest)}")
+
+
+def _main():
+    parser = argparse.ArgumentParser(prog="sea_pol")
+    parser.add_argument(
+        "--data",
+        "-d",
+        type=pathlib.Path,
+        default="./data",
+    )
+    parser.add_argument(
+        "--products",
+        "-p",
+        type=pathlib.Path,
+        default=None,
+        help="output directory (default: next to the input files)",
+    )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=None,
+        help="maximum number of worker processes (default: fit cores and memory)",
+    )
+    parser.add_argument(
+        "--manifest",
+        "-m",
+        type=pathlib.Path,
+        default="sea_pol_manifest.json",
+    )
+    parser.add_argument(
+        "--distributed",
+        choices=("plan", "work", "status"),
+        default=None,
+        help="write each file region by region from independent processes",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="journal written regions and continue interrupted conversions",
+    )
+    parser.add_argument(
+        "--verify",
+        action="store_true",
+        help="verify digests of already written chunks when resuming",
     )
+    parser.add_argument(
+        "--bitround",
+        action="store_true",
+        help="round mantissa bits without significant information (lossy)",
+    )
+    args = parser.parse_args()
+
+    if args.distributed is not None:
+        distributed(
+            args.distributed,
+            list(args.data.glob("*.nc")),
+            args.products,
+            args.bitround,
+        )
+        return
+
+    manifest = convert_all(
+        list(args.data.glob("*.nc")),
+        args.products,
+        args.jobs,
+        args.resume,
+        args.verify,
+        args.bitround,
+    )
+
+    with open(args.manifest, "w") as fp:
+        json.dump(manifest, fp, indent=2)
+
+
+if __name__ == "__main__":
+    _main()
@@ -4,6 +4,8 @@ import numcodecs
 import numpy as np
 import xarray as xr
 
+from data2ipfs.encoding import add_time_encoding
+
 
 def get_chunks(sizes):
     match tuple(sizes.keys()):
@@ -26,7 +28,7 @@ def get_encoding(dataset):
     numcodecs.blosc.set_nthreads(1)  # IMPORTANT FOR DETERMINISTIC CIDs
     compressor = numcodecs.Blosc("zstd", clevel=6)
 
-    return {
+    encoding = {
         var: {
             "compressor": compressor,
             "chunks": get_chunks(dataset[var].sizes),
@@ -34,6 +36,8 @@ def get_encoding(dataset):
         for var in dataset.variables
     }
 
+    return add_time_encoding(dataset, encoding)
+
 
 def fix_time(ds, gps_time_offset=np.timedelta64(18, "s")):
     fid = pathlib.Path(ds.encoding["source"]).name
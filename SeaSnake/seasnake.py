@@ -1,8 +1,13 @@
+import argparse
+
 import fsspec
 import numcodecs
 import numpy as np
 import xarray as xr
 
+from data2ipfs.encoding import add_time_encoding
+from data2ipfs.virtual import write_references
+
 
 def get_chunks(dimensions):
     match dimensions:
@@ -27,7 +32,7 @@ def get_encoding(dataset):
     numcodecs.blosc.set_nthreads(1)  # IMPORTANT FOR DETERMINISTIC CIDs
     codec = numcodecs.Blosc("zstd", shuffle=1, clevel=6)
 
-    return {
+    encoding = {
         var: {
             "chunks": get_chunks(dataset[var].dims),
             "compressor": codec,
@@ -36,22 +41,37 @@ def get_encoding(dataset):
         if var not in dataset.dims
     }
 
+    return add_time_encoding(dataset, encoding)
 
-def main():
-    cid = "QmQCwR1GfrVkJojVnpf5WXyTzaN7bspXDxaGRhS6ukWhrs"
+
+def main(virtual=False):
+    url = "ipfs://QmQCwR1GfrVkJojVnpf5WXyTzaN7bspXDxaGRhS6ukWhrs"
     ds = xr.open_dataset(
-        fsspec.open_local(f"simplecache::ipfs://{cid}"),
+        fsspec.open_local(f"cidcache::{url}"),
         engine="netcdf4",
         chunks={"time": -1},
-    ).load()
+    )
 
     ds.attrs["references"] = ds.attrs["references"].replace(r"\n", " ")
     ds.attrs["license"] = "CC-BY-4.0"
 
+    if virtual:
+        write_references(ds, url, "met_203_1_SeaSnake.zarr.json")
+        return
+
+    ds = ds.load()
     ds.to_zarr(
         "met_203_1_SeaSnake.zarr", mode="w", encoding=get_encoding(ds), zarr_format=2
     )
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(prog="seasnake")
+    parser.add_argument(
+        "--virtual",
+        action="store_true",
+        help="write a reference manifest to the chunks of the input instead",
+    )
+    args = parser.parse_args()
+
+    main(virtual=args.virtual)
@@ -7,6 +7,9 @@ import numpy as np
 import pandas as pd
 import xarray as xr
 
+from data2ipfs.encoding import add_time_encoding
+from data2ipfs.listing import filesystem
+
 
 def get_chunks(dimensions):
     chunks = {
@@ -20,7 +23,7 @@ def get_encoding(dataset):
     numcodecs.blosc.set_nthreads(1)  # IMPORTANT FOR DETERMINISTIC CIDs
     codec = numcodecs.Blosc("zstd", shuffle=1, clevel=6)
 
-    return {
+    encoding = {
         var: {
             "chunks": get_chunks(dataset[var].dims),
             "compressor": codec,
@@ -29,6 +32,8 @@ def get_encoding(dataset):
         if var not in dataset.dims
     }
 
+    return add_time_encoding(dataset, encoding)
+
 
 def open_dataset(csvfile):
     ds = pd.read_csv(csvfile, skiprows=4).to_xarray()
@@ -73,12 +78,12 @@ def main():
     protocol = "ipns"
     root = "ipns://latest.orcestra-campaign.org/raw/METEOR/sunphotometer"
 
-    fs = fsspec.filesystem(protocol)
+    fs = filesystem(protocol)
     for subdir, pattern in zip(
         ("AOD", "SDA"), ("Meteor_24_0_*.lev??", "Meteor_24_0_*.ONEILL_??")
     ):
         for csvfile in fs.glob(f"{root}/{subdir}/{pattern}"):
-            ds = open_dataset(fsspec.open_local(f"simplecache::{protocol}://{csvfile}"))
+            ds = open_dataset(fsspec.open_local(f"cidcache::{protocol}://{csvfile}"))
 
             # Construct dataset title
             if "10" in csvfile:
@@ -1,3 +1,4 @@
+import argparse
 from datetime import datetime
 from zoneinfo import ZoneInfo
 
@@ -5,6 +6,10 @@ import fsspec
 import numcodecs
 import xarray as xr
 
+from data2ipfs.append import Appender
+from data2ipfs.delta import add_delta_filter, delta_variables, encode_deltas
+from data2ipfs.encoding import add_time_encoding
+
 
 def get_chunks(dimensions):
     match dimensions:
@@ -21,7 +26,7 @@ def get_encoding(dataset):
     numcodecs.blosc.set_nthreads(1)  # IMPORTANT FOR DETERMINISTIC CIDs
     codec = numcodecs.Blosc("zstd", shuffle=1, clevel=6)
 
-    return {
+    encoding = {
         var: {
             "chunks": get_chunks(dataset[var].dims),
             "compressor": codec,
@@ -30,8 +35,13 @@ def get_encoding(dataset):
         if var not in dataset.dims
     }
 
+    return add_delta_filter(dataset, add_time_encoding(dataset, encoding))
+
+
+REFERENCE = "v0.0"
+
 
-def main():
+def main(append=False, delta=False):
     versions = {
         ("v0.0", "Wind LiDAR LiTra S raw data (ship motion present)"),
         ("v1.0", "Wind LiDAR LiTra S heave-corrected, synchronous ship motion data"),
@@ -39,12 +49,17 @@ def main():
     }
 
     root = "ipns://latest.orcestra-campaign.org"
-    for version, title in versions:
+    # The reference version has to be written first
+    for version, title in sorted(versions):
         urlpath = fsspec.open_local(
-            f"simplecache::{root}/raw/METEOR/WindLidar-Abacus/{version}/nc_{version}/*.nc"
+            f"cidcache::{root}/raw/METEOR/WindLidar-Abacus/{version}/nc_{version}/*.nc"
         )
-        ds = xr.open_mfdataset(
-            urlpath, chunks={"time": -1}, combine_attrs="drop_conflicts"
+        appender = Appender(f"{version}.zarr", urlpath, append=append)
+        if appender.up_to_date:
+            continue
+
+        ds = appender.open_mfdataset(
+            chunks={"time": -1}, combine_attrs="drop_conflicts"
         )
 
         ds.attrs["featureType"] = "trajectoryProfile"
@@ -61,10 +76,34 @@ def main():
             f"{now}: converted to Zarr by Lukas Kluft (lukas.kluft@mpimet.mpg.de)"
         )
 
-        ds.chunk(time=-1).to_zarr(
-            f"{version}.zarr", encoding=get_encoding(ds), mode="w"
-        )
+        if version != REFERENCE and (delta or appender.append):
+            # Store variables close to the reference as lossless deltas
+            ds, report = encode_deltas(
+                ds,
+                xr.open_zarr(f"{REFERENCE}.zarr"),
+                f"{REFERENCE}.zarr",
+                variables=delta_variables(appender.existing)
+                if appender.append
+                else None,
+            )
+            for var, kind in report.items():
+                print(f"{version}/{var}: {kind}")
+
+        appender.to_zarr(ds.chunk(time=-1), encoding=get_encoding(ds))
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(prog="windlidar_abacus")
+    parser.add_argument(
+        "--append",
+        action="store_true",
+        help="only append input files that are new since the last run",
+    )
+    parser.add_argument(
+        "--delta",
+        action="store_true",
+        help=f"store variables of other versions as deltas against {REFERENCE}",
+    )
+    args = parser.parse_args()
+
+    main(append=args.append, delta=args.delta)
@@ -3,21 +3,26 @@ import pathlib
 import numcodecs
 import xarray as xr
 
+from data2ipfs.encoding import add_fixed_point, add_time_encoding
+from data2ipfs.timeindex import write_time_index
+
 
 def get_encoding(dataset):
     numcodecs.blosc.set_nthreads(1)  # IMPORTANT FOR DETERMINISTIC CIDs
     codec = numcodecs.Blosc("zstd", shuffle=1, clevel=6)
 
-    return {
+    encoding = {
         var: {
             "chunks": (2**18,),
             "compressor": codec,
         }
         if var not in dataset.dims
-        else {"chunks": dataset[var].size}
+        else {"chunks": (2**18,)}
         for var in dataset.variables
     }
 
+    return add_time_encoding(dataset, encoding)
+
 
 def main():
     datasets = [
@@ -52,9 +57,11 @@ def main():
     ds.attrs["history"] = "Converted to Zarr by Lukas Kluft (lukas.kluft@mpimet.mpg.de)"
     ds.attrs["license"] = "CC-BY-4.0"
 
+    encoding = add_fixed_point(ds, get_encoding(ds), {"IRS_LAT": 1e-6, "IRS_LON": 1e-6})
     ds.chunk(TIME=-1).to_zarr(
-        "BAHAMAS.zarr", encoding=get_encoding(ds), mode="w", zarr_format=2
+        "BAHAMAS.zarr", encoding=encoding, mode="w", zarr_format=2
     )
+    write_time_index("BAHAMAS.zarr", dim="TIME")
 
 
 if __name__ == "__main__":
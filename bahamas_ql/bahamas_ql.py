@@ -2,12 +2,15 @@ import fsspec
 import numcodecs
 import xarray as xr
 
+from data2ipfs.encoding import add_time_encoding
+from data2ipfs.listing import filesystem
+
 
 def get_encoding(dataset):
     numcodecs.blosc.set_nthreads(1)  # IMPORTANT FOR DETERMINISTIC CIDs
     codec = numcodecs.Blosc("zstd", shuffle=1, clevel=6)
 
-    return {
+    encoding = {
         var: {
             "chunks": (2**18,),
             "compressor": codec,
@@ -17,14 +20,14 @@ def get_encoding(dataset):
         for var in dataset.variables
     }
 
+    return add_time_encoding(dataset, encoding)
+
 
 def main():
     root = "QmbWMPVWkqBCKZexe9HrvCztCyPUPyPRSsCPpAUxEnovj6"
     datasets = [
-        xr.open_dataset(
-            fsspec.open_local(f"simplecache::ipfs://{f}"), chunks={"tid": -1}
-        )
-        for f in sorted(fsspec.filesystem("ipfs").glob(f"{root}/HALO-2024?????/*.nc"))
+        xr.open_dataset(fsspec.open_local(f"cidcache::ipfs://{f}"), chunks={"tid": -1})
+        for f in sorted(filesystem("ipfs").glob(f"{root}/HALO-2024?????/*.nc"))
     ]
     ds = (
         xr.concat(datasets, dim="tid", combine_attrs="drop_conflicts")
@@ -1,3 +1,4 @@
+import argparse
 from datetime import datetime
 from zoneinfo import ZoneInfo
 
@@ -5,6 +6,14 @@ import fsspec
 import numcodecs
 import xarray as xr
 
+from data2ipfs.append import Appender
+from data2ipfs.bitround import add_bitround, apply_bitround, print_report
+from data2ipfs.encoding import add_time_encoding
+
+
+# Information level to preserve with `--bitround`
+BITROUND = {"beta_raw": 0.99}
+
 
 def get_chunks(dimensions):
     match dimensions:
@@ -35,7 +44,7 @@ def get_encoding(dataset):
     numcodecs.blosc.set_nthreads(1)  # IMPORTANT FOR DETERMINISTIC CIDs
     codec = numcodecs.Blosc("zstd", shuffle=1, clevel=6)
 
-    return {
+    encoding = {
         var: {
             "chunks": get_chunks(dataset[var].dims),
             "compressor": codec,
@@ -44,14 +53,21 @@ def get_encoding(dataset):
         if var not in dataset.dims
     }
 
+    return add_bitround(dataset, add_time_encoding(dataset, encoding))
 
-def main():
+
+def main(append=False, bitround=False):
     root = "ipns://latest.orcestra-campaign.org"
-    ds = xr.open_mfdataset(
-        fsspec.open_local(f"simplecache::{root}/raw/METEOR/ceilometer/*/*.nc"),
-        combine_attrs="drop_conflicts",
-        data_vars="all",
+    appender = Appender(
+        "CHM170158.zarr",
+        fsspec.open_local(f"cidcache::{root}/raw/METEOR/ceilometer/*/*.nc"),
+        append=append,
+        bitround=BITROUND if bitround else {},
     )
+    if appender.up_to_date:
+        return
+
+    ds = appender.open_mfdataset(combine_attrs="drop_conflicts", data_vars="all")
 
     # Merge coordinates from DShip data
     dship = xr.open_dataset(
@@ -65,6 +81,10 @@ def main():
     )
     ds.attrs["featureType"] = "trajectoryProfile"
 
+    # Keeps the bits recorded in the store when appending to it
+    ds, report = apply_bitround(ds, appender.bitround)
+    print_report(report)
+
     ds.attrs["title"] = (
         "Ceilometer (CHM15k Nimbus) measurements during METEOR cruise M203"
     )
@@ -79,10 +99,21 @@ def main():
         f"{now}: converted to Zarr by Lukas Kluft (lukas.kluft@mpimet.mpg.de)"
     )
 
-    ds.chunk(time=2**18).to_zarr(
-        "CHM170158.zarr", encoding=get_encoding(ds), mode="w", zarr_format=2
-    )
+    appender.to_zarr(ds.chunk(time=2**18), encoding=get_encoding(ds), zarr_format=2)
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(prog="ceilometer")
+    parser.add_argument(
+        "--append",
+        action="store_true",
+        help="only append input files that are new since the last run",
+    )
+    parser.add_argument(
+        "--bitround",
+        action="store_true",
+        help="round mantissa bits without significant information (lossy)",
+    )
+    args = parser.parse_args()
+
+    main(append=args.append, bitround=args.bitround)
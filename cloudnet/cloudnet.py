@@ -1,8 +1,14 @@
-import fsspec
+import concurrent.futures
+
 import numcodecs
 import numpy as np
 import xarray as xr
 
+from data2ipfs.align import merge_sorted
+from data2ipfs.encoding import add_narrowing, add_time_encoding
+from data2ipfs.listing import filesystem
+from data2ipfs.multistore import open_stores
+
 
 def get_chunks(sizes):
     match tuple(sizes.keys()):
@@ -11,6 +17,11 @@ def get_chunks(sizes):
                 "model_time": sizes["model_time"],
                 "model_height": sizes["model_height"],
             }
+        case ("model_time", "model_level"):
+            chunks = {
+                "model_time": sizes["model_time"],
+                "model_level": sizes["model_level"],
+            }
         case ("time", "height"):
             chunks = {
                 "time": 2**12,
@@ -34,7 +45,7 @@ def get_encoding(dataset):
     numcodecs.blosc.set_nthreads(1)  # IMPORTANT FOR DETERMINISTIC CIDs
     compressor = numcodecs.Blosc("lz4")
 
-    return {
+    encoding = {
         var: {
             "compressor": compressor,
             "chunks": get_chunks(dataset[var].sizes),
@@ -42,6 +53,17 @@ def get_encoding(dataset):
         for var in dataset.variables
     }
 
+    return add_time_encoding(dataset, add_narrowing(dataset, encoding))
+
+
+def open_stores_ipfs(root_cid, chunks={}, preprocess=None):
+    fs = filesystem("ipfs")
+    return open_stores(
+        ["ipfs://" + name for name in fs.ls(root_cid, detail=False)],
+        preprocess=preprocess,
+        chunks=chunks,
+    )
+
 
 def open_mfdataset_ipfs(
     root_cid,
@@ -50,14 +72,8 @@ def open_mfdataset_ipfs(
     combine_attrs="drop_conflicts",
     preprocess=lambda a: a,
 ):
-    fs = fsspec.filesystem("ipfs")
     return xr.concat(
-        [
-            xr.open_dataset(
-                "ipfs://" + item["name"], engine="zarr", chunks=chunks
-            ).pipe(preprocess)
-            for item in fs.listdir(root_cid)
-        ],
+        open_stores_ipfs(root_cid, chunks=chunks, preprocess=preprocess),
         dim=concat_dim,
         combine_attrs=combine_attrs,
         data_vars="all",
@@ -82,40 +98,94 @@ def drop_model_vars(ds):
     return ds.drop_vars(model_vars)
 
 
-def _main():
-    cloudnet_class = open_mfdataset_ipfs(
-        "QmTj1JARz8xF35YpL3kjxHF5BGBEcoN3aVhNeEarXDQZYF"
-    ).pipe(round_datetime)
-    cloudnet_drop_reff = open_mfdataset_ipfs(
-        "QmaxVaUUSyx2ouPMq4v2K87jZE4fekeP6eMncv8pbcNNKQ"
-    ).pipe(round_datetime)
-    cloudnet_crys_reff = open_mfdataset_ipfs(
-        "Qmf8U3SgJ62faETgeZ5uRduECPNNfzQKAgMLY9wAL3dPog"
-    ).pipe(round_datetime)
-    cloudnet_iwc = open_mfdataset_ipfs(
-        "QmRu2PQp9AWF2cagF5UvJjNZn77p3cyg4kZcWAeBq2QETk"
-    ).pipe(round_datetime)
-    cloudnet_lwc = open_mfdataset_ipfs(
-        "QmbJnFZgubQh3j1Xco1Ex2fWEE1prixfH5d5V8wqC1pEC4"
-    ).pipe(round_datetime)
-
-    # Drop ECMWF variables for now, because of conflicting `model_time` and `model_height` coordinates.
-    cloudnet_class_ecmwf = open_mfdataset_ipfs(
-        "QmZ3Vpi28t2QjKUWnXmPPL2y4odRwSJRU7sQHpbU5WMmTj", preprocess=drop_model_vars
+def select_model_vars(ds):
+    """Return the ECMWF variables, with model levels instead of heights.
+
+    The heights of the model levels differ from day to day, so `model_height`
+    becomes a variable along `model_time` and a new `model_level` dimension.
+    """
+    model_vars = [
+        var
+        for var in ds.variables
+        if any(dim.startswith("model_") for dim in ds[var].dims)
+    ]
+    ds = ds[model_vars].rename_dims(model_height="model_level")
+
+    return ds.assign_coords(
+        model_height=ds.model_height.expand_dims(model_time=ds.model_time)
     )
 
-    cloudnet = xr.merge(
-        [
-            cloudnet_drop_reff,
-            cloudnet_crys_reff,
-            cloudnet_iwc,
-            cloudnet_lwc,
-            cloudnet_class,
-            cloudnet_class_ecmwf,
-        ],
-        compat="override",
-        join="outer",
-    ).assign(
+
+def open_class_ecmwf(root_cid, chunks={}):
+    """Return the ECMWF classification and, separately, its model variables."""
+    datasets = open_stores_ipfs(root_cid, chunks=chunks)
+
+    cloudnet = xr.concat(
+        [drop_model_vars(ds) for ds in datasets],
+        dim="time",
+        combine_attrs="drop_conflicts",
+        data_vars="all",
+    )
+    model = xr.concat(
+        [select_model_vars(ds) for ds in datasets],
+        dim="model_time",
+        combine_attrs="drop_conflicts",
+        data_vars="all",
+    )
+
+    # Consecutive days share the forecast step at midnight
+    return cloudnet, model.drop_duplicates("model_time")
+
+
+def _main():
+    # Open all product families at once, as each is spread over many stores
+    with concurrent.futures.ThreadPoolExecutor() as pool:
+        cloudnet_class = pool.submit(
+            open_mfdataset_ipfs, "QmTj1JARz8xF35YpL3kjxHF5BGBEcoN3aVhNeEarXDQZYF"
+        )
+        cloudnet_drop_reff = pool.submit(
+            open_mfdataset_ipfs, "QmaxVaUUSyx2ouPMq4v2K87jZE4fekeP6eMncv8pbcNNKQ"
+        )
+        cloudnet_crys_reff = pool.submit(
+            open_mfdataset_ipfs, "Qmf8U3SgJ62faETgeZ5uRduECPNNfzQKAgMLY9wAL3dPog"
+        )
+        cloudnet_iwc = pool.submit(
+            open_mfdataset_ipfs, "QmRu2PQp9AWF2cagF5UvJjNZn77p3cyg4kZcWAeBq2QETk"
+        )
+        cloudnet_lwc = pool.submit(
+            open_mfdataset_ipfs, "QmbJnFZgubQh3j1Xco1Ex2fWEE1prixfH5d5V8wqC1pEC4"
+        )
+
+        # ECMWF variables go into a separate group, because of conflicting `model_time` and `model_height` coordinates.
+        cloudnet_class_ecmwf = pool.submit(
+            open_class_ecmwf, "QmZ3Vpi28t2QjKUWnXmPPL2y4odRwSJRU7sQHpbU5WMmTj"
+        )
+
+    cloudnet_class = cloudnet_class.result().pipe(round_datetime)
+    cloudnet_drop_reff = cloudnet_drop_reff.result().pipe(round_datetime)
+    cloudnet_crys_reff = cloudnet_crys_reff.result().pipe(round_datetime)
+    cloudnet_iwc = cloudnet_iwc.result().pipe(round_datetime)
+    cloudnet_lwc = cloudnet_lwc.result().pipe(round_datetime)
+    cloudnet_class_ecmwf, ecmwf = cloudnet_class_ecmwf.result()
+
+    cloudnet, report = merge_sorted(
+        {
+            "drop_reff": cloudnet_drop_reff,
+            "crys_reff": cloudnet_crys_reff,
+            "iwc": cloudnet_iwc,
+            "lwc": cloudnet_lwc,
+            "class": cloudnet_class,
+            "class_ecmwf": cloudnet_class_ecmwf,
+        }
+    )
+    for product, info in report.items():
+        if info["duplicates"] or info["unsorted"]:
+            print(
+                f"{product}: dropped {info['duplicates']} duplicated timestamps"
+                f"{' (unsorted input)' if info['unsorted'] else ''}"
+            )
+
+    cloudnet = cloudnet.assign(
         rain_attenuation_flag=lambda dx: dx.rain_attenuation_flag.assign_attrs(
             {
                 "description": "Rain attenuation flag =True (1) when the rain strongly attenuates the radar signal and echo top height does not represent cloud top anymore",
@@ -139,6 +209,20 @@ def _main():
         mode="w",
     )
 
+    ecmwf.attrs["title"] = (
+        "ECMWF model data used by Cloudnet on RV Meteor during BOWTIE"
+    )
+    ecmwf.attrs["license"] = cloudnet.attrs["license"]
+    ecmwf.attrs["project"] = cloudnet.attrs["project"]
+
+    ecmwf.load().to_zarr(
+        "cloudnet.zarr",
+        group="ecmwf",
+        encoding=get_encoding(ecmwf),
+        zarr_format=2,
+        mode="w",
+    )
+
 
 if __name__ == "__main__":
     _main()
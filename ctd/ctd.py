@@ -7,6 +7,8 @@ import numcodecs
 import numpy as np
 import xarray as xr
 
+from data2ipfs.listing import filesystem
+
 
 def get_chunks(dimensions):
     match dimensions:
@@ -55,12 +57,8 @@ def open_dataset(filename):
 def main():
     root = "QmUVBD8RjcKWKjFp9kzi42v4rtLQEJBr6vTUsH8TZ7jNRJ"
     datasets = [
-        open_dataset(fsspec.open_local(f"simplecache::ipfs://{f}"))
-        for f in sorted(
-            fsspec.filesystem("ipfs").glob(
-                f"{root}/nc/met_203_1_ctd_*.nc"
-            )
-        )
+        open_dataset(fsspec.open_local(f"cidcache::ipfs://{f}"))
+        for f in sorted(filesystem("ipfs").glob(f"{root}/nc/met_203_1_ctd_*.nc"))
     ]
     ds = xr.concat(datasets, dim="SOUNDING", combine_attrs="drop_conflicts")
     ds = ds.assign_coords(SOUNDING=range(1, ds.sizes["SOUNDING"] + 1))
@@ -0,0 +1,95 @@
+"""Merge products with (mostly) shared time axes without reindexing copies.
+
+`xr.merge(..., join="outer")` builds a union index and a reindexed copy of
+every variable before anything is written. `merge_sorted` computes the union
+time grid once from the sorted, de-duplicated time axes of all products, maps
+every product onto it with `np.searchsorted` and scatters the values straight
+into the output arrays. Variables present in more than one product are taken
+from the first one (like `compat="override"`). Other dimensions (e.g.
+`height`) are aligned with an outer join, like by `xr.merge`.
+
+Duplicated timestamps cannot be placed on a unique grid and are dropped
+(keeping the first occurrence). They are reported per product together with
+the number of grid points the product does not cover.
+
+Example:
+
+    ds, report = merge_sorted({"iwc": iwc, "lwc": lwc})
+"""
+
+import functools
+
+import numpy as np
+import xarray as xr
+from xarray.core import dtypes
+
+
+def _unique_indices(times):
+    """Return indices of the first occurrence of every time in sorted order."""
+    order = np.argsort(times, kind="stable")
+    sorted_times = times[order]
+    first = np.concatenate([[True], sorted_times[1:] != sorted_times[:-1]])
+
+    return order[first]
+
+
+def _scatter(var, dim, src, dst, size):
+    axis = var.get_axis_num(dim)
+    values = np.take(var.values, src, axis=axis)
+
+    shape = list(values.shape)
+    shape[axis] = size
+    if len(dst) == size:
+        out = np.empty(shape, dtype=values.dtype)
+    else:
+        dtype, fill_value = dtypes.maybe_promote(values.dtype)
+        out = np.full(shape, fill_value, dtype=dtype)
+
+    out[(slice(None),) * axis + (dst,)] = values
+
+    return xr.Variable(var.dims, out, var.attrs, var.encoding)
+
+
+def merge_sorted(datasets, dim="time"):
+    """Outer-merge a dict of datasets along `dim` and report dropped timestamps.
+
+    Other indexes (e.g. `height`) are outer-joined like by `xr.merge`, which
+    only copies the datasets whose indexes differ.
+    """
+    datasets = dict(
+        zip(datasets, xr.align(*datasets.values(), join="outer", exclude=[dim]))
+    )
+
+    src = {name: _unique_indices(ds[dim].values) for name, ds in datasets.items()}
+    grid = functools.reduce(
+        np.union1d, (ds[dim].values[src[name]] for name, ds in datasets.items())
+    )
+
+    first = next(iter(datasets.values()))
+    coords = {dim: xr.Variable(dim, grid, first[dim].attrs, first[dim].encoding)}
+    data_vars = {}
+    report = {}
+    for name, ds in datasets.items():
+        times = ds[dim].values
+        dst = np.searchsorted(grid, times[src[name]])
+        report[name] = {
+            "times": len(times),
+            "duplicates": len(times) - len(src[name]),
+            "unsorted": bool(np.any(times[1:] < times[:-1])),
+            "missing": len(grid) - len(dst),
+        }
+
+        for var in ds.variables:
+            if var in coords or var in data_vars:
+                continue  # first one wins
+
+            v = ds.variables[var]
+            if dim in v.dims:
+                v = _scatter(v, dim, src[name], dst, len(grid))
+
+            if var in ds.coords:
+                coords[var] = v
+            else:
+                data_vars[var] = v
+
+    return xr.Dataset(data_vars, coords, attrs=first.attrs), report
@@ -0,0 +1,254 @@
+"""Append new input files to a store instead of rebuilding it.
+
+Datasets that grow by one file per day during a campaign are converted over
+and over again. `Appender` compares the input files with a manifest in the
+output store (`.inputs.json`) and opens only the files that are new. These are
+appended along `dim`. The partial last chunk of the store is read, merged and
+written again, so the result is identical to a full rebuild. The global
+attributes are combined like `combine_attrs="drop_conflicts"` over all files,
+continuing from the state recorded in the manifest.
+
+A full rebuild happens if there is no manifest, a known input changed or
+disappeared, the new data does not start after the end of the store, its
+variables differ from those of the previous inputs (as recorded in the
+manifest, before any variables were added by the converter), or a rebuild
+would choose a different time encoding than the one of the store (e.g. as
+the times overflow its integer type, or gaps no longer allow a Delta filter).
+With a `bitround` config (see `data2ipfs.bitround`), the store is also rebuilt
+if the mantissa bits estimated from all inputs differ from the ones recorded
+in the store. Otherwise the new data is rounded to the recorded bits.
+
+Example:
+
+    appender = Appender("out.zarr", sorted(glob.glob("*.nc")), bitround=config)
+    if not appender.up_to_date:
+        ds = appender.open_mfdataset()
+        ds, report = apply_bitround(ds, appender.bitround)
+        appender.to_zarr(ds, encoding=get_encoding(ds), zarr_format=2)
+"""
+
+import functools
+import hashlib
+import json
+import pathlib
+
+import numpy as np
+import xarray as xr
+import zarr
+from xarray.core.utils import equivalent
+
+from data2ipfs.bitround import apply_bitround, recorded_keepbits
+from data2ipfs.encoding import time_encoding
+
+
+MANIFEST = ".inputs.json"
+
+
+def _sha256(path):
+    with open(path, "rb") as fp:
+        return hashlib.file_digest(fp, "sha256").hexdigest()
+
+
+def _to_json(obj):
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"Cannot serialize {type(obj)}")
+
+
+def _time_encoding(encoding):
+    """Return the parts of a time encoding that determine the stored bytes."""
+    return (
+        encoding.get("units"),
+        np.dtype(encoding["dtype"]) if "dtype" in encoding else None,
+        encoding.get("_FillValue"),
+        [f.get_config() for f in encoding.get("filters") or []],
+    )
+
+
+def drop_conflicts(attrs, result=None, dropped=()):
+    """Combine `attrs` like `combine_attrs="drop_conflicts"`.
+
+    Returns the combined attributes and the dropped keys, which can be passed
+    back in to continue with more attributes later.
+    """
+    result = dict(result or {})
+    dropped = set(dropped)
+    for a in attrs:
+        result.update(
+            {k: v for k, v in a.items() if k not in result and k not in dropped}
+        )
+        result = {k: v for k, v in result.items() if k not in a or equivalent(a[k], v)}
+        dropped |= {k for k in a if k not in result}
+
+    return result, dropped
+
+
+class Appender:
+    def __init__(self, store, paths, dim="time", append=True, bitround=None):
+        self.store = pathlib.Path(store)
+        self.dim = dim
+        self.config = bitround or {}
+        self.all_paths = [str(p) for p in paths]
+
+        self.manifest = None
+        if append:
+            try:
+                with open(self.store / MANIFEST) as fp:
+                    self.manifest = json.load(fp)
+            except FileNotFoundError:
+                pass
+
+        if self.manifest and set(self.manifest["inputs"]) <= set(self.inputs):
+            self.paths = [
+                p for k, p in self.inputs.items() if k not in self.manifest["inputs"]
+            ]
+        else:
+            self._rebuild()
+
+    @functools.cached_property
+    def inputs(self):
+        """Input paths by digest, only computed when appending or writing."""
+        return {_sha256(p): p for p in self.all_paths}
+
+    def _rebuild(self):
+        self.manifest = None
+        self.paths = list(self.all_paths)
+
+    @property
+    def append(self):
+        return self.manifest is not None
+
+    @property
+    def up_to_date(self):
+        return self.append and not self.paths
+
+    @property
+    def bitround(self):
+        """The `apply_bitround` config, the bits of the store when appending."""
+        return recorded_keepbits(self.existing) if self.append else self.config
+
+    @property
+    def existing(self):
+        """The dataset in the store, if new inputs are appended to it."""
+        if self.append:
+            return xr.open_zarr(self.store)
+
+    def _appendable(self, ds):
+        # Converters add variables after opening the inputs (e.g. positions)
+        existing = self.existing
+        variables = self.manifest.get("variables", list(existing.variables))
+        return (
+            set(ds.variables) == set(variables)
+            and ds[self.dim].values[0] > existing[self.dim].values[-1]
+            and all(
+                self._same_time_encoding(existing[var], ds[var])
+                for var in ds.variables
+                if ds[var].dtype.kind == "M" and self.dim in ds[var].dims
+            )
+        )
+
+    def _same_time_encoding(self, existing, new):
+        """Return whether a rebuild would encode the times like the store."""
+        times = xr.DataArray(
+            xr.Variable.concat([existing.variable, new.variable], self.dim),
+            name=existing.name,
+        )
+        try:
+            encoding = time_encoding(times)
+        except ValueError:
+            return False
+
+        return _time_encoding(encoding) == _time_encoding(existing.encoding)
+
+    def _same_keepbits(self, **kwargs):
+        """Return whether a rebuild would keep the bits recorded in the store.
+
+        Like in a rebuild, the bits are estimated from a sample of all inputs,
+        so that only the sampled blocks of the previous inputs are read.
+        """
+        recorded = recorded_keepbits(self.existing)
+        if not self.config and not recorded:
+            return True
+
+        with xr.open_mfdataset(self.all_paths, **kwargs) as ds:
+            _, report = apply_bitround(ds, self.config)
+
+        return {var: r["keepbits"] for var, r in report.items()} == recorded
+
+    def open_mfdataset(self, **kwargs):
+        """Open the new inputs (or all for a rebuild) with `xr.open_mfdataset`."""
+        ds = xr.open_mfdataset(self.paths, **kwargs)
+        if self.append and not (self._appendable(ds) and self._same_keepbits(**kwargs)):
+            print(f"Cannot append to {self.store}, rebuilding it")
+            self._rebuild()
+            ds = xr.open_mfdataset(self.paths, **kwargs)
+        self.variables = sorted(map(str, ds.variables))
+
+        new_attrs = []
+        for p in self.paths:
+            with xr.open_dataset(p) as f:
+                new_attrs.append(f.attrs)
+
+        if self.append:
+            state = self.manifest["attrs"], self.manifest["dropped"]
+        else:
+            state = {}, ()
+        self.attrs, self.dropped = drop_conflicts(new_attrs, *state)
+        ds.attrs = dict(self.attrs)
+
+        return ds
+
+    def bounds(self, ds):
+        """Return the first and last value of `dim` over store and `ds`."""
+        first = self.existing if self.append else ds
+        return first[self.dim].values[0], ds[self.dim].values[-1]
+
+    def _rechunk(self, variables, **kwargs):
+        """Rewrite variables whose chunks a rebuild would choose by their size.
+
+        This is the case for variables without chunks in the encoding (e.g.
+        the `time` coordinate), which are stored in a single chunk.
+        """
+        ds = xr.open_zarr(self.store)[variables].load()
+        group = zarr.open_group(self.store, mode="r+")
+        for var in variables:
+            del group[var]
+            ds[var].encoding.pop("chunks", None)
+            ds[var].encoding.pop("preferred_chunks", None)
+
+        ds.to_zarr(self.store, mode="a", **kwargs)
+
+    def to_zarr(self, ds, encoding, **kwargs):
+        if self.append:
+            # The store defines the encoding. Write a single chunk along `dim`,
+            # so that no two tasks touch the partial last chunk of the store.
+            ds.chunk({self.dim: -1}).to_zarr(
+                self.store, mode="a", append_dim=self.dim, **kwargs
+            )
+            self._rechunk(
+                [
+                    var
+                    for var in ds.variables
+                    if self.dim in ds[var].dims
+                    and "chunks" not in encoding.get(var, {})
+                ],
+                **kwargs,
+            )
+            print(f"Appended {len(self.paths)} files to {self.store}")
+        else:
+            ds.to_zarr(self.store, encoding=encoding, mode="w", **kwargs)
+
+        with open(self.store / MANIFEST, "w") as fp:
+            json.dump(
+                {
+                    "inputs": list(self.inputs),
+                    "attrs": self.attrs,
+                    "dropped": sorted(self.dropped),
+                    "variables": self.variables,
+                },
+                fp,
+                indent=2,
+                default=_to_json,
+            )
@@ -0,0 +1,226 @@
+"""Round away mantissa bits that carry no real information.
+
+Measured floats are stored with far more mantissa bits than the instrument
+resolves. These noise bits are close to random and compress poorly. Following
+Klöwer et al. (2021, https://doi.org/10.1038/s43588-021-00156-2), the
+information of every bit is estimated as the mutual information between the
+bits of neighbouring values. Bits whose information is not significant are
+treated as noise, and the mantissa is cut after the bit at which `inflevel`
+(e.g. 99 %) of the information in the mantissa is preserved.
+
+The rounding itself is done by the `numcodecs.BitRound` filter. Its error is
+bounded by half a unit in the last kept bit, i.e. a relative error of
+`2**-(keepbits + 1)`. The number of kept bits is recorded in the
+`bitround_keepbits` attribute, from which `add_bitround` adds the filter.
+
+Example:
+
+    ds, report = apply_bitround(ds, {"beta_raw": 0.99})
+    encoding = add_bitround(ds, get_encoding(ds))
+"""
+
+import fnmatch
+import math
+
+import numcodecs
+import numpy as np
+
+
+# z-score of the 99 % confidence interval of the binomial distribution
+CONFIDENCE_Z = 2.5758
+
+EXPONENT_BITS = {2: 5, 4: 8, 8: 11}
+
+
+def _uint(dtype):
+    return np.dtype(f"u{np.dtype(dtype).itemsize}")
+
+
+def _binary_entropy(p):
+    return -p * math.log2(p) - (1 - p) * math.log2(1 - p)
+
+
+def bitinformation(values, axis=-1, mask=None):
+    """Return the information of every bit (sign first) between neighbours.
+
+    Neighbours are taken along `axis`, pairs with a value outside of `mask`
+    are ignored. Information below the significance threshold for the number
+    of pairs is set to zero.
+    """
+    u = np.moveaxis(np.ascontiguousarray(values).view(_uint(values.dtype)), axis, -1)
+    a, b = u[..., :-1], u[..., 1:]
+    if mask is None:
+        a, b = a.ravel(), b.ravel()
+    else:
+        m = np.moveaxis(mask, axis, -1)
+        pairs = m[..., :-1] & m[..., 1:]
+        a, b = a[pairs], b[pairs]
+    nbits = u.dtype.itemsize * 8
+
+    info = np.zeros(nbits)
+    for i in range(nbits):
+        shift = nbits - 1 - i
+        pairs = (2 * ((a >> shift) & 1) + ((b >> shift) & 1)).astype(np.intp)
+        joint = np.bincount(pairs, minlength=4).reshape(2, 2) / pairs.size
+        independent = np.outer(joint.sum(axis=1), joint.sum(axis=0))
+        nonzero = joint > 0
+        info[i] = np.sum(
+            joint[nonzero] * np.log2(joint[nonzero] / independent[nonzero])
+        )
+
+    threshold = 1 - _binary_entropy(0.5 + 0.5 * CONFIDENCE_Z / math.sqrt(a.size))
+    info[info <= threshold] = 0
+
+    return info
+
+
+def get_keepbits(info, dtype, inflevel=0.99):
+    """Return the mantissa bits to keep `inflevel` of the information `info`."""
+    mantissa = info[1 + EXPONENT_BITS[np.dtype(dtype).itemsize] :]
+    if not mantissa.sum():
+        return mantissa.size  # no significant information, e.g. constant values
+
+    cdf = np.cumsum(mantissa) / mantissa.sum()
+
+    return max(int(np.argmax(cdf >= inflevel)) + 1, 1)
+
+
+def exact_keepbits(values, dtype):
+    """Return the mantissa bits needed to keep all `values` exactly."""
+    nmant = np.finfo(dtype).nmant
+    mantissa = np.asarray(values, dtype=dtype).view(_uint(dtype)) & ((1 << nmant) - 1)
+
+    keepbits = 0
+    for m in np.atleast_1d(mantissa).tolist():
+        if m:
+            keepbits = max(keepbits, nmant - ((m & -m).bit_length() - 1))
+
+    return keepbits
+
+
+def _sample(da, size=2**20, samples=8):
+    """Return a sample of about `size` contiguous values of `da`.
+
+    The extent along the longest dimensions is halved until the sample is
+    small enough. Along the longest dimension (usually time), the sample
+    consists of up to `samples` evenly spaced blocks, along the others of a
+    centred window. The same data always gives the same sample, which keeps
+    the analysis deterministic.
+    """
+    if da.size == 0:
+        return np.asarray(da.values)
+
+    extent = list(da.shape)
+    while math.prod(extent) > size:
+        i = int(np.argmax(extent))
+        extent[i] = max(1, extent[i] // 2)
+
+    axis = int(np.argmax(da.shape)) if da.ndim else None
+    index = {}
+    for i, (dim, n) in enumerate(zip(da.dims, da.shape)):
+        if i == axis and extent[i] < n:
+            # Blocks of at least two values, which are neighbours
+            rows = min(max(2, extent[i] // samples), n)
+            blocks = min(samples, max(1, extent[i] // rows))
+            starts = np.linspace(0, n - rows, blocks).astype(int)
+            index[dim] = np.unique(
+                np.concatenate([np.arange(s, s + rows) for s in starts])
+            )
+        else:
+            start = (n - extent[i]) // 2
+            index[dim] = slice(start, start + extent[i])
+
+    return np.asarray(da.isel(index).values)
+
+
+def _preserved(da, preserve):
+    values = [*preserve, *np.atleast_1d(da.attrs.get("flag_values", []))]
+    for key in ("_FillValue", "missing_value"):
+        for source in (da.encoding, da.attrs):
+            if key in source:
+                values.append(source[key])
+
+    return np.asarray(values, dtype=da.dtype)
+
+
+def _bitround(values, keepbits):
+    codec = numcodecs.BitRound(keepbits)
+
+    return codec.decode(codec.encode(values))
+
+
+def apply_bitround(dataset, config, preserve=(), codec=None):
+    """Set `bitround_keepbits` of the float variables in `config`.
+
+    Keys of `config` are variable names or patterns. Values are either the
+    information level to preserve or a fixed number of bits (e.g. the ones
+    recorded in a store that is appended to). Values in `preserve`, and
+    fill and flag values of a variable, are kept exactly. Returns the dataset
+    and a report with the size ratio and maximum error of a sample.
+    """
+    codec = codec or numcodecs.Blosc("zstd", shuffle=1, clevel=6)
+
+    dataset = dataset.copy()
+    report = {}
+    for pattern, setting in config.items():
+        for var in fnmatch.filter(dataset.data_vars, pattern):
+            da = dataset[var]
+            if da.dtype.kind != "f":
+                continue
+
+            values = _sample(da)
+            keep = _preserved(da, preserve)
+            if isinstance(setting, int):
+                keepbits = setting
+            else:
+                # The smoothest dimension needs the most bits
+                valid = np.isfinite(values) & ~np.isin(values, keep)
+                keepbits = max(
+                    get_keepbits(bitinformation(values, axis, valid), da.dtype, setting)
+                    for axis in range(values.ndim)
+                )
+            keepbits = max(keepbits, exact_keepbits(keep, da.dtype))
+
+            rounded = _bitround(values, keepbits)
+            error = np.abs(rounded - values)
+            relative = np.divide(
+                error, np.abs(values), out=np.zeros_like(error), where=values != 0
+            )
+            report[var] = {
+                "keepbits": keepbits,
+                "ratio": len(codec.encode(rounded)) / len(codec.encode(values)),
+                "max_error": float(np.nanmax(error, initial=0)),
+                "max_rel_error": float(np.nanmax(relative, initial=0)),
+            }
+
+            dataset[var].attrs["bitround_keepbits"] = keepbits
+
+    return dataset, report
+
+
+def recorded_keepbits(dataset):
+    """Return the `bitround_keepbits` recorded for variables of `dataset`."""
+    return {
+        var: dataset[var].attrs["bitround_keepbits"]
+        for var in dataset.data_vars
+        if "bitround_keepbits" in dataset[var].attrs
+    }
+
+
+def add_bitround(dataset, encoding):
+    """Add a BitRound filter for variables with `bitround_keepbits`."""
+    encoding = {var: dict(enc) for var, enc in encoding.items()}
+
+    for var, keepbits in recorded_keepbits(dataset).items():
+        enc = encoding.setdefault(var, {})
+        enc["filters"] = [numcodecs.BitRound(keepbits), *(enc.get("filters") or [])]
+
+    return encoding
+
+
+def print_report(report):
+    for var, r in report.items():
+        print(
+            f"{var}: {r['keepbits']} mantissa bits, {r['ratio']:.0%} of the size,"
+            f" max error {r['max_error']:.3g} ({r['max_rel_error']:.2g} relative)"
+        )
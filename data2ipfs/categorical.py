@@ -0,0 +1,134 @@
+"""Store string variables with few distinct values as integer codes.
+
+Fixed-width strings repeat the same few values (e.g. a station name or a
+firmware version) in every sample, and used to be written uncompressed.
+Variables with low cardinality are replaced by the smallest integer codes
+that index a sorted lookup table. The table is stored as CF `flag_values` and
+`flag_meanings` (whitespace replaced by `_`), and exactly in the `categories`
+attribute together with the original dtype in `categorical_dtype`. Missing
+values (e.g. NaN in object columns of pandas) get the code -1, which is not
+part of `flag_values`.
+
+All other string variables are converted to variable-length strings, which
+are written with the `vlen-utf8` filter followed by the compressor.
+
+Example:
+
+    ds, report = encode_categorical(ds)
+    ds.to_zarr("out.zarr", encoding=get_encoding(ds))
+    ds = decode_categorical(xr.open_zarr("out.zarr"))
+"""
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from data2ipfs.encoding import INT_DTYPES, _smallest_int
+
+
+MAX_CATEGORIES = 2**15
+MIN_REPEATS = 16
+
+
+def _as_str(values):
+    return np.array(
+        [v.decode() if isinstance(v, bytes) else str(v) for v in values], dtype=object
+    )
+
+
+def categorize(da, max_categories=MAX_CATEGORIES, min_repeats=MIN_REPEATS):
+    """Return `da` as integer codes, or None if it has too many distinct values.
+
+    Values have to repeat at least `min_repeats` times on average.
+    """
+    values = np.asarray(da.values).ravel()
+    missing = pd.isna(values)
+    categories, codes = np.unique(_as_str(values[~missing]), return_inverse=True)
+    if len(categories) > max_categories or len(categories) * min_repeats > da.size:
+        return None
+
+    dtype = _smallest_int(INT_DTYPES, -1, max(len(categories) - 1, 0))
+    data = np.full(values.shape, -1, dtype=dtype)
+    data[~missing] = codes
+
+    return xr.DataArray(
+        data.reshape(da.shape),
+        dims=da.dims,
+        attrs={
+            **da.attrs,
+            "flag_values": np.arange(len(categories), dtype=dtype),
+            "flag_meanings": " ".join("_".join(c.split()) or "_" for c in categories),
+            "categories": categories.tolist(),
+            "categorical_dtype": da.dtype.str,
+            **({"_FillValue": dtype.type(-1)} if missing.any() else {}),
+        },
+    )
+
+
+def encode_categorical(dataset, max_categories=MAX_CATEGORIES):
+    """Replace string and byte variables by codes or variable-length strings.
+
+    Returns the new dataset and a report per variable.
+    """
+    dataset = dataset.copy()
+    report = {}
+    for var in dataset.variables:
+        da = dataset[var]
+        if var in dataset.dims or da.dtype.kind not in "OSU":
+            continue
+        if da.dtype.kind == "O" and not all(
+            isinstance(v, (str, bytes)) or pd.isna(v) for v in da.values.ravel()
+        ):
+            continue
+
+        codes = categorize(da, max_categories)
+        if codes is not None:
+            dataset[var] = codes
+            report[var] = f"categorical ({len(codes.attrs['categories'])} values)"
+        elif da.dtype.kind != "O":
+            values = np.asarray(da.values)
+            dataset[var] = da.copy(data=_as_str(values.ravel()).reshape(values.shape))
+            report[var] = "variable-length"
+
+    return dataset, report
+
+
+def _lookup(codes, table):
+    codes = np.asarray(codes)
+    if codes.dtype.kind == "f":
+        codes = np.where(np.isnan(codes), -1, codes)  # masked by `_FillValue`
+
+    return table[codes.astype("i8")]
+
+
+def categorical_variables(dataset):
+    """Return the names of variables stored as categorical codes."""
+    return [var for var in dataset.variables if "categories" in dataset[var].attrs]
+
+
+def decode_categorical(dataset):
+    """Restore the original values of variables stored as categorical codes."""
+    dataset = dataset.copy()
+    for var in categorical_variables(dataset):
+        attrs = dict(dataset[var].attrs)
+        for key in ("flag_values", "flag_meanings", "_FillValue"):
+            attrs.pop(key, None)
+        categories = attrs.pop("categories")
+        dtype = np.dtype(attrs.pop("categorical_dtype"))
+
+        if dtype.kind == "S":
+            table = np.array([c.encode() for c in categories] + [b""], dtype=dtype)
+        else:
+            table = np.array([*categories, "" if dtype.kind == "U" else None])
+            table = table.astype(dtype)
+
+        dataset[var] = xr.apply_ufunc(
+            _lookup,
+            dataset[var],
+            kwargs={"table": table},
+            dask="parallelized",
+            output_dtypes=[dtype],
+            keep_attrs=False,
+        ).assign_attrs(attrs)
+
+    return dataset
@@ -0,0 +1,97 @@
+"""Checkpoint journal for long-running conversions.
+
+The journal is a JSON-lines file next to the output store (`<store>.journal`).
+Every completed unit of work (a variable, a region along a dimension, ...) is
+appended together with the SHA-256 digests of the chunk files it wrote. On
+resume, a unit counts as completed if all of its chunk files still exist and,
+optionally, their digests match.
+
+Example:
+
+    journal = Journal("out.zarr")
+    done = journal.completed() if resume else set()
+    for var in ds.variables:
+        if var not in done:
+            ds[[var]].to_zarr("out.zarr", mode="a")
+            journal.record(var, [var])
+"""
+
+import hashlib
+import itertools
+import json
+import os
+import pathlib
+
+
+def _sha256(path):
+    with open(path, "rb") as fp:
+        return hashlib.file_digest(fp, "sha256").hexdigest()
+
+
+def chunk_keys(store, var, dim=None, region=None):
+    """Return the keys of all chunks of `var`, or those within `region` of `dim`."""
+    store = pathlib.Path(store)
+    with open(store / var / ".zarray") as fp:
+        meta = json.load(fp)
+    with open(store / var / ".zattrs") as fp:
+        dims = json.load(fp)["_ARRAY_DIMENSIONS"]
+
+    ranges = []
+    for d, size, cs in zip(dims, meta["shape"], meta["chunks"]):
+        if d == dim and region is not None:
+            ranges.append(range(region[0] // cs, -(-region[1] // cs)))
+        else:
+            ranges.append(range(-(-size // cs)))
+
+    sep = meta.get("dimension_separator", ".")
+    return [
+        f"{var}/{sep.join(map(str, idx)) or '0'}" for idx in itertools.product(*ranges)
+    ]
+
+
+class Journal:
+    def __init__(self, store):
+        self.store = pathlib.Path(store)
+        self.path = self.store.with_name(self.store.name + ".journal")
+
+    def exists(self):
+        return self.path.exists()
+
+    def reset(self):
+        self.path.unlink(missing_ok=True)
+
+    def record(self, key, variables, dim=None, region=None):
+        """Mark `key` as completed after writing `variables` (within `region`)."""
+        files = {
+            k: _sha256(self.store / k)
+            for var in variables
+            for k in chunk_keys(self.store, var, dim, region)
+            if (self.store / k).exists()  # empty chunks may not be written
+        }
+
+        with open(self.path, "a") as fp:
+            fp.write(json.dumps({"key": key, "files": files}) + "\n")
+            fp.flush()
+            os.fsync(fp.fileno())
+
+    def completed(self, verify=False):
+        """Return keys of completed work whose chunks are (still) present."""
+        if not self.exists():
+            return set()
+
+        done = set()
+        with open(self.path) as fp:
+            for line in fp:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # incomplete last line of an interrupted run
+
+                if all(
+                    (self.store / k).exists()
+                    and (not verify or _sha256(self.store / k) == digest)
+                    for k, digest in entry["files"].items()
+                ):
+                    done.add(entry["key"])
+
+        return done
@@ -0,0 +1,227 @@
+"""Persistent, content-addressed cache for input files.
+
+`simplecache::ipfs://...` keeps a temporary copy per process, so every run of
+a converter downloads its inputs again. The `cidcache` protocol keeps whole
+files in a directory shared by all converters and runs, named by the CID of
+their content. As CIDs are immutable, a cached file never has to be checked
+for changes. IPNS paths are resolved to a CID on first access and the result
+is kept for the lifetime of the file system instance, i.e. one run.
+
+Files are downloaded to a temporary file and moved into place atomically, so
+concurrent processes never see partial files. Every access updates the mtime
+of a file and the least recently used files are evicted once the cache grows
+beyond `max_size` bytes.
+
+The protocol is registered with fsspec via an entry point, so switching a
+converter is a matter of changing the URL:
+
+    fsspec.open_local("cidcache::ipns://latest.orcestra-campaign.org/raw/...")
+
+The cache location defaults to `$XDG_CACHE_HOME/data2ipfs` (or
+`~/.cache/data2ipfs`) and can be changed with the `DATA2IPFS_CACHE`
+environment variable or storage options, e.g.
+`cidcache={"cache_storage": "/scratch/cache", "max_size": 2**40}`.
+"""
+
+import logging
+import os
+import tempfile
+
+from fsspec.implementations.cache_mapper import AbstractCacheMapper
+from fsspec.implementations.cached import SimpleCacheFileSystem
+from fsspec.implementations.local import LocalFileSystem
+
+
+logger = logging.getLogger(__name__)
+
+MAX_SIZE = 2**36
+
+
+def default_storage():
+    cache_home = os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache"))
+    return os.environ.get("DATA2IPFS_CACHE", os.path.join(cache_home, "data2ipfs"))
+
+
+class _CIDMapper(AbstractCacheMapper):
+    """Map remote paths to the CID of their content (resolved once per path)."""
+
+    def __init__(self, fs):
+        self.fs = fs
+        self.cids = {}
+
+    def __call__(self, path):
+        if path not in self.cids:
+            # The `ukey` of the IPFS/IPNS file systems is the CID of the content
+            self.cids[path] = self.fs.ukey(path)
+            logger.debug("Resolved %s to %s", path, self.cids[path])
+
+        return self.cids[path]
+
+
+def _touch(fn):
+    try:
+        os.utime(fn)
+    except FileNotFoundError:
+        pass  # evicted by another process
+
+
+def _evict(storage, max_size, keep):
+    """Remove least recently used files until `storage` fits into `max_size`."""
+    entries = sorted(
+        (e.stat().st_mtime, e.stat().st_size, e.path)
+        for e in os.scandir(storage)
+        if e.is_file() and not e.name.startswith(".")  # skip partial downloads
+    )
+    total = sum(size for _, size, _ in entries)
+
+    for _, size, fn in entries:
+        if total <= max_size:
+            break
+        if fn in keep:
+            continue
+
+        logger.debug("Evicting %s from local cache", fn)
+        try:
+            os.remove(fn)
+        except FileNotFoundError:
+            pass  # evicted by another process
+        total -= size
+
+
+def _tempfile(storage):
+    fd, tmp = tempfile.mkstemp(dir=storage, prefix=".", suffix=".part")
+    os.close(fd)
+
+    return tmp
+
+
+def _commit(fs, tmp, path, evict=True):
+    """Move a finished download into place and make room for it."""
+    fn = os.path.join(fs.storage[-1], fs._mapper(path))
+    os.replace(tmp, fn)  # atomic, concurrent downloads of a CID are identical
+    if evict:
+        _evict(fs.storage[-1], fs.max_size, keep={fn})
+
+    return fn
+
+
+class CIDCacheFileSystem(SimpleCacheFileSystem):
+    """Cache whole files persistently, keyed by the CID of their content.
+
+    Parameters
+    ----------
+    cache_storage : str
+        Directory of the cache, shared by all processes.
+    max_size : int
+        Size of the cache in bytes above which old files are evicted.
+    """
+
+    protocol = "cidcache"
+
+    def __init__(self, cache_storage=None, max_size=MAX_SIZE, **kwargs):
+        super().__init__(cache_storage=cache_storage or default_storage(), **kwargs)
+        self._mapper = _CIDMapper(self.fs)
+        self.max_size = max_size
+
+    def _check_file(self, path):
+        fn = os.path.join(self.storage[-1], self._mapper(path))
+        if os.path.exists(fn):
+            _touch(fn)
+            return fn
+
+    def open_many(self, open_files, **kwargs):
+        if "r" not in open_files.mode:
+            return super().open_many(open_files, **kwargs)
+
+        paths = [of.path for of in open_files]
+        missing = [p for p in dict.fromkeys(paths) if not self._check_file(p)]
+        if missing:
+            # Fetch all missing files at once (concurrently for async targets)
+            tmps = [_tempfile(self.storage[-1]) for _ in missing]
+            self.fs.get(missing, tmps)
+            for tmp, path in zip(tmps, missing):
+                _commit(self, tmp, path, evict=False)
+
+            # Never evict files of the same batch, they are about to be opened
+            keep = {os.path.join(self.storage[-1], self._mapper(p)) for p in paths}
+            _evict(self.storage[-1], self.max_size, keep)
+
+        return [self._open(p, mode=open_files.mode) for p in paths]
+
+    def _open(self, path, mode="rb", **kwargs):
+        if "r" not in mode:
+            return super()._open(path, mode=mode, **kwargs)
+
+        path = self._strip_protocol(path)
+        while True:
+            fn = self._check_file(path)
+            if not fn:
+                tmp = _tempfile(self.storage[-1])
+                logger.debug("Copying %s to local cache", path)
+                self.fs.get_file(path, tmp)
+                fn = _commit(self, tmp, path)
+
+            try:
+                return open(fn, mode)
+            except FileNotFoundError:
+                continue  # evicted between check and open, fetch again
+
+    def cat(self, path, recursive=False, on_error="raise", **kwargs):
+        # The parent writes downloads in place and never evicts
+        paths = self.expand_path(
+            path, recursive=recursive, maxdepth=kwargs.get("maxdepth")
+        )
+        out = {}
+        for p in paths:
+            try:
+                with self._open(p) as f:
+                    out[p] = f.read()
+            except Exception as e:
+                if on_error == "raise":
+                    raise
+                if on_error == "return":
+                    out[p] = e
+
+        if isinstance(path, str) and len(paths) == 1 and recursive is False:
+            return out[paths[0]]
+        return out
+
+    async def _cat_file(self, path, start=None, end=None, **kwargs):
+        path = self._strip_protocol(path)
+        fn = self._check_file(path)
+        if not fn:
+            tmp = _tempfile(self.storage[-1])
+            await self.fs._get_file(path, tmp, **kwargs)
+            fn = _commit(self, tmp, path)
+
+        with open(fn, "rb") as f:  # noqa ASYNC230
+            if start:
+                f.seek(start)
+            size = -1 if end is None else end - f.tell()
+            return f.read(size)
+
+    async def _cat_ranges(
+        self, paths, starts, ends, max_gap=None, on_error="return", **kwargs
+    ):
+        for path in set(paths):
+            if not self._check_file(path):
+                tmp = _tempfile(self.storage[-1])
+                await self.fs._get_file(path, tmp)
+                _commit(self, tmp, path)
+
+        lpaths = [self._check_file(p) for p in paths]
+        return LocalFileSystem().cat_ranges(
+            lpaths, starts, ends, max_gap=max_gap, on_error=on_error, **kwargs
+        )
+
+    def cat_ranges(
+        self, paths, starts, ends, max_gap=None, on_error="return", **kwargs
+    ):
+        lpaths = []
+        for path in paths:
+            with self._open(path) as f:
+                lpaths.append(f.name)
+
+        return LocalFileSystem().cat_ranges(
+            lpaths, starts, ends, max_gap=max_gap, on_error=on_error, **kwargs
+        )
@@ -0,0 +1,281 @@
+"""Find arrays that are (or could be) stored only once across Zarr stores.
+
+IPFS stores identical blocks only once, so an array written to several stores
+costs nothing extra, but only if its chunks are byte-identical. This requires
+the same chunk boundaries and the same encoding (dtype, filters, compressor,
+time units, ...). `analyze` hashes every chunk file of a set of stores and
+reports
+
+* how many bytes are unique,
+* arrays with identical chunks (already shared),
+* arrays that share only some chunks,
+* arrays with identical values but a different encoding, together with the
+  differences that prevent sharing, and
+* one-dimensional arrays that are a slice of another one (e.g. a flight of a
+  campaign-wide time series), together with a chunk size that would make the
+  blocks line up.
+
+Example:
+
+    python -m data2ipfs.dedup DShip.zarr rain_gauge.zarr ...
+"""
+
+import argparse
+import collections
+import concurrent.futures
+import hashlib
+import itertools
+import math
+import posixpath
+
+import fsspec
+import numpy as np
+import xarray as xr
+
+
+MAX_WORKERS = 32
+MAX_SLICE_VALUES = 2**26
+MIN_SLICE_VALUES = 2**10
+MIN_CHUNKSIZE = 2**10
+PROBE_VALUES = 8
+ENCODING_KEYS = (
+    "dtype",
+    "chunks",
+    "filters",
+    "compressors",
+    "_FillValue",
+    "scale_factor",
+    "add_offset",
+    "units",
+    "calendar",
+)
+
+
+def _file_digest(fs, path):
+    data = fs.cat_file(path)
+    return hashlib.sha256(data).hexdigest(), len(data)
+
+
+def chunk_digests(store, var, max_workers=MAX_WORKERS):
+    """Return the digest and size of every chunk file of `var` by chunk key."""
+    fs, path = fsspec.core.url_to_fs(str(store).rstrip("/"))
+    path = posixpath.join(path, var)
+    files = sorted(
+        f for f in fs.find(path) if not posixpath.basename(f).startswith(".")
+    )
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as pool:
+        digests = pool.map(lambda f: _file_digest(fs, f), files)
+        return {posixpath.relpath(f, path): d for f, d in zip(files, digests)}
+
+
+def value_digest(da, size=2**24):
+    """Return a digest of the (decoded) values of `da`, independent of chunks."""
+    h = hashlib.sha256(repr((da.dtype.str, da.shape)).encode())
+    if da.ndim == 0:
+        blocks = [da]
+    else:
+        rows = max(1, size * da.shape[0] // max(da.size, 1))
+        blocks = (da[i : i + rows] for i in range(0, da.shape[0], rows))
+
+    for block in blocks:
+        values = np.asarray(block.values)
+        if values.dtype.kind == "O":
+            h.update("\0".join(map(str, values.ravel())).encode())
+        else:
+            h.update(np.ascontiguousarray(values).tobytes())
+
+    return h.hexdigest()
+
+
+def scan(stores):
+    """Return chunk and value digests of all variables in `stores`."""
+    arrays = []
+    for store in stores:
+        ds = xr.open_zarr(store, create_default_indexes=False)
+        for var, da in ds.variables.items():
+            arrays.append(
+                {
+                    "name": f"{store}/{var}",
+                    "dtype": da.dtype,
+                    "encoding": {
+                        k: repr(da.encoding[k])
+                        for k in ENCODING_KEYS
+                        if k in da.encoding
+                    },
+                    "chunks": chunk_digests(store, var),
+                    "values": value_digest(da),
+                    "chunksize": da.encoding.get("chunks", da.shape)[0]
+                    if da.ndim
+                    else None,
+                    "array": da
+                    if da.ndim == 1 and MIN_SLICE_VALUES <= da.size <= MAX_SLICE_VALUES
+                    else None,
+                }
+            )
+
+    return arrays
+
+
+def _encoding_diff(a, b, ignore=()):
+    return {
+        k: (a["encoding"].get(k), b["encoding"].get(k))
+        for k in ENCODING_KEYS
+        if k not in ignore and a["encoding"].get(k) != b["encoding"].get(k)
+    }
+
+
+def _bits(values):
+    """Return `values` as unsigned integers, so that NaNs compare equal."""
+    if values.dtype.kind in "fmM" and values.dtype.itemsize in (2, 4, 8):
+        return values.view(f"u{values.dtype.itemsize}")
+    return values
+
+
+def _offsets(data, probe):
+    """Return the offsets at which `data` starts with the values `probe`."""
+    data, probe = _bits(data), _bits(probe)
+    windows = np.lib.stride_tricks.sliding_window_view(data, probe.size)
+    candidates = np.flatnonzero(windows[:, 0] == probe[0])
+    return [int(o) for o in candidates if np.array_equal(windows[o], probe)]
+
+
+def find_slices(arrays):
+    """Return one-dimensional arrays that are a slice of a longer one.
+
+    Only the first values of the shorter arrays are kept in memory and the
+    longer arrays are loaded one at a time. Matches of these probes are
+    confirmed by the value digest of the whole slice.
+    """
+    candidates = sorted(
+        (a for a in arrays if a["array"] is not None), key=lambda a: a["array"].size
+    )
+    probes = {
+        a["name"]: np.asarray(a["array"][:PROBE_VALUES].values) for a in candidates
+    }
+
+    slices = []
+    for i, b in enumerate(candidates):
+        shorter = [
+            a
+            for a in candidates[:i]
+            if a["dtype"] == b["dtype"]
+            and a["array"].size < b["array"].size
+            and a["values"] != b["values"]
+        ]
+        if not shorter:
+            continue
+
+        data = np.asarray(b["array"].values)
+        for a in shorter:
+            size, probe = a["array"].size, probes[a["name"]]
+            for offset in _offsets(data[: data.size - size + probe.size], probe):
+                window = xr.DataArray(data[offset : offset + size])
+                if value_digest(window) != a["values"]:
+                    continue
+
+                chunksize = math.gcd(offset, b["chunksize"])
+                if chunksize < MIN_CHUNKSIZE:
+                    chunksize = None
+                slices.append(
+                    {
+                        "slice": a["name"],
+                        "of": b["name"],
+                        "offset": offset,
+                        "chunksize": chunksize,
+                        "aligned": chunksize == a["chunksize"] == b["chunksize"]
+                        and not _encoding_diff(a, b),
+                        "differences": _encoding_diff(a, b, ignore=("chunks",)),
+                    }
+                )
+
+    return slices
+
+
+def analyze(stores):
+    """Return a report on the chunks shared between `stores`.
+
+    Arrays with identical chunks are reported once as shared and are
+    represented by the first of them in all other findings.
+    """
+    arrays = scan(stores)
+
+    by_chunks = collections.defaultdict(list)
+    for a in arrays:
+        by_chunks[tuple(sorted(a["chunks"].items())) or a["name"]].append(a)
+    shared = [[a["name"] for a in group] for group in by_chunks.values()]
+    unique = [group[0] for group in by_chunks.values()]
+
+    sizes = {}
+    owners = collections.defaultdict(set)
+    by_values = collections.defaultdict(list)
+    for a in unique:
+        for digest, size in a["chunks"].values():
+            sizes[digest] = size
+            owners[digest].add(a["name"])
+        by_values[a["values"]].append(a)
+
+    pairs = collections.Counter()
+    for names in owners.values():
+        for pair in itertools.combinations(sorted(names), 2):
+            pairs[pair] += 1
+    chunks = {a["name"]: len(a["chunks"]) for a in unique}
+
+    return {
+        "bytes": sum(size for a in arrays for _, size in a["chunks"].values()),
+        "unique_bytes": sum(sizes.values()),
+        "shared": [names for names in shared if len(names) > 1],
+        "partial": [
+            {"arrays": pair, "shared": n, "chunks": tuple(chunks[p] for p in pair)}
+            for pair, n in pairs.items()
+        ],
+        "near": [
+            {
+                "arrays": (a["name"], b["name"]),
+                "differences": _encoding_diff(a, b),
+            }
+            for group in by_values.values()
+            for a, b in itertools.combinations(group, 2)
+        ],
+        "slices": find_slices(unique),
+    }
+
+
+def _differences(differences):
+    return ", ".join(f"{k} {a} vs. {b}" for k, (a, b) in differences.items())
+
+
+def print_report(report):
+    saved = report["bytes"] - report["unique_bytes"]
+    print(
+        f"{report['unique_bytes']} unique of {report['bytes']} bytes"
+        f" ({saved} bytes stored only once)"
+    )
+
+    for names in report["shared"]:
+        print(f"shared: {', '.join(names)}")
+    for p in report["partial"]:
+        a, b = p["arrays"]
+        print(f"partly shared: {a} and {b} ({p['shared']} of {p['chunks']} chunks)")
+    for n in report["near"]:
+        a, b = n["arrays"]
+        print(f"same values: {a} and {b}, align {_differences(n['differences'])}")
+    for s in report["slices"]:
+        if s["aligned"]:
+            continue
+        print(f"slice: {s['slice']} is {s['of']} from {s['offset']}", end="")
+        if s["chunksize"] is None:
+            print(", the offset is not aligned to a useful chunk size")
+        else:
+            print(f", use chunks of {s['chunksize']}", end="")
+            if s["differences"]:
+                print(f" and align {_differences(s['differences'])}", end="")
+            print()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="python -m data2ipfs.dedup")
+    parser.add_argument("stores", nargs="+")
+    args = parser.parse_args()
+
+    print_report(analyze(args.stores))
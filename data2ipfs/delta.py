@@ -0,0 +1,170 @@
+"""Store variables as lossless deltas against a reference dataset.
+
+Processing versions of the same measurement often share most of their data.
+Variables that are bit-identical to the reference need no special treatment:
+with deterministic encoding they produce identical chunks, which IPFS stores
+only once. Variables that differ only slightly are stored as the XOR of their
+bit patterns with the reference. Equal bits become zeros, which compress far
+better than the data itself, and XOR-ing again restores the values exactly.
+
+Such variables carry the attributes `delta_reference` (path of the reference
+store relative to the directory of the store) and `delta_dtype`. Their arrays
+get the `data2ipfs.xor_delta` filter (`add_delta_filter`), which passes the
+data through unchanged, but is unknown to readers without this module. These
+fail to open the store instead of returning the XOR bits as values. Use
+`open_dataset` to read a store with deltas transparently.
+
+Example:
+
+    ds, report = encode_deltas(v1, xr.open_zarr("v0.zarr"), "v0.zarr")
+    ds.to_zarr("v1.zarr", encoding=add_delta_filter(ds, get_encoding(ds)))
+    v1 = open_dataset("v1.zarr")
+"""
+
+import posixpath
+
+import numcodecs
+import numpy as np
+import xarray as xr
+from numcodecs.abc import Codec
+from numcodecs.compat import ndarray_copy
+
+
+MAX_RATIO = 0.8
+
+
+class XorDelta(Codec):
+    """Filter that marks arrays holding XOR deltas against a reference."""
+
+    codec_id = "data2ipfs.xor_delta"
+
+    def encode(self, buf):
+        return buf
+
+    def decode(self, buf, out=None):
+        return ndarray_copy(buf, out)
+
+
+numcodecs.register_codec(XorDelta)
+
+
+def _uint(dtype):
+    return np.dtype(f"u{np.dtype(dtype).itemsize}")
+
+
+def xor(data, reference):
+    """Return the XOR of the bit patterns of `data` and `reference`."""
+    u = _uint(data.dtype)
+    return data.view(u) ^ reference.view(u)
+
+
+def _compressed_size(data, codec, chunksize, samples=8):
+    """Return the compressed size of up to `samples` chunks along axis 0."""
+    starts = np.unique(np.linspace(0, max(data.shape[0] - chunksize, 0), samples))
+    return sum(
+        len(codec.encode(np.ascontiguousarray(data[int(s) : int(s) + chunksize])))
+        for s in starts
+    )
+
+
+def encode_deltas(ds, ref, reference, variables=None, chunksize=2**12):
+    """Replace variables of `ds` that are close to `ref` by XOR deltas.
+
+    A variable is stored as delta if its compressed size shrinks to less than
+    `MAX_RATIO`, or if it is listed in `variables` (e.g. when appending to an
+    existing store). Returns the new dataset and a report per variable.
+    """
+    codec = numcodecs.Blosc("zstd", shuffle=1, clevel=6)
+
+    ds = ds.copy()
+    report = {}
+    for var in ds.data_vars:
+        da = ds[var]
+        if (
+            var not in ref
+            or da.dims != ref[var].dims
+            or da.dtype != ref[var].dtype
+            or da.dtype.kind != "f"
+        ):
+            report[var] = "different"
+            continue
+
+        try:
+            r = ref[var].sel({d: ds[d].values for d in da.dims if d in ds.coords})
+        except KeyError:
+            report[var] = "different"  # not on the grid of the reference
+            continue
+        if r.shape != da.shape:
+            report[var] = "different"
+            continue
+
+        delta = xor(da.data, r.data)
+        if variables is None:
+            if not delta.any():
+                report[var] = "identical"
+                continue
+
+            values = np.asarray(da.values)
+            ratio = _compressed_size(np.asarray(delta), codec, chunksize) / max(
+                _compressed_size(values, codec, chunksize), 1
+            )
+            if ratio >= MAX_RATIO:
+                report[var] = "different"
+                continue
+            report[var] = f"delta ({ratio:.0%} of the size)"
+        elif var in variables:
+            report[var] = "delta"
+        else:
+            continue
+
+        ds[var] = xr.DataArray(
+            delta,
+            dims=da.dims,
+            attrs={
+                **da.attrs,
+                "delta_reference": reference,
+                "delta_dtype": da.dtype.str,
+            },
+        )
+
+    return ds, report
+
+
+def delta_variables(ds):
+    """Return the names of variables stored as deltas."""
+    return [var for var in ds.data_vars if "delta_reference" in ds[var].attrs]
+
+
+def add_delta_filter(dataset, encoding):
+    """Add the `XorDelta` filter for variables stored as deltas."""
+    encoding = {var: dict(enc) for var, enc in encoding.items()}
+
+    for var in delta_variables(dataset):
+        enc = encoding.setdefault(var, {})
+        enc["filters"] = [XorDelta(), *(enc.get("filters") or [])]
+
+    return encoding
+
+
+def open_dataset(store, **kwargs):
+    """Open a Zarr store and resolve variables stored as deltas."""
+    ds = xr.open_zarr(store, **kwargs)
+
+    references = {}
+    for var in delta_variables(ds):
+        attrs = dict(ds[var].attrs)
+        reference = attrs.pop("delta_reference")
+        dtype = np.dtype(attrs.pop("delta_dtype"))
+
+        if reference not in references:
+            path = posixpath.join(posixpath.dirname(str(store).rstrip("/")), reference)
+            references[reference] = xr.open_zarr(path, **kwargs)
+        ref = references[reference][var].sel(
+            {d: ds[d] for d in ds[var].dims if d in ds.coords}
+        )
+
+        ds[var] = xr.DataArray(
+            xor(ds[var].data, ref.data).view(dtype), dims=ds[var].dims, attrs=attrs
+        )
+
+    return ds
@@ -0,0 +1,310 @@
+import warnings
+
+import numcodecs
+import numpy as np
+import xarray as xr
+
+
+INT_DTYPES = ("<i1", "<i2", "<i4", "<i8")
+UINT_DTYPES = ("<u1", "<u2", "<u4", "<u8")
+CF_VALUE_ATTRS = (
+    "_FillValue",
+    "missing_value",
+    "valid_min",
+    "valid_max",
+    "valid_range",
+    "flag_values",
+    "flag_masks",
+)
+TIME_UNITS = {
+    "days": 86_400_000_000_000,
+    "hours": 3_600_000_000_000,
+    "minutes": 60_000_000_000,
+    "seconds": 1_000_000_000,
+    "milliseconds": 1_000_000,
+    "microseconds": 1_000,
+    "nanoseconds": 1,
+}
+
+
+def fixed_point_encoding(da, precision, delta=None):
+    """Return encoding to store `da` as integers scaled by `precision`.
+
+    The integer width is the smallest one that holds all scaled values (the
+    minimum value is reserved as `_FillValue` for NaNs). The values are
+    encoded with the chosen dtype and decoded again, which has to restore
+    NaNs exactly and all other values to within half of `precision`. If
+    `delta` is None, a Delta filter is added to one-dimensional variables
+    whose steps are much smaller than their values (e.g. positions along a
+    trajectory).
+    """
+    scaled = (da / precision).round()
+
+    stats = xr.Dataset({"max": abs(scaled).max()})
+    if da.ndim == 1 and da.size > 1:
+        stats["step"] = abs(scaled.diff(da.dims[0])).max()
+    stats = stats.compute()
+
+    vmax = np.nan_to_num(stats["max"].values)
+    dtype = next((d for d in INT_DTYPES if vmax <= np.iinfo(d).max), None)
+    if dtype is None:
+        raise ValueError(f"Scaled values of {da.name!r} exceed 64-bit integers")
+
+    encoding = {
+        "dtype": dtype,
+        "scale_factor": precision,
+        "_FillValue": np.iinfo(dtype).min,
+    }
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)  # overflow is checked
+        encoded = xr.conventions.encode_cf_variable(
+            xr.Variable(da.dims, da.data, encoding=encoding)
+        )
+    decoded = xr.conventions.decode_cf_variable(da.name, encoded)
+
+    tolerance = precision / 2 + 4 * np.finfo("f8").eps * abs(da.variable)
+    failed = (
+        (decoded.isnull() != da.variable.isnull())
+        | (abs(decoded - da.variable) > tolerance)
+    ).sum()
+    if failed := int(failed.compute()):
+        raise ValueError(
+            f"Fixed-point round trip of {da.name!r} does not keep {failed}"
+            f" values within precision {precision}"
+        )
+
+    if delta is None:
+        delta = "step" in stats and np.nan_to_num(stats.step.values) * 16 < vmax
+
+    return {**encoding, "filters": [numcodecs.Delta(dtype)] if delta else []}
+
+
+def add_fixed_point(dataset, encoding, precision, delta=None):
+    """Add fixed-point encoding for variables with a declared `precision`.
+
+    Example:
+
+        encoding = add_fixed_point(ds, get_encoding(ds), {"lat": 1e-6, "lon": 1e-6})
+    """
+    encoding = {var: dict(enc) for var, enc in encoding.items()}
+
+    for var, p in precision.items():
+        enc = fixed_point_encoding(dataset[var], p, delta)
+        encoding[var] = {
+            **encoding.get(var, {}),
+            **enc,
+            "filters": [*(encoding.get(var, {}).get("filters") or []), *enc["filters"]],
+        }
+
+    return encoding
+
+
+def analyze_time(da):
+    """Return unit, reference, step and number of gaps of the datetimes `da`.
+
+    The unit is the coarsest one that represents all times since midnight of
+    the first day exactly. The step is the most common difference between
+    consecutive (sorted) times, every other difference counts as a gap.
+    """
+    t = np.asarray(da.values, dtype="datetime64[ns]").ravel()
+    valid = t[~np.isnat(t)]
+    reference = valid.min().astype("datetime64[D]")
+
+    offsets = (valid - reference).astype("int64")
+    unit = next(u for u, ns in TIME_UNITS.items() if not np.any(offsets % ns))
+
+    stats = {
+        "unit": unit,
+        "reference": reference,
+        "max": int(offsets.max()) // TIME_UNITS[unit],
+        "nat": valid.size < t.size,
+        "sorted": False,
+        "step": None,
+        "gaps": None,
+    }
+    if da.ndim == 1 and valid.size == t.size > 1:
+        steps, counts = np.unique(np.diff(offsets), return_counts=True)
+        stats["sorted"] = bool(steps[0] >= 0)
+        stats["step"] = np.timedelta64(int(steps[counts.argmax()]), "ns")
+        stats["gaps"] = int(counts.sum() - counts.max())
+
+    return stats
+
+
+def is_exact(da, encoding):
+    """Return whether the datetimes `da` survive a round trip through `encoding`."""
+    keys = ("units", "calendar", "dtype", "_FillValue")
+    try:
+        # xarray warns and falls back to other units if the times do not fit
+        with warnings.catch_warnings(action="error"):
+            encoded = xr.conventions.encode_cf_variable(
+                xr.Variable(
+                    da.dims,
+                    da.values,
+                    encoding={k: v for k, v in encoding.items() if k in keys},
+                )
+            )
+    except (OverflowError, ValueError, Warning):
+        return False
+    decoded = xr.conventions.decode_cf_variable(da.name, encoded)
+
+    return np.array_equal(
+        decoded.values.astype("datetime64[ns]").view("int64"),
+        np.asarray(da.values, dtype="datetime64[ns]").view("int64"),
+    )
+
+
+def time_encoding(da):
+    """Return the smallest exact integer encoding of the datetimes `da`.
+
+    A Delta filter is added to sorted, (piecewise) regular time axes, which
+    turns them into runs of a constant step. The round trip is verified to
+    restore all times exactly.
+    """
+    stats = analyze_time(da)
+
+    vmax = stats["max"]
+    dtype = next(d for d in INT_DTYPES if vmax < np.iinfo(d).max)
+
+    encoding = {
+        "units": f"{stats['unit']} since {stats['reference']}",
+        "dtype": dtype,
+    }
+    if stats["nat"]:
+        encoding["_FillValue"] = np.iinfo(dtype).min
+
+    if not is_exact(da, encoding):
+        raise ValueError(f"Time encoding of {da.name!r} is not exact: {encoding}")
+
+    delta = stats["sorted"] and stats["gaps"] * 16 < da.size
+    encoding["filters"] = [numcodecs.Delta(dtype)] if delta else []
+
+    return encoding
+
+
+def add_time_encoding(dataset, encoding):
+    """Add compact integer encoding for all datetime variables.
+
+    Example:
+
+        encoding = add_time_encoding(ds, get_encoding(ds))
+    """
+    encoding = {var: dict(enc) for var, enc in encoding.items()}
+
+    for var in dataset.variables:
+        if dataset[var].dtype.kind != "M" or np.isnat(dataset[var].values).all():
+            continue
+
+        enc = time_encoding(dataset[var])
+        encoding[var] = {
+            **encoding.get(var, {}),
+            **enc,
+            "filters": [*(encoding.get(var, {}).get("filters") or []), *enc["filters"]],
+        }
+
+    return encoding
+
+
+def _cf_values(da):
+    """Return the values of CF attributes that have to fit into the dtype."""
+    values = []
+    for key in CF_VALUE_ATTRS:
+        for source in (da.encoding, da.attrs):
+            if key in source and not isinstance(source[key], str):
+                values.extend(np.atleast_1d(source[key]).tolist())
+
+    return np.array(values, dtype="f8")
+
+
+def _smallest_int(dtypes, vmin, vmax):
+    return next(
+        np.dtype(d)
+        for d in dtypes
+        if np.iinfo(d).min <= vmin and vmax <= np.iinfo(d).max
+    )
+
+
+def narrow_encoding(da):
+    """Return encoding to store `da` in the smallest lossless dtype.
+
+    Integers get the smallest integer type of the same kind that holds all
+    values. Floats that were decoded from masked integers (e.g. netCDF
+    variables with a `_FillValue`) go back to integers, other floats to float32
+    if that represents all values exactly. Fill, valid and flag values have to
+    fit as well. Returns an empty dict if the dtype cannot be narrowed.
+    """
+    cf = _cf_values(da)
+    source = np.dtype(da.encoding.get("dtype", da.dtype))
+    if "scale_factor" in da.encoding or "add_offset" in da.encoding:
+        return {}
+
+    if da.dtype.kind in "iu":
+        stats = xr.Dataset({"min": da.min(), "max": da.max()}).compute()
+        dtype = _smallest_int(
+            INT_DTYPES if da.dtype.kind == "i" else UINT_DTYPES,
+            min([stats["min"].item(), *cf]),
+            max([stats["max"].item(), *cf]),
+        )
+        return {"dtype": dtype} if dtype.itemsize < da.dtype.itemsize else {}
+
+    if da.dtype.kind != "f":
+        return {}
+
+    stats = xr.Dataset(
+        {
+            "min": da.min(),
+            "max": da.max(),
+            "nan": da.isnull().any(),
+            "integral": ((da == da.round()) | da.isnull()).all(),
+            "float32": ((da.astype("f4") == da) | da.isnull()).all(),
+        }
+    ).compute()
+
+    if source.kind in "iu" and stats.integral and np.isfinite(stats["min"].item()):
+        vmin = min([stats["min"].item(), *cf])
+        vmax = max([stats["max"].item(), *cf])
+        fill = da.encoding.get("_FillValue")
+        if fill is None and stats.nan:
+            # Reserve the minimum of the type as `_FillValue`
+            dtype = _smallest_int(INT_DTYPES, vmin - 1, vmax)
+            fill = np.iinfo(dtype).min
+        else:
+            dtype = _smallest_int(
+                INT_DTYPES if source.kind == "i" else UINT_DTYPES, vmin, vmax
+            )
+
+        return {"dtype": dtype, **({"_FillValue": fill} if stats.nan else {})}
+
+    if (
+        da.dtype.itemsize > 4
+        and stats.float32
+        and np.array_equal(cf.astype("f4"), cf, equal_nan=True)
+    ):
+        return {"dtype": np.dtype("<f4")}
+
+    return {}
+
+
+def add_narrowing(dataset, encoding):
+    """Store data variables in their smallest lossless dtype and log changes.
+
+    Variables whose encoding already sets the dtype, scaling or filters (e.g.
+    fixed-point or bit rounding) are left alone.
+
+    Example:
+
+        encoding = add_narrowing(ds, get_encoding(ds))
+    """
+    encoding = {var: dict(enc) for var, enc in encoding.items()}
+
+    for var in dataset.data_vars:
+        enc = encoding.get(var, {})
+        if any(k in enc for k in ("dtype", "scale_factor")) or enc.get("filters"):
+            continue
+
+        narrow = narrow_encoding(dataset[var])
+        if narrow:
+            print(f"{var}: {dataset[var].dtype} -> {narrow['dtype']}")
+            encoding[var] = {**enc, **narrow}
+
+    return encoding
@@ -0,0 +1,149 @@
+"""IPFS/IPNS file systems with a persistent directory listing cache.
+
+Listing a directory through a gateway costs at least one request, and
+`listdir` one more per entry. The listing of a directory that is addressed by
+a CID can never change, so it is stored on disk and reused by all later runs.
+IPNS names are resolved to the CID of their root directory, which is kept for
+`ttl` seconds only, after which the listings of the new root are used.
+
+Globs are expanded one path component at a time, listing all candidate
+directories of a level concurrently, e.g. all flights in
+`HALO-2024?????/*.nc`.
+
+Use `filesystem` as a drop-in replacement for `fsspec.filesystem`:
+
+    fs = filesystem("ipns")
+    files = fs.glob("latest.orcestra-campaign.org/raw/METEOR/sunphotometer/*/*")
+"""
+
+import asyncio
+import fnmatch
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+from fsspec.asyn import sync_wrapper
+from ipfsspec import AsyncIPFSFileSystem, AsyncIPNSFileSystem
+from ipfsspec.async_ipfs import get_gateway
+
+from data2ipfs.cidcache import default_storage
+
+
+TTL = 600
+
+
+def _has_magic(s):
+    return any(c in s for c in "*?[")
+
+
+def _load(fn):
+    with open(fn) as fp:
+        return json.load(fp)
+
+
+def _dump(obj, fn):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(fn), prefix=".", suffix=".part")
+    with os.fdopen(fd, "w") as fp:
+        json.dump(obj, fp)
+    os.replace(tmp, fn)  # atomic, concurrent processes write identical content
+
+
+class _ListingCache:
+    def __init__(self, *args, cache_storage=None, ttl=TTL, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.listings = os.path.join(cache_storage or default_storage(), "listings")
+        os.makedirs(self.listings, exist_ok=True)
+        self.ttl = ttl
+
+    def _cache_file(self, key):
+        return os.path.join(self.listings, hashlib.sha256(key.encode()).hexdigest())
+
+    async def _resolve(self, path):
+        """Return `path` with a leading IPNS name replaced by its current CID."""
+        if self.protocol == "ipfs":
+            return path
+
+        name, _, rest = path.partition("/")
+        fn = self._cache_file(f"ipns://{name}")
+        try:
+            entry = _load(fn)
+        except FileNotFoundError:
+            entry = {"time": 0}
+
+        if time.time() - entry["time"] > self.ttl:
+            entry = {"cid": (await self._info(name))["CID"], "time": time.time()}
+            _dump(entry, fn)
+
+        return "/".join((entry["cid"], rest)) if rest else entry["cid"]
+
+    async def _ls(self, path, detail=True, **kwargs):
+        path = self._strip_protocol(path).rstrip("/")
+        cidpath = await self._resolve(path)
+
+        fn = self._cache_file(f"ipfs://{cidpath}?detail={detail}")
+        try:
+            entries = _load(fn)
+        except FileNotFoundError:
+            session = await self.set_session()
+            listing = await get_gateway("ipfs", self.gateway_addr).ls(
+                cidpath, session, detail=detail
+            )
+            # Store names relative to the directory, as it may be reached via IPNS
+            if detail:
+                entries = [{**e, "name": e["name"].rsplit("/", 1)[-1]} for e in listing]
+            else:
+                entries = [name.rsplit("/", 1)[-1] for name in listing]
+            _dump(entries, fn)
+
+        if detail:
+            return [{**e, "name": f"{path}/{e['name']}"} for e in entries]
+        else:
+            return [f"{path}/{name}" for name in entries]
+
+    ls = sync_wrapper(_ls)
+
+    async def _glob(self, path, maxdepth=None, **kwargs):
+        path = self._strip_protocol(path)
+        if not _has_magic(path) or "**" in path or maxdepth or kwargs.get("detail"):
+            return await super()._glob(path, maxdepth=maxdepth, **kwargs)
+
+        parts = path.split("/")
+        n = next(i for i, part in enumerate(parts) if _has_magic(part))
+
+        matches = ["/".join(parts[:n])]
+        for i, pattern in enumerate(parts[n:], start=n):
+            last = i == len(parts) - 1
+            # Only intermediate levels need to know which entries are directories
+            listings = await asyncio.gather(
+                *(self._ls(p, detail=not last) for p in matches)
+            )
+            entries = [e for listing in listings for e in listing]
+            if not last:
+                entries = [e["name"] for e in entries if e["type"] == "directory"]
+
+            matches = [
+                e for e in entries if fnmatch.fnmatchcase(e.rsplit("/", 1)[-1], pattern)
+            ]
+
+        return sorted(matches)
+
+
+class CachedIPFSFileSystem(_ListingCache, AsyncIPFSFileSystem):
+    pass
+
+
+class CachedIPNSFileSystem(_ListingCache, AsyncIPNSFileSystem):
+    pass
+
+
+def filesystem(protocol, **kwargs):
+    """Return an IPFS or IPNS file system with cached directory listings."""
+    match protocol:
+        case "ipfs":
+            return CachedIPFSFileSystem(**kwargs)
+        case "ipns":
+            return CachedIPNSFileSystem(**kwargs)
+        case _:
+            raise ValueError(f"Unsupported protocol: {protocol}")
@@ -0,0 +1,55 @@
+"""Open many Zarr stores at once.
+
+Opening a store costs several round trips to fetch `.zgroup`, `.zattrs` and
+the `.zarray` of every variable, which adds up for products with one store per
+day. `open_stores` opens all stores concurrently, so the total time is about
+that of the slowest store. Whether a store has consolidated metadata is looked
+up in its (cached) directory listing, which saves the failed request for
+`.zmetadata` and the fallback of xarray otherwise.
+
+Example:
+
+    datasets = open_stores(["ipfs://<CID>/a.zarr", "ipfs://<CID>/b.zarr"])
+    ds = xr.concat(datasets, dim="time")
+"""
+
+import concurrent.futures
+import functools
+
+import xarray as xr
+
+from data2ipfs.listing import filesystem
+
+
+MAX_WORKERS = 32
+
+
+def has_consolidated_metadata(url):
+    """Return whether the store has `.zmetadata`, or None if unknown."""
+    protocol, _, path = url.rpartition("://")
+    if protocol not in ("ipfs", "ipns"):
+        return None  # let xarray find out
+
+    path = path.rstrip("/")
+    return f"{path}/.zmetadata" in filesystem(protocol).ls(path, detail=False)
+
+
+def _open_store(url, preprocess, **kwargs):
+    ds = xr.open_dataset(
+        url, engine="zarr", consolidated=has_consolidated_metadata(url), **kwargs
+    )
+
+    return ds if preprocess is None else preprocess(ds)
+
+
+def open_stores(urls, preprocess=None, max_workers=MAX_WORKERS, chunks={}, **kwargs):
+    """Open Zarr stores concurrently and return the (lazy) datasets in order."""
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as pool:
+        return list(
+            pool.map(
+                functools.partial(
+                    _open_store, preprocess=preprocess, chunks=chunks, **kwargs
+                ),
+                urls,
+            )
+        )
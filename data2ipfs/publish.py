@@ -0,0 +1,391 @@
+"""Compare a store with its published version and export only new blocks.
+
+Republishing a store with `ipfs add` reads, hashes and uploads all of it, even
+if only a few objects changed (e.g. the `history` attribute in `.zattrs` and
+`.zmetadata`). `diff` computes the CIDs of all files and directories of a
+local store like `ipfs add -r --hidden --cid-version=1` (raw leaves, chunks of
+`chunk_size` bytes, balanced DAG with up to 174 links per node) and compares
+them with the CIDs in the directory blocks of the previous version, which are
+fetched from the gateway. Subtrees with the same CID are skipped.
+Directories larger than the sharding threshold of Kubo are stored as HAMT
+shards (fanout 256, murmur3 hashes of the names) on both sides.
+
+`write_car` writes the blocks of added and changed objects, and of the
+directories above them, to a CAR file. Importing it into a node that holds the
+previous version (`ipfs dag import delta.car`) completes the new version,
+whose CID is the root of the CAR.
+
+Example:
+
+    python -m data2ipfs.publish out.zarr ipns://latest.orcestra-campaign.org/.../out.zarr --car delta.car
+"""
+
+import argparse
+import os
+import posixpath
+
+import dag_cbor
+from fsspec.asyn import sync
+from ipfsspec.async_ipfs import get_gateway
+from ipfsspec.car import read_car
+from ipfsspec.unixfsv1 import Data, DataType, PBLink, PBNode
+from multiformats import CID, multihash, varint
+
+from data2ipfs.listing import filesystem
+
+
+CHUNK_SIZE = 2**18
+MAX_LINKS = 174
+SHARDING_THRESHOLD = 2**18
+HAMT_FANOUT = 256
+MURMUR3_HASH = 0x22
+
+
+def _cid(codec, data):
+    return CID("base32", 1, codec, multihash.digest(data, "sha2-256"))
+
+
+def _node(data, links):
+    return PBNode(
+        Links=[
+            PBLink(Hash=bytes(cid), Name=name, Tsize=tsize)
+            for name, cid, tsize in links
+        ],
+        Data=data.dumps(),
+    ).dumps()
+
+
+def file_blocks(path, chunk_size=CHUNK_SIZE, max_links=MAX_LINKS):
+    """Yield `(cid, block, tsize)` of all blocks of a file, the root last."""
+    nodes = []
+    with open(path, "rb") as fp:
+        block = fp.read(chunk_size)
+        while True:
+            cid = _cid("raw", block)
+            yield cid, block, len(block)
+            nodes.append((cid, len(block), len(block)))
+            block = fp.read(chunk_size)
+            if not block:
+                break
+
+    # Grouping bottom-up gives the same tree as the balanced layout of Kubo
+    while len(nodes) > 1:
+        parents = []
+        for i in range(0, len(nodes), max_links):
+            children = nodes[i : i + max_links]
+            filesize = sum(size for _, _, size in children)
+            block = _node(
+                Data(
+                    Type=DataType.File,
+                    filesize=filesize,
+                    blocksizes=[size for _, _, size in children],
+                ),
+                [("", cid, tsize) for cid, tsize, _ in children],
+            )
+            cid = _cid("dag-pb", block)
+            tsize = len(block) + sum(tsize for _, tsize, _ in children)
+            yield cid, block, tsize
+            parents.append((cid, tsize, filesize))
+        nodes = parents
+
+
+def _rotl(x, r):
+    return ((x << r) | (x >> (64 - r))) & 0xFFFFFFFFFFFFFFFF
+
+
+def _fmix(k):
+    k ^= k >> 33
+    k = (k * 0xFF51AFD7ED558CCD) & 0xFFFFFFFFFFFFFFFF
+    k ^= k >> 33
+    k = (k * 0xC4CEB9FE1A85EC53) & 0xFFFFFFFFFFFFFFFF
+    return k ^ (k >> 33)
+
+
+def murmur3_64(data):
+    """Return the first 64 bits of the x64 128-bit MurmurHash3 of `data`."""
+    mask = 0xFFFFFFFFFFFFFFFF
+    c1, c2 = 0x87C37B91114253D5, 0x4CF5AD432745937F
+    h1 = h2 = 0
+
+    nblocks = len(data) // 16
+    for i in range(nblocks):
+        k1 = int.from_bytes(data[16 * i : 16 * i + 8], "little")
+        k2 = int.from_bytes(data[16 * i + 8 : 16 * i + 16], "little")
+
+        h1 ^= _rotl(k1 * c1 & mask, 31) * c2 & mask
+        h1 = (_rotl(h1, 27) + h2) * 5 + 0x52DCE729 & mask
+        h2 ^= _rotl(k2 * c2 & mask, 33) * c1 & mask
+        h2 = (_rotl(h2, 31) + h1) * 5 + 0x38495AB5 & mask
+
+    tail = data[16 * nblocks :]
+    if len(tail) > 8:
+        k2 = int.from_bytes(tail[8:], "little")
+        h2 ^= _rotl(k2 * c2 & mask, 33) * c1 & mask
+    if tail:
+        k1 = int.from_bytes(tail[:8], "little")
+        h1 ^= _rotl(k1 * c1 & mask, 31) * c2 & mask
+
+    h1 ^= len(data)
+    h2 ^= len(data)
+    h1 = h1 + h2 & mask
+    h2 = h2 + h1 & mask
+    h1, h2 = _fmix(h1), _fmix(h2)
+
+    return h1 + h2 & mask
+
+
+def _hamt_shard(links, depth=0):
+    """Return the block of a HAMT shard and the blocks of its sub-shards.
+
+    Entries are placed by the byte of the hash of their name at `depth`.
+    Slots with more than one entry hold a sub-shard for the next byte.
+    """
+    slots = {}
+    for name, cid, tsize in links:
+        index = murmur3_64(name.encode()) >> (56 - 8 * depth) & 0xFF
+        slots.setdefault(index, []).append((name, cid, tsize))
+
+    shard_links, blocks = [], []
+    for index, entries in sorted(slots.items()):
+        if len(entries) == 1:
+            name, cid, tsize = entries[0]
+            shard_links.append((f"{index:02X}{name}", cid, tsize))
+        else:
+            block, children = _hamt_shard(entries, depth + 1)
+            cid = _cid("dag-pb", block)
+            blocks += [*children, (cid, block)]
+            shard_links.append((f"{index:02X}", cid, _tsize(block)))
+
+    bitfield = sum(1 << index for index in slots)
+    data = Data(
+        Type=DataType.HAMTShard,
+        Data=bitfield.to_bytes((bitfield.bit_length() + 7) // 8, "big"),
+        hashType=MURMUR3_HASH,
+        fanout=HAMT_FANOUT,
+    )
+
+    return _node(data, shard_links), blocks
+
+
+def _tsize(block):
+    return len(block) + sum(link.Tsize for link in PBNode.loads(block).Links)
+
+
+def directory_block(entries):
+    """Return the block of a directory with entries `{name: (cid, tsize)}`.
+
+    Also returns the blocks of the sub-shards `[(cid, block)]` of directories
+    that are stored as HAMT.
+    """
+    links = sorted(
+        ((name, cid, tsize) for name, (cid, tsize) in entries.items()),
+        key=lambda link: link[0].encode(),
+    )
+    size = sum(len(name.encode()) + len(bytes(cid)) for name, cid, _ in links)
+    if size >= SHARDING_THRESHOLD:
+        return _hamt_shard(links)
+
+    return _node(Data(Type=DataType.Directory), links), []
+
+
+def local_tree(store, chunk_size=CHUNK_SIZE):
+    """Return CIDs of a local directory and everything in it by relative path.
+
+    Entries are `{"cid", "tsize", "size", "type"}`, directories additionally
+    have the names of their `entries`, their `block` and the `shards` below it.
+    """
+    tree = {}
+
+    def add(rel):
+        path = os.path.join(store, rel)
+        if os.path.isdir(path):
+            names = sorted(os.listdir(path))
+            entries = {name: add(posixpath.join(rel, name)) for name in names}
+            block, shards = directory_block(entries)
+            tree[rel] = {
+                "cid": _cid("dag-pb", block),
+                "tsize": _tsize(block),
+                "size": sum(tree[posixpath.join(rel, n)]["size"] for n in names),
+                "type": "directory",
+                "entries": names,
+                "block": block,
+                "shards": shards,
+            }
+        else:
+            *_, (cid, _, tsize) = file_blocks(path, chunk_size)
+            tree[rel] = {
+                "cid": cid,
+                "tsize": tsize,
+                "size": os.path.getsize(path),
+                "type": "file",
+            }
+
+        return tree[rel]["cid"], tree[rel]["tsize"]
+
+    add("")
+
+    return tree
+
+
+async def _fetch(gateway, path, session):
+    """Return the CID and the block at `path` (which may be a CID)."""
+    res = await gateway.get(
+        path,
+        session,
+        headers={"Accept": "application/vnd.ipld.car"},
+        params={"format": "car", "dag-scope": "block"},
+    )
+    if res.status == 404:
+        raise FileNotFoundError(path)
+    res.raise_for_status()
+
+    cid = CID.decode(res.headers["X-Ipfs-Roots"].split(",")[-1])
+    _, blocks = read_car(await res.read())
+
+    return cid, {c: data for c, data, _ in blocks}[cid]
+
+
+class _Remote:
+    """Blocks of the previous version, fetched from the configured gateway."""
+
+    def __init__(self, protocol):
+        self.fs = filesystem(protocol)
+        self.gateways = {
+            p: get_gateway(p, self.fs.gateway_addr) for p in {"ipfs", protocol}
+        }
+
+    def fetch(self, path, protocol="ipfs"):
+        async def fetch():
+            session = await self.fs.set_session()
+            return await _fetch(self.gateways[protocol], path, session)
+
+        return sync(self.fs.loop, fetch)
+
+    def entries(self, cid, block):
+        """Return `{name: cid}` of a directory, or None if it is a file."""
+        if cid.codec.name != "dag-pb":
+            return None
+
+        node = PBNode.loads(block)
+        data = Data.loads(node.Data)
+        if data.Type == DataType.Directory:
+            return {link.Name: CID.decode(link.Hash) for link in node.Links}
+        if data.Type != DataType.HAMTShard:
+            return None
+
+        entries = {}
+        for link in node.Links:
+            if len(link.Name) > 2:
+                entries[link.Name[2:]] = CID.decode(link.Hash)
+            else:
+                entries.update(self.entries(*self.fetch(str(CID.decode(link.Hash)))))
+
+        return entries
+
+
+def diff(store, previous, chunk_size=CHUNK_SIZE):
+    """Compare a local store with the previous version at an IPFS/IPNS URL.
+
+    Returns the local tree and the relative paths of `added`, `removed` and
+    `changed` files, and of the `directories` that are new or changed.
+    """
+    tree = local_tree(store, chunk_size)
+    protocol, _, root = previous.rpartition("://")
+    remote = _Remote(protocol)
+
+    changes = {"added": [], "removed": [], "changed": [], "directories": []}
+
+    def added(rel):
+        if tree[rel]["type"] == "directory":
+            changes["directories"].append(rel)
+            for name in tree[rel]["entries"]:
+                added(posixpath.join(rel, name))
+        else:
+            changes["added"].append(rel)
+
+    def compare(rel, cid, block=None):
+        local = tree[rel]
+        if local["cid"] == cid:
+            return
+
+        entries = None
+        if local["type"] == "directory":
+            if block is None:
+                cid, block = remote.fetch(str(cid))
+            entries = remote.entries(cid, block)
+        if entries is None:
+            changes["changed"].append(rel)
+            return
+
+        changes["directories"].append(rel)
+        for name in sorted(set(local["entries"]) | set(entries)):
+            child = posixpath.join(rel, name)
+            if name not in entries:
+                added(child)
+            elif name not in local["entries"]:
+                changes["removed"].append(child)
+            else:
+                compare(child, entries[name])
+
+    compare("", *remote.fetch(root, protocol))
+
+    return tree, changes
+
+
+def _car_section(data):
+    return varint.encode(len(data)) + data
+
+
+def write_car(fp, store, tree, changes, chunk_size=CHUNK_SIZE):
+    """Write the new blocks of `store` in `changes` to `fp` in CAR format.
+
+    Returns the number of bytes of file blocks written.
+    """
+    fp.write(_car_section(dag_cbor.encode({"roots": [tree[""]["cid"]], "version": 1})))
+
+    written = set()
+    for rel in changes["directories"]:
+        for cid, block in [
+            *tree[rel]["shards"],
+            (tree[rel]["cid"], tree[rel]["block"]),
+        ]:
+            if cid not in written:
+                written.add(cid)
+                fp.write(_car_section(bytes(cid) + block))
+
+    size = 0
+    for rel in changes["added"] + changes["changed"]:
+        for cid, block, _ in file_blocks(os.path.join(store, rel), chunk_size):
+            if cid not in written:
+                written.add(cid)
+                size += len(block)
+                fp.write(_car_section(bytes(cid) + block))
+
+    return size
+
+
+def print_report(tree, changes):
+    for kind in ("added", "removed", "changed"):
+        for rel in changes[kind]:
+            size = f" ({tree[rel]['size']} bytes)" if rel in tree else ""
+            print(f"{kind}: {rel}{size}")
+
+    size = sum(tree[rel]["size"] for rel in changes["added"] + changes["changed"])
+    print(f"{size} of {tree['']['size']} bytes changed, new root {tree['']['cid']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="python -m data2ipfs.publish")
+    parser.add_argument("store")
+    parser.add_argument("previous", help="IPFS/IPNS URL of the previous version")
+    parser.add_argument("--car", help="write the new blocks to this CAR file")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+
+    tree, changes = diff(args.store, args.previous, args.chunk_size)
+    print_report(tree, changes)
+
+    if args.car:
+        with open(args.car, "wb") as fp:
+            size = write_car(fp, args.store, tree, changes, args.chunk_size)
+        print(f"Wrote {size} bytes of new file blocks to {args.car}")
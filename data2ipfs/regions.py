@@ -0,0 +1,226 @@
+"""Write one dataset from many independent processes.
+
+A coordinator writes the store metadata and a manifest of chunk-aligned
+regions along one dimension (`plan`). Any number of worker processes, on one
+or many nodes sharing a file system, then claim regions and write them
+(`work`). Claims are marker files created with `O_EXCL`, so no locking support
+of the file system is required. Failed or stale claims are retried up to
+`max_attempts` times. As all regions are chunk-aligned and the encoding is
+deterministic, the result is byte-identical to a single-process write.
+
+Example:
+
+    # coordinator (once)
+    plan(ds, "out.zarr", "out.regions.json", encoding=get_encoding(ds))
+    # workers (many times, concurrently)
+    work(ds, "out.regions.json")
+"""
+
+import json
+import math
+import os
+import pathlib
+import socket
+import time
+import uuid
+
+
+def _state_dir(manifest):
+    return pathlib.Path(manifest).with_suffix(".state")
+
+
+def _chunksize(encoding, da, dim):
+    chunks = encoding.get(da.name, {}).get("chunks")
+    if chunks is None:
+        return da.sizes[dim]
+
+    return dict(zip(da.dims, chunks))[dim]
+
+
+def get_regions(ds, encoding, dim="time", chunks_per_region=1):
+    """Return variables that can be split along `dim` and chunk-aligned regions."""
+    sizes = {
+        var: _chunksize(encoding, ds[var], dim)
+        for var in ds.data_vars
+        if dim in ds[var].dims
+    }
+    split = [var for var, cs in sizes.items() if cs < ds.sizes[dim]]
+
+    step = math.lcm(*(sizes[var] for var in split)) * chunks_per_region if split else 1
+    regions = [
+        (start, min(start + step, ds.sizes[dim]))
+        for start in range(0, ds.sizes[dim] if split else 0, step)
+    ]
+
+    return split, regions
+
+
+def prepare(ds, store, encoding, dim="time", chunks_per_region=1, **kwargs):
+    """Write store metadata and return the variables and regions left to write.
+
+    Variables along `dim` whose chunks span the whole dimension cannot be split
+    and are written here, as are coordinates and variables without `dim`.
+    """
+    split, regions = get_regions(ds, encoding, dim, chunks_per_region)
+    whole = [var for var in ds.variables if var not in split]
+
+    ds.to_zarr(store, encoding=encoding, mode="w", compute=False, **kwargs)
+    if whole:
+        ds[whole].to_zarr(store, mode="r+", **kwargs)
+
+    return split, regions
+
+
+def write_region(ds, store, dim, variables, region, **kwargs):
+    sub = ds[variables].drop_vars(list(ds[variables].coords))
+    sub.isel({dim: slice(*region)}).to_zarr(
+        store, region={dim: slice(*region)}, mode="r+", **kwargs
+    )
+
+
+def plan(ds, store, manifest, encoding, dim="time", chunks_per_region=1, **kwargs):
+    """Write store metadata and a manifest of chunk-aligned regions along `dim`."""
+    split, regions = prepare(ds, store, encoding, dim, chunks_per_region, **kwargs)
+
+    with open(manifest, "w") as fp:
+        json.dump(
+            {
+                "store": str(store),
+                "dim": dim,
+                "variables": split,
+                "regions": regions,
+                "to_zarr": kwargs,
+            },
+            fp,
+            indent=2,
+        )
+
+    state = _state_dir(manifest)
+    state.mkdir(exist_ok=True)
+    for marker in state.iterdir():
+        marker.unlink()  # forget progress of previous runs
+
+    return len(regions)
+
+
+def _failures(state, i):
+    return len(list(state.glob(f"{i}.failed-*")))
+
+
+def _release(state, i, failed):
+    lock = state / f"{i}.lock"
+    if failed:
+        os.replace(lock, state / f"{i}.failed-{_failures(state, i)}")
+    else:
+        lock.unlink()
+
+
+def _release_stale(state, i, stale):
+    """Mark the stale claim `stale` (a stat result of the lock) as failed.
+
+    Several workers can find the same stale lock, and one of them may have
+    claimed the region again by now. The lock is therefore moved to a name of
+    this worker first, which only one of them can do, and put back if it turns
+    out to be a new claim.
+    """
+    lock = state / f"{i}.lock"
+    taken = state / f"{i}.stale-{uuid.uuid4().hex}"
+    try:
+        os.rename(lock, taken)
+    except FileNotFoundError:
+        return False  # released by another worker
+
+    st = taken.stat()
+    if (st.st_ino, st.st_mtime_ns) != (stale.st_ino, stale.st_mtime_ns):
+        try:
+            os.link(taken, lock)
+        except FileExistsError:
+            pass  # claimed by yet another worker in the meantime
+        taken.unlink()
+        return False
+
+    os.replace(taken, state / f"{i}.failed-{_failures(state, i)}")
+    return True
+
+
+def _claim(state, n, timeout, max_attempts):
+    for i in range(n):
+        lock, done = state / f"{i}.lock", state / f"{i}.done"
+        if done.exists() or _failures(state, i) >= max_attempts:
+            continue
+
+        try:
+            stale = lock.stat()
+        except FileNotFoundError:
+            pass
+        else:
+            if time.time() - stale.st_mtime > timeout:
+                _release_stale(state, i, stale)  # claim of a dead worker
+
+        try:
+            fd = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except (FileExistsError, FileNotFoundError):
+            continue
+
+        with os.fdopen(fd, "w") as fp:
+            json.dump({"host": socket.gethostname(), "pid": os.getpid()}, fp)
+
+        if done.exists():  # finished by another worker in the meantime
+            lock.unlink()
+            continue
+
+        return i
+
+
+def work(ds, manifest, timeout=3600, max_attempts=3):
+    """Claim and write regions from `manifest` until none are left.
+
+    Claims older than `timeout` seconds are considered stale, so it has to be
+    longer than writing a single region takes.
+    """
+    with open(manifest) as fp:
+        m = json.load(fp)
+
+    state = _state_dir(manifest)
+
+    written = 0
+    while (i := _claim(state, len(m["regions"]), timeout, max_attempts)) is not None:
+        try:
+            write_region(
+                ds,
+                m["store"],
+                m["dim"],
+                m["variables"],
+                m["regions"][i],
+                **m["to_zarr"],
+            )
+        except Exception as e:
+            print(f"Region {i} failed: {e!r}")
+            _release(state, i, failed=True)
+            continue
+
+        (state / f"{i}.done").touch()
+        _release(state, i, failed=False)
+        written += 1
+
+    return written
+
+
+def status(manifest, max_attempts=3):
+    """Return the number of regions per state."""
+    with open(manifest) as fp:
+        n = len(json.load(fp)["regions"])
+
+    state = _state_dir(manifest)
+    counts = {"done": 0, "running": 0, "failed": 0, "pending": 0}
+    for i in range(n):
+        if (state / f"{i}.done").exists():
+            counts["done"] += 1
+        elif (state / f"{i}.lock").exists():
+            counts["running"] += 1
+        elif _failures(state, i) >= max_attempts:
+            counts["failed"] += 1
+        else:
+            counts["pending"] += 1
+
+    return counts
@@ -0,0 +1,95 @@
+"""Time index sidecar to read time windows of long trajectory stores.
+
+To select a time window, xarray has to load the whole time coordinate first.
+For stores with many million samples (e.g. `BAHAMAS.zarr`) that is far more
+than the data of a short window. Converters therefore chunk the time
+coordinate like the data and write a small sidecar (`.time_index.json`) with
+the minimum and maximum time of every chunk. `open_window` reads only this
+sidecar to find the chunks that overlap a window and then fetches just those
+chunks, including the ones of the time coordinate.
+
+Example:
+
+    ds.to_zarr("BAHAMAS.zarr", encoding=get_encoding(ds))
+    write_time_index("BAHAMAS.zarr", dim="TIME")
+
+    ds = open_window("ipns://.../BAHAMAS.zarr", "2024-08-11T12:00", "2024-08-11T12:10")
+"""
+
+import json
+import pathlib
+
+import fsspec
+import numpy as np
+import xarray as xr
+
+
+TIME_INDEX = ".time_index.json"
+
+
+def _as_int64(time):
+    return np.asarray(time, dtype="datetime64[ns]").astype("int64")
+
+
+def time_index(time, chunksize):
+    """Return the index of the time coordinate `time` stored in `chunksize` chunks."""
+    t = _as_int64(time.values)
+    starts = np.arange(0, t.size, chunksize)
+
+    return {
+        "dim": time.dims[0],
+        "size": t.size,
+        "chunksize": chunksize,
+        "min": np.minimum.reduceat(t, starts).tolist(),
+        "max": np.maximum.reduceat(t, starts).tolist(),
+    }
+
+
+def write_time_index(store, dim="time"):
+    """Write the time index sidecar of a (local) Zarr store.
+
+    The chunk size is taken from the time coordinate as written to the store.
+    """
+    time = xr.open_zarr(store)[dim]
+    index = time_index(time, time.encoding["chunks"][0])
+
+    with open(pathlib.Path(store) / TIME_INDEX, "w") as fp:
+        json.dump(index, fp)
+
+    return index
+
+
+def read_time_index(store):
+    with fsspec.open(f"{str(store).rstrip('/')}/{TIME_INDEX}") as fp:
+        return json.load(fp)
+
+
+def chunk_ranges(index, start, stop):
+    """Return ranges `(first, stop)` of the chunks overlapping `[start, stop]`.
+
+    Overlapping chunks are contiguous for sorted times, i.e. a single range.
+    """
+    overlap = (np.array(index["max"]) >= _as_int64(start)) & (
+        np.array(index["min"]) <= _as_int64(stop)
+    )
+    edges = np.flatnonzero(np.diff(np.concatenate([[0], overlap, [0]])))
+
+    return list(zip(edges[::2].tolist(), edges[1::2].tolist()))
+
+
+def open_window(store, start, stop, **kwargs):
+    """Open the part of a Zarr store between the times `start` and `stop`."""
+    index = read_time_index(store)
+    dim, chunksize = index["dim"], index["chunksize"]
+
+    ds = xr.open_zarr(store, create_default_indexes=False, **kwargs)
+    parts = [
+        ds.isel({dim: slice(first * chunksize, last * chunksize)})
+        for first, last in chunk_ranges(index, start, stop)
+    ]
+    ds = xr.concat(parts, dim=dim) if parts else ds.isel({dim: slice(0, 0)})
+
+    time = ds[dim].values
+    inside = (time >= np.datetime64(start, "ns")) & (time <= np.datetime64(stop, "ns"))
+
+    return ds.isel({dim: inside}).set_xindex(dim)
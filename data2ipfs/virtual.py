@@ -0,0 +1,235 @@
+"""Expose netCDF4 inputs as Zarr via reference manifests instead of copies.
+
+Several converters only change attributes of an input that is already
+published, and re-encode the unchanged data byte for byte. A netCDF4 file is
+an HDF5 file whose variables are stored in chunks (or one contiguous block)
+with a filter pipeline that Zarr understands as well (deflate, shuffle,
+fletcher32, zstd). `references` reads the chunk index of the input with h5py
+and returns a manifest in the format of fsspec's `reference` file system:
+Zarr metadata, with the attributes of the (modified) dataset layered on top,
+and for every chunk the byte range inside the published file. No array data
+is copied. Variables whose values were changed (e.g. a rounded time
+coordinate) are listed in `inline` and stored within the manifest, like
+variable-length strings and variables without a `_FillValue` that have chunks
+which were never written (these read as the default fill value of netCDF).
+
+Example:
+
+    ds = xr.open_dataset(fsspec.open_local(f"cidcache::{url}"))
+    ds.attrs["license"] = "CC-BY-4.0"
+    write_references(ds, url, "DShip.zarr.json")
+
+    ds = open_references("DShip.zarr.json")
+"""
+
+import base64
+import json
+import math
+
+import fsspec
+import h5py
+import netCDF4
+import numcodecs
+import numpy as np
+import xarray as xr
+
+from data2ipfs.listing import filesystem
+
+
+NETCDF_ATTRS = ("_Netcdf4Dimid", "_Netcdf4Coordinates", "_NCProperties")
+
+
+def resolve(url):
+    """Return `url` with a leading IPNS name replaced by its current CID."""
+    protocol, _, path = url.rpartition("://")
+    if protocol != "ipns":
+        return url
+
+    return f"ipfs://{filesystem('ipns').info(path)['CID']}"
+
+
+def _to_json(obj):
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, bytes):
+        return obj.decode()
+    raise TypeError(f"Cannot serialize {type(obj)}")
+
+
+def _fill_value(value):
+    """Return a fill value as stored in `.zarray`."""
+    if value is None:
+        return None
+    value = np.asarray(value).item()
+    if isinstance(value, float) and math.isnan(value):
+        return "NaN"
+    if isinstance(value, float) and math.isinf(value):
+        return "Infinity" if value > 0 else "-Infinity"
+
+    return value
+
+
+def _codecs(dset):
+    """Return the numcodecs equivalent of the HDF5 filter pipeline of `dset`."""
+    plist = dset.id.get_create_plist()
+
+    codecs = []
+    for i in range(plist.get_nfilters()):
+        code, _, values, name = plist.get_filter(i)
+        match code:
+            case h5py.h5z.FILTER_DEFLATE:
+                codecs.append(numcodecs.Zlib(level=values[0]))
+            case h5py.h5z.FILTER_SHUFFLE:
+                codecs.append(numcodecs.Shuffle(elementsize=dset.dtype.itemsize))
+            case h5py.h5z.FILTER_FLETCHER32:
+                codecs.append(numcodecs.Fletcher32())
+            case 32015:
+                codecs.append(numcodecs.Zstd(level=values[0] if values else 0))
+            case _:
+                raise ValueError(f"Unsupported HDF5 filter {name!r} of {dset.name}")
+
+    return codecs
+
+
+def _chunk_key(index):
+    return ".".join(map(str, index)) or "0"
+
+
+def _zarray(shape, chunks, dtype, codecs, fill_value):
+    return {
+        "zarr_format": 2,
+        "shape": list(shape),
+        "chunks": list(chunks),
+        "dtype": dtype,
+        "compressor": codecs[-1].get_config() if codecs else None,
+        "filters": [c.get_config() for c in codecs[:-1]] or None,
+        "fill_value": _fill_value(fill_value),
+        "order": "C",
+    }
+
+
+def _inline(var, variable):
+    """Return references that hold the CF-encoded values of `variable`."""
+    encoded = xr.conventions.encode_cf_variable(variable, name=var)
+    attrs = dict(encoded.attrs)
+    fill_value = attrs.pop("_FillValue", None)
+    data = np.ascontiguousarray(encoded.values)
+
+    if data.dtype.kind == "O":
+        codecs = [numcodecs.VLenUTF8(), numcodecs.Zlib(level=9)]
+        dtype = "|O"
+    else:
+        codecs = [numcodecs.Zlib(level=9)]
+        dtype = data.dtype.str
+    chunk = data
+    for codec in codecs:
+        chunk = codec.encode(chunk)
+
+    return {
+        f"{var}/.zarray": _zarray(data.shape, data.shape, dtype, codecs, fill_value),
+        f"{var}/.zattrs": {**attrs, "_ARRAY_DIMENSIONS": list(encoded.dims)},
+        f"{var}/{_chunk_key([0] * data.ndim)}": "base64:"
+        + base64.b64encode(bytes(chunk)).decode(),
+    }
+
+
+def _hdf5(var, da, ncvar, dset, url):
+    """Return references to the chunks of `dset` inside the file at `url`."""
+    if dset.dtype.kind == "O":
+        return _inline(var, da.variable)  # variable-length data lives on the heap
+
+    attrs = {k: ncvar.getncattr(k) for k in ncvar.ncattrs()}
+    fill_value = attrs.pop("_FillValue", None)
+    # Layer the new attributes on top, xarray moved the CF ones to the encoding
+    attrs = {
+        **{k: v for k, v in attrs.items() if k in da.attrs or k in da.encoding},
+        **da.attrs,
+        "_ARRAY_DIMENSIONS": list(ncvar.dimensions),
+    }
+    for key in NETCDF_ATTRS:
+        attrs.pop(key, None)
+
+    chunks = dset.chunks or dset.shape
+    refs = {
+        f"{var}/.zarray": _zarray(
+            dset.shape, chunks, dset.dtype.str, _codecs(dset), fill_value
+        ),
+        f"{var}/.zattrs": attrs,
+    }
+
+    if dset.chunks is None:
+        offset = dset.id.get_offset()
+        if offset is None:
+            return _inline(var, da.variable)  # compact or never written
+        refs[f"{var}/{_chunk_key([0] * dset.ndim)}"] = [
+            url,
+            offset,
+            dset.id.get_storage_size(),
+        ]
+    elif fill_value is None and dset.id.get_num_chunks() < math.prod(
+        math.ceil(s / c) for s, c in zip(dset.shape, dset.chunks)
+    ):
+        # Chunks that were never written read as the default fill of netCDF,
+        # which is not declared as `_FillValue`
+        return _inline(var, da.variable)
+    else:
+        for i in range(dset.id.get_num_chunks()):
+            info = dset.id.get_chunk_info(i)
+            if info.filter_mask:
+                raise ValueError(f"Chunk {info.chunk_offset} of {var} skips filters")
+            index = [o // c for o, c in zip(info.chunk_offset, dset.chunks)]
+            refs[f"{var}/{_chunk_key(index)}"] = [url, info.byte_offset, info.size]
+
+    return refs
+
+
+def references(ds, url, inline=()):
+    """Return a reference manifest of `ds`, which was opened from `url`.
+
+    Array data is referenced in the (immutable) input file, variables in
+    `inline` and variables that are not in the input are stored inline.
+    """
+    url = resolve(url)
+    path = fsspec.open_local(f"cidcache::{url}")
+
+    metadata = {".zgroup": {"zarr_format": 2}, ".zattrs": ds.attrs}
+    chunks = {}
+    with netCDF4.Dataset(path) as nc, h5py.File(path) as h5:
+        for var in ds.variables:
+            if var in inline or var not in nc.variables:
+                refs = _inline(var, ds[var].variable)
+            else:
+                refs = _hdf5(var, ds[var], nc.variables[var], h5[var], url)
+
+            for key, value in refs.items():
+                target = metadata if key.rsplit("/", 1)[-1].startswith(".") else chunks
+                target[key] = value
+
+    metadata = json.loads(json.dumps(metadata, default=_to_json))
+    return {
+        "version": 1,
+        "refs": {
+            ".zmetadata": json.dumps(
+                {"zarr_consolidated_format": 1, "metadata": metadata}
+            ),
+            **{key: json.dumps(value) for key, value in metadata.items()},
+            **chunks,
+        },
+    }
+
+
+def write_references(ds, url, manifest, inline=()):
+    with open(manifest, "w") as fp:
+        json.dump(references(ds, url, inline), fp)
+
+
+def open_references(manifest, **kwargs):
+    """Open a reference manifest as dataset."""
+    return xr.open_zarr(
+        "reference://",
+        storage_options={"fo": manifest},
+        consolidated=True,
+        **kwargs,
+    )
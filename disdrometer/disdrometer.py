@@ -3,9 +3,12 @@ import pathlib
 
 import fsspec
 import numcodecs
-import numpy as np
 import xarray as xr
 
+from data2ipfs.categorical import encode_categorical
+from data2ipfs.encoding import add_narrowing, add_time_encoding
+from data2ipfs.listing import filesystem
+
 
 def get_chunks(dimensions):
     match dimensions:
@@ -37,23 +40,23 @@ def get_encoding(dataset):
     numcodecs.blosc.set_nthreads(1)  # IMPORTANT FOR DETERMINISTIC CIDs
     codec = numcodecs.Blosc("zstd", shuffle=1, clevel=6)
 
-    return {
+    encoding = {
         var: {
             "chunks": get_chunks(dataset[var].dims),
-            "compressor": None
-            if isinstance(dataset[var].dtype, np.dtypes.StrDType)
-            else codec,
+            "compressor": codec,
         }
         for var in dataset.variables
         if var not in dataset.dims
     }
 
+    return add_time_encoding(dataset, add_narrowing(dataset, encoding))
+
 
 if __name__ == "__main__":
     root = "ipfs://QmR5UvwZgpuQRfyKHqmirkYgfHDskPMgL49BhaS2ezgW1x"
 
-    for f in fsspec.filesystem("ipfs").glob(f"{root}/*.nc"):
-        ds = xr.open_dataset(fsspec.open_local(f"simplecache::ipfs://{f}"))
+    for f in filesystem("ipfs").glob(f"{root}/*.nc"):
+        ds = xr.open_dataset(fsspec.open_local(f"cidcache::ipfs://{f}"))
 
         ds.attrs["summary"] = "\n".join(
             line.strip() for line in ds.attrs["summary"].split("\n")
@@ -68,6 +71,10 @@ if __name__ == "__main__":
             "converted to Zarr by Lukas Kluft (lukas.kluft@mpimet.mpg.de)"
         )
 
+        ds, report = encode_categorical(ds)
+        for var, kind in report.items():
+            print(f"{var}: {kind}")
+
         ds.to_zarr(
             pathlib.Path(f).name.replace(".nc", ".zarr"),
             encoding=get_encoding(ds),
@@ -9,6 +9,9 @@ import re
 from datetime import datetime
 from zoneinfo import ZoneInfo
 
+from data2ipfs.categorical import encode_categorical
+from data2ipfs.encoding import add_narrowing, add_time_encoding
+
 
 # ## Read PARCIVEL
 # define 1dim fields to read
@@ -199,17 +202,17 @@ def get_encoding(dataset):
     numcodecs.blosc.set_nthreads(1)  # IMPORTANT FOR DETERMINISTIC CIDs
     codec = numcodecs.Blosc("zstd", shuffle=1, clevel=6)
 
-    return {
+    encoding = {
         var: {
             "chunks": get_chunks(dataset[var].dims),
-            "compressor": None
-            if isinstance(dataset[var].dtype, np.dtypes.StrDType)
-            else codec,
+            "compressor": codec,
         }
         for var in dataset.variables
         if var not in dataset.dims
     }
 
+    return add_time_encoding(dataset, add_narrowing(dataset, encoding))
+
 
 if __name__ == "__main__":
     for instrument in ("Parsivel_1", "Parsivel_2"):
@@ -217,10 +220,13 @@ if __name__ == "__main__":
         ds.attrs["featureType"] = "trajectory"
 
         # Add constant fields as global attributes
-        ds.attrs["firmware_iop"] = ds.firmware_iop.values[0].decode()
-        ds.attrs["station_name"] = ds.station_name.values[0].decode()
         ds.attrs["sensor_serial_numer"] = ds.sensor_serial_number[0].values.item()
-        ds = ds.drop_vars(["firmware_iop", "station_name", "sensor_serial_number"])
+        ds = ds.drop_vars(["sensor_serial_number"])
+
+        # Constant strings (firmware_iop, station_name) become a single code
+        ds, report = encode_categorical(ds)
+        for var, kind in report.items():
+            print(f"{var}: {kind}")
 
         ds.attrs["title"] = (
             f"Parsivel2 disdrometer measurements (instrument {instrument[-1]}) during METEOR cruise M203"
@@ -1,7 +1,10 @@
-import fsspec
 import numcodecs
 import xarray as xr
 
+from data2ipfs.encoding import add_time_encoding
+from data2ipfs.listing import filesystem
+from data2ipfs.multistore import open_stores
+
 
 def get_chunks(sizes):
     match tuple(sizes.keys()):
@@ -33,7 +36,7 @@ def get_encoding(dataset):
     numcodecs.blosc.set_nthreads(1)  # IMPORTANT FOR DETERMINISTIC CIDs
     compressor = numcodecs.Blosc("lz4")
 
-    return {
+    encoding = {
         var: {
             "compressor": compressor,
             "chunks": get_chunks(dataset[var].sizes),
@@ -41,6 +44,8 @@ def get_encoding(dataset):
         for var in dataset.variables
     }
 
+    return add_time_encoding(dataset, encoding)
+
 
 def _main():
     hatpro_datasets = {
@@ -50,12 +55,14 @@ def _main():
 
     # Collect datasets for single- and multi-pointing HATPRO products.
     for ds_name, root_cid in hatpro_datasets.items():
-        fs = fsspec.filesystem("ipfs")
+        fs = filesystem("ipfs")
         hatpro_files = sorted(
-            ["ipfs://" + item["name"] for item in fs.listdir(root_cid)]
+            ["ipfs://" + name for name in fs.ls(root_cid, detail=False)]
         )
 
-        hatpro = xr.open_mfdataset(hatpro_files, engine="zarr")
+        hatpro = xr.combine_by_coords(
+            open_stores(hatpro_files), combine_attrs="override"
+        )
         hatpro.attrs["license"] = hatpro.attrs["license"].replace(" ", "-")
         hatpro.attrs["project"] = "BOW-TIE"
         hatpro.attrs["keywords"] = "HATPRO, Radiometer, Microwave"
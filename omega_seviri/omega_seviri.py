@@ -5,6 +5,13 @@ import numcodecs
 import numpy as np
 import xarray as xr
 
+from data2ipfs.bitround import add_bitround, apply_bitround, print_report
+from data2ipfs.checkpoint import Journal
+
+
+# Information level to preserve with `--bitround`
+BITROUND = {"omega": 0.99}
+
 
 def attach_xy_coordinates(ds):
     # Attach `coordinates` and `grid_mapping` attributes to initial variables
@@ -97,20 +104,97 @@ def get_chunks(sizes):
     return tuple((chunks[d] for d in sizes))
 
 
-def get_encoding(dataset):
+def get_timeseries_chunks(sizes):
+    match tuple(sizes.keys()):
+        case ("channel", "y", "x", "time"):
+            chunks = {
+                "channel": 1,
+                "y": 16,
+                "x": 16,
+                "time": sizes["time"],
+            }
+        case _:
+            return get_chunks(sizes)
+
+    return tuple((chunks[d] for d in sizes))
+
+
+def get_encoding(dataset, chunker=get_chunks):
     numcodecs.blosc.set_nthreads(1)  # IMPORTANT FOR DETERMINISTIC CIDs
     compressor = numcodecs.Blosc("zstd", clevel=6)
 
-    return {
+    encoding = {
         var: {
             "compressor": compressor,
-            "chunks": get_chunks(dataset[var].sizes),
+            "chunks": chunker(dataset[var].sizes),
         }
         for var in dataset.variables
     }
 
+    return add_bitround(dataset, encoding)
+
+
+def to_timeseries_layout(ds):
+    # Move `time` to the innermost dimension, so that the full time series of a
+    # pixel is contiguous within a single chunk.
+    return ds.transpose(..., "time")
 
-def main(infile, outfile):
+
+def count_chunks(da, indexers):
+    """Count the chunks of `da` touched by positional `indexers`."""
+    n = 1
+    for dim, size in da.sizes.items():
+        chunksize = da.encoding["preferred_chunks"][dim]
+        idx = np.atleast_1d(np.arange(size)[indexers.get(dim, slice(None))])
+        n *= np.unique(idx // chunksize).size
+
+    return n
+
+
+def open_omega(maps_store, timeseries_store, varname="omega", **indexers):
+    """Select from whichever store layout requires fewer chunk reads.
+
+    Indexers are positional (as in `isel`). A time slice over a few pixels is
+    served from the time-series store, a map at a few time steps from the map
+    store. The result is always returned in map layout dimension order.
+    """
+    candidates = [
+        xr.open_dataset(store, engine="zarr", chunks={})[varname]
+        for store in (maps_store, timeseries_store)
+    ]
+    da = min(candidates, key=lambda da: count_chunks(da, indexers))
+
+    return da.isel(indexers).transpose(*candidates[0].dims, missing_dims="ignore")
+
+
+def write_metadata(ds, outfile, timeseries_outfile=None):
+    ds.chunk(channel=-1, time=-1, x=-1, y=-1).to_zarr(
+        outfile,
+        encoding=get_encoding(ds),
+        mode="w",
+        zarr_format=2,
+        compute=False,
+    )
+
+    if timeseries_outfile is not None:
+        ds_ts = ds.pipe(to_timeseries_layout)
+        ds_ts.chunk(channel=-1, time=-1, x=-1, y=-1).to_zarr(
+            timeseries_outfile,
+            encoding=get_encoding(ds_ts, chunker=get_timeseries_chunks),
+            mode="w",
+            zarr_format=2,
+            compute=False,
+        )
+
+
+def main(
+    infile,
+    outfile,
+    timeseries_outfile=None,
+    resume=False,
+    verify=False,
+    bitround=False,
+):
     # Open dataset and attach geostationaty xy-coordinates
     ds = xr.open_dataset(
         infile,
@@ -121,6 +205,11 @@ def main(infile, outfile):
     # Reduce precision for omega standard deviation
     ds = ds.assign(err_omega=ds.err_omega.astype("<f4"))
 
+    # Both layouts get the bits from the same analysis (in map layout)
+    if bitround:
+        ds, report = apply_bitround(ds, BITROUND)
+        print_report(report)
+
     # Fix attribute conventions
     ds = ds.assign_attrs(
         summary=ds.attrs.pop("description"),
@@ -128,19 +217,33 @@ def main(infile, outfile):
         platform="MSG",
     )
 
-    # Write Zarr metadata
-    ds.chunk(channel=-1, time=-1, x=-1, y=-1).to_zarr(
-        outfile,
-        encoding=get_encoding(ds),
-        mode="w",
-        zarr_format=2,
-        compute=False,
-    )
+    stores = [outfile] if timeseries_outfile is None else [outfile, timeseries_outfile]
+    journals = [Journal(store) for store in stores]
+
+    if resume and all(journal.exists() for journal in journals):
+        done = set.intersection(*(journal.completed(verify) for journal in journals))
+        print(f"Resuming, {len(done)} variables already completed")
+    else:
+        for journal in journals:
+            journal.reset()
+        write_metadata(ds, outfile, timeseries_outfile)
+        done = set()
 
     # Write data chunks (per variable)
     for varname in ds.variables:
+        if varname in done:
+            continue
+
         print(varname)
-        ds[[varname]].load().to_zarr(outfile, mode="a")
+        ds_var = ds[[varname]].load()
+        ds_var.to_zarr(outfile, mode="a")
+
+        # Re-use the loaded variable for the transposed time-series layout
+        if timeseries_outfile is not None:
+            ds_var.pipe(to_timeseries_layout).to_zarr(timeseries_outfile, mode="a")
+
+        for journal in journals:
+            journal.record(varname, [varname])
 
 
 if __name__ == "__main__":
@@ -155,6 +258,34 @@ if __name__ == "__main__":
         "--outfile",
         default="/scratch/m/m300575/omega_ORCESTRA.zarr",
     )
+    parser.add_argument(
+        "-t",
+        "--timeseries-outfile",
+        default=None,
+        help="optional secondary store with a time-contiguous chunk layout",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="continue an interrupted run, skipping variables in the journal",
+    )
+    parser.add_argument(
+        "--verify",
+        action="store_true",
+        help="verify digests of already written chunks when resuming",
+    )
+    parser.add_argument(
+        "--bitround",
+        action="store_true",
+        help="round mantissa bits without significant information (lossy)",
+    )
     args = parser.parse_args()
 
-    main(args.infile, args.outfile)
+    main(
+        args.infile,
+        args.outfile,
+        args.timeseries_outfile,
+        args.resume,
+        args.verify,
+        args.bitround,
+    )
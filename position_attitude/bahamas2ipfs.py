@@ -1,13 +1,19 @@
 import argparse
+import concurrent.futures
+import json
 import pathlib
 import subprocess
+import time
 
 import numcodecs
 import numpy as np
 import xarray as xr
 
 from orcestra.postprocess.level0 import bahamas
-from orcestra.io import read_igi, read_bahamas_100hz
+
+from data2ipfs.encoding import add_fixed_point, add_time_encoding
+from data2ipfs.timeindex import write_time_index
+from igi_reader import read_igi, read_bahamas_100hz
 
 
 _vars = {
@@ -19,21 +25,36 @@ _vars = {
     "IRS_R": ("heading", dict(long_name="Attitude/Yaw", units="degree")),
 }
 
+_precision = {
+    "lat": 1e-6,
+    "lon": 1e-6,
+    "alt": 1e-5,
+    "roll": 1e-5,
+    "pitch": 1e-5,
+    "heading": 1e-5,
+}
+
 
 def get_encoding(dataset):
     numcodecs.blosc.set_nthreads(1)  # IMPORTANT FOR DETERMINISTIC CIDs
     codec = numcodecs.Blosc("zstd", shuffle=2)
     delta = numcodecs.Delta("i4")
 
-    return {
+    encoding = {
         var: {
             "chunks": (2**18,),
             "compressor": codec,
-            "filters": [delta],
+            "filters": [] if var in _precision else [delta],
         }
         for var in dataset.variables
         if var not in dataset.dims
     }
+    # Chunk the time like the data, so that time windows can be read (see timeindex)
+    encoding["time"] = {"chunks": (2**18,)}
+
+    encoding = add_fixed_point(dataset, encoding, _precision, delta=True)
+
+    return add_time_encoding(dataset, encoding)
 
 
 def get_latest(datadir):
@@ -72,35 +93,11 @@ def get_latest(datadir):
             return ds
 
 
-def apply_scale(dataset):
-    scale_factors = {
-        "lat": 1_000_000,
-        "lon": 1_000_000,
-        "alt": 100_000,
-        "roll": 100_000,
-        "pitch": 100_000,
-        "heading": 100_000,
-    }
-
-    return dataset.assign(
-        {
-            v: xr.DataArray(
-                (dataset[v] * s).astype(np.int32),
-                attrs={
-                    **dataset[v].attrs,
-                    "scale_factor": 1 / s,
-                },
-            )
-            for v, s in scale_factors.items()
-        }
-    )
-
-
 def homogenize(ds):
     for old_name, (new_name, attrs) in _vars.items():
         ds = ds.assign({new_name: ds[old_name].assign_attrs(attrs)}).drop_vars(old_name)
 
-    ds = ds.assign_coords(lat=ds.lat, lon=ds.lon, alt=ds.alt).pipe(apply_scale)
+    ds = ds.assign_coords(lat=ds.lat, lon=ds.lon, alt=ds.alt)
 
     ds.attrs["featureType"] = "trajectory"
 
@@ -139,6 +136,43 @@ def _halo20240827_hack(raw, products):
         mode="w",
         zarr_format=2,
     )
+    write_time_index(store)
+
+    return ds, store
+
+
+def convert_flight(flight, products):
+    """Convert a single flight and return its manifest entry."""
+    start = time.perf_counter()
+
+    if flight.name == "HALO-20240827a":
+        ds, store = _halo20240827_hack(flight.parent, products)
+        source = "BAHAMAS IGI 10 Hz + BAHAMAS Quick look"
+    else:
+        store = products / flight.with_suffix(".zarr").name
+        ds = get_latest(flight).pipe(homogenize)
+        ds.attrs["title"] = f"HALO position and attitude data for flight {flight.name}"
+        ds.to_zarr(
+            store,
+            encoding=get_encoding(ds),
+            mode="w",
+            zarr_format=2,
+        )
+        write_time_index(store)
+        source = ds.attrs["source"]
+
+    return {
+        "flight": flight.name,
+        "source": source,
+        "rows": ds.sizes["time"],
+        "duration": float((ds.time[-1] - ds.time[0]) / np.timedelta64(1, "s")),
+        "bytes": sum(f.stat().st_size for f in store.rglob("*") if f.is_file()),
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+
+
+def _input_size(flight):
+    return sum(f.stat().st_size for f in flight.iterdir() if f.is_file())
 
 
 def _main():
@@ -155,24 +189,34 @@ def _main():
         type=pathlib.Path,
         default="/work/mh0010/ORCESTRA/raw/HALO/bahamas/",
     )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=1,
+        help="number of flights to convert in parallel",
+    )
+    parser.add_argument(
+        "--manifest",
+        "-m",
+        type=pathlib.Path,
+        default="bahamas2ipfs_manifest.json",
+    )
 
     args = parser.parse_args()
 
-    for flight in sorted(args.raw.glob("HALO-*")):
-        if flight.name == "HALO-20240827a":
-            _halo20240827_hack(args.raw, args.products)
-        else:
-            store = args.products / flight.with_suffix(".zarr").name
-            ds = get_latest(flight).pipe(homogenize)
-            ds.attrs["title"] = (
-                f"HALO position and attitude data for flight {flight.name}"
-            )
-            ds.to_zarr(
-                store,
-                encoding=get_encoding(ds),
-                mode="w",
-                zarr_format=2,
-            )
+    # Start with the largest flights for better load balancing
+    flights = sorted(args.raw.glob("HALO-*"), key=_input_size, reverse=True)
+
+    if args.jobs > 1:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=args.jobs) as pool:
+            futures = [pool.submit(convert_flight, f, args.products) for f in flights]
+            manifest = [f.result() for f in concurrent.futures.as_completed(futures)]
+    else:
+        manifest = [convert_flight(f, args.products) for f in flights]
+
+    with open(args.manifest, "w") as fp:
+        json.dump(sorted(manifest, key=lambda e: e["flight"]), fp, indent=2)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,200 @@
+"""Fast readers for BAHAMAS/IGI ASCII position files.
+
+Drop-in replacements for `orcestra.io.read_igi` and `read_bahamas_100hz`. The
+file is memory-mapped, split into blocks at line boundaries, and every block is
+parsed into a pre-allocated float array with NumPy's C parser (instead of
+`np.genfromtxt` on the whole file). Run this module to benchmark both readers
+on a given file.
+"""
+
+import argparse
+import io
+import mmap
+import time
+import tracemalloc
+
+import numpy as np
+import orcestra.io
+import xarray as xr
+
+
+BLOCKSIZE = 2**26
+
+
+def _skip_lines(buf, nlines):
+    pos = 0
+    for _ in range(nlines):
+        pos = buf.find(b"\n", pos) + 1
+        if pos == 0:
+            return len(buf)
+
+    return pos
+
+
+def _blocks(buf, start, blocksize=BLOCKSIZE):
+    """Yield `(start, end)` of blocks in `buf` that end at line boundaries."""
+    while start < len(buf):
+        end = buf.find(b"\n", min(start + blocksize, len(buf) - 1)) + 1 or len(buf)
+        yield start, end
+        start = end
+
+
+def _parse_block(text, delimiter, usecols):
+    try:
+        return np.loadtxt(
+            io.StringIO(text), delimiter=delimiter, usecols=usecols, ndmin=2
+        )
+    except ValueError:
+        # Empty fields (e.g. ",,") are NaN in `np.genfromtxt`, but an error here
+        data = np.genfromtxt(io.StringIO(text), delimiter=delimiter, usecols=usecols)
+        return data.reshape(-1, len(usecols))
+
+
+def read_table(txtfile, skip_header, delimiter, ncols, blocksize=BLOCKSIZE):
+    """Read the first `ncols` numeric columns of a text file into a float array."""
+    usecols = range(ncols)
+    with (
+        open(txtfile, "rb") as fp,
+        mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as buf,
+    ):
+        start = _skip_lines(buf, skip_header)
+        blocks = list(_blocks(buf, start, blocksize))
+
+        # Count line boundaries in bulk for an upper bound of the number of rows
+        nmax = sum(
+            np.count_nonzero(np.frombuffer(buf, np.uint8, e - s, s) == ord("\n")) + 1
+            for s, e in blocks
+        )
+
+        data = np.empty((nmax, ncols))
+        nrows = 0
+        for s, e in blocks:
+            block = _parse_block(buf[s:e].decode(), delimiter, usecols)
+            data[nrows : nrows + len(block)] = block
+            nrows += len(block)
+
+    return data[:nrows]
+
+
+def _parse_igi(txtfile, skip_header, delimiter, varinfo, flight_date, gps_time_offset):
+    """Parse IGI position data txt file and return as xr.Dataset."""
+    data = read_table(txtfile, skip_header, delimiter, len(varinfo))
+
+    ds = xr.Dataset(
+        data_vars={
+            varname: xr.DataArray(data=data[:, i], attrs=attrs, dims=("time",))
+            for i, (varname, attrs) in enumerate(varinfo.items())
+        }
+    )
+
+    seconds = ds.time.values
+    new_day = np.where(np.diff(seconds) < -86_399)[0]
+    if new_day.size > 0:
+        # If the time axis jumps back 23h 59min 59sec, move it forward a full day.
+        # This correcrts date changes during HALO flights where
+        # the internal "seconds since midnight" time is reset.
+        seconds[int(new_day[0]) + 1 :] += 86_400
+
+    ds = ds.assign_coords(
+        time=seconds * np.timedelta64(1_000_000_000, "ns")
+        + np.datetime64(flight_date)
+        + gps_time_offset
+    )
+
+    return ds
+
+
+def read_igi(
+    txtfile, flight_date, skip_header=83, gps_time_offset=np.timedelta64(-18, "s")
+):
+    """Parse IGI position data txt file (1/10 Hz) and return as xr.Dataset."""
+    _varinfo = {
+        "time": dict(long_name="Generic/Time", units="s"),
+        "IRS_LAT": dict(long_name="WGS84 Datum/Latitude", units="degrees_north"),
+        "IRS_LON": dict(long_name="WGS84 Datum/Longitude", units="degrees_east"),
+        "IRS_ALT": dict(long_name="WGS84 Datum/Elliptical Height", units="m"),
+        "IRS_NSV": dict(long_name="Velocity/North", units="m/s"),
+        "IRS_EWV": dict(long_name="Velocity/East", units="m/s"),
+        "IRS_VV": dict(long_name="Velocity/Up", units="m/s"),
+        "IRS_PHI": dict(long_name="Attitude/Roll", units="degree"),
+        "IRS_THE": dict(long_name="Attitude/Pitch", units="degree"),
+        "IRS_R": dict(long_name="Attitude/Yaw", units="degree"),
+        "IGI_RMSX": dict(long_name="RMS/Position North", units="m"),
+        "IGI_RMSY": dict(long_name="RMS/Position East", units="m"),
+        "IGI_RMSZ": dict(long_name="RMS/Position Altitude", units="m"),
+    }
+
+    return _parse_igi(
+        txtfile,
+        skip_header=skip_header,
+        delimiter=",",
+        varinfo=_varinfo,
+        flight_date=flight_date,
+        gps_time_offset=gps_time_offset,
+    )
+
+
+def read_bahamas_100hz(txtfile, flight_date, gps_time_offset=np.timedelta64(-18, "s")):
+    """Parse BAHAMAS 100 Hz position data txt file and return as xr.Dataset."""
+    _varinfo = {
+        "time": dict(long_name="Generic/Time", units="s"),
+        "IRS_LON": dict(long_name="WGS84 Datum/Longitude", units="degrees_east"),
+        "IRS_LAT": dict(long_name="WGS84 Datum/Latitude", units="degrees_north"),
+        "IRS_ALT": dict(long_name="WGS84 Datum/Elliptical Height", units="m"),
+        "IRS_PHI": dict(long_name="Attitude/Roll", units="degree"),
+        "IRS_THE": dict(long_name="Attitude/Pitch", units="degree"),
+        "IRS_R": dict(long_name="Attitude/Yaw", units="degree"),
+    }
+
+    return _parse_igi(
+        txtfile,
+        skip_header=80,
+        delimiter=None,
+        varinfo=_varinfo,
+        flight_date=flight_date,
+        gps_time_offset=gps_time_offset,
+    )
+
+
+def _measure(func, *args, **kwargs):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return result, seconds, peak
+
+
+def _main():
+    parser = argparse.ArgumentParser(prog="igi_reader")
+    parser.add_argument("txtfile")
+    parser.add_argument("--flight-date", "-d", required=True)
+    parser.add_argument(
+        "--igi",
+        action="store_true",
+        help="parse with `read_igi` instead of `read_bahamas_100hz`",
+    )
+    parser.add_argument("--skip-header", type=int, default=83)
+    args = parser.parse_args()
+
+    if args.igi:
+        kwargs = dict(flight_date=args.flight_date, skip_header=args.skip_header)
+        readers = (orcestra.io.read_igi, read_igi)
+    else:
+        kwargs = dict(flight_date=args.flight_date)
+        readers = (orcestra.io.read_bahamas_100hz, read_bahamas_100hz)
+
+    results = []
+    for reader in readers:
+        ds, seconds, peak = _measure(reader, args.txtfile, **kwargs)
+        print(f"{reader.__module__}: {seconds:.2f} s, {peak / 2**20:.0f} MiB peak")
+        results.append(ds)
+
+    xr.testing.assert_identical(*results)
+    print("Outputs are identical")
+
+
+if __name__ == "__main__":
+    _main()
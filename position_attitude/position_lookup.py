@@ -0,0 +1,193 @@
+import argparse
+import functools
+import json
+
+import fsspec
+import numpy as np
+import xarray as xr
+
+from data2ipfs.timeindex import read_time_index
+
+
+ROOT = "ipns://latest.orcestra-campaign.org/products/HALO/position_attitude"
+VARIABLES = ("lat", "lon", "alt", "roll", "pitch", "heading")
+ANGLES = ("heading",)
+
+
+def _as_int64(time):
+    return np.asarray(time, dtype="datetime64[ns]").astype("int64")
+
+
+def _flight_index(url):
+    try:
+        index = read_time_index(url)
+    except FileNotFoundError:  # stores converted before the time index sidecar
+        ds = xr.open_dataset(
+            url, engine="zarr", chunks={}, create_default_indexes=False
+        )
+        chunksize = ds.lat.encoding["preferred_chunks"]["time"]
+        time = _as_int64(ds.time.values)
+
+        return {
+            "store": url,
+            "size": time.size,
+            "chunksize": chunksize,
+            "chunk_starts": time[::chunksize].tolist(),
+            "end": int(time[-1]),
+        }
+
+    return {
+        "store": url,
+        "size": index["size"],
+        "chunksize": index["chunksize"],
+        "chunk_starts": index["min"],
+        "end": index["max"][-1],
+    }
+
+
+def build_index(root=ROOT):
+    """Build a compact time index of all per-flight `HALO-*.zarr` stores.
+
+    For every flight, the index holds the time range and the first time of each
+    data chunk (the coarse time -> chunk index). It is read from the time index
+    sidecar of the stores, older stores need to read every time coordinate
+    once; the resulting index is a few kilobytes.
+    """
+    fs, path = fsspec.core.url_to_fs(root)
+
+    flights = [
+        _flight_index(fs.unstrip_protocol(store))
+        for store in sorted(fs.glob(f"{path}/HALO-*.zarr"))
+    ]
+
+    return {"flights": flights}
+
+
+class PositionLookup:
+    """Vectorized position and attitude lookup over the per-flight stores.
+
+    Only the chunks covering the requested times are fetched. Decoded chunks
+    are kept in a LRU cache of `cache_size` (flight, variable, chunk) entries.
+
+    Example:
+
+        lookup = PositionLookup(json.load(open("position_index.json")))
+        ds = lookup(np.array(["2024-08-11T12:00"], dtype="datetime64[ns]"))
+    """
+
+    def __init__(self, index, cache_size=64):
+        self.flights = index["flights"]
+        self.starts = np.array([f["chunk_starts"][0] for f in self.flights])
+        self.ends = np.array([f["end"] for f in self.flights])
+
+        self._open = functools.cache(
+            lambda store: xr.open_dataset(
+                store, engine="zarr", chunks={}, create_default_indexes=False
+            )
+        )
+        self._chunk = functools.lru_cache(maxsize=cache_size)(self._load_chunk)
+
+    @functools.cached_property
+    def attrs(self):
+        """Attributes of the variables, taken from the first flight."""
+        if not self.flights:
+            return {}
+
+        ds = self._open(self.flights[0]["store"])
+        return {var: ds[var].attrs for var in ds.variables}
+
+    def _load_chunk(self, flight, var, chunk):
+        f = self.flights[flight]
+        cs = f["chunksize"]
+        values = self._open(f["store"])[var][chunk * cs : (chunk + 1) * cs].values
+
+        return _as_int64(values) if var == "time" else values
+
+    def _gather(self, flight, var, idx):
+        cs = self.flights[flight]["chunksize"]
+        chunks = idx // cs
+
+        out = np.empty(idx.shape, dtype="int64" if var == "time" else "float64")
+        for c in np.unique(chunks):
+            m = chunks == c
+            out[m] = self._chunk(flight, var, int(c))[idx[m] - c * cs]
+
+        return out
+
+    def _locate(self, flight, t):
+        """Return the index of the first sample at or after each time `t`."""
+        f = self.flights[flight]
+        cs = f["chunksize"]
+        chunks = np.searchsorted(f["chunk_starts"], t, side="right") - 1
+
+        idx = np.empty(t.shape, dtype="int64")
+        for c in np.unique(chunks):
+            m = chunks == c
+            idx[m] = c * cs + np.searchsorted(self._chunk(flight, "time", int(c)), t[m])
+
+        return np.clip(idx, 1, f["size"] - 1)
+
+    def __call__(self, times, variables=VARIABLES):
+        """Return `variables` linearly interpolated to `times`.
+
+        Times outside of any flight are NaN. Angles in `ANGLES` are interpolated
+        along the shorter arc.
+        """
+        times = np.atleast_1d(np.asarray(times, dtype="datetime64[ns]"))
+        t = _as_int64(times)
+
+        flight = np.searchsorted(self.starts, t, side="right") - 1
+        valid = flight >= 0
+        valid[valid] &= t[valid] <= self.ends[flight[valid]]
+
+        result = {var: np.full(t.shape, np.nan) for var in variables}
+        for fi in np.unique(flight[valid]):
+            m = valid & (flight == fi)
+            i1 = self._locate(fi, t[m])
+            i0 = i1 - 1
+
+            t0 = self._gather(fi, "time", i0)
+            t1 = self._gather(fi, "time", i1)
+            w = np.clip((t[m] - t0) / np.maximum(t1 - t0, 1), 0, 1)
+
+            for var in variables:
+                v0 = self._gather(fi, var, i0)
+                v1 = self._gather(fi, var, i1)
+                if var in ANGLES:
+                    d = (v1 - v0 + 180) % 360 - 180
+                    result[var][m] = (v0 + w * d) % 360
+                else:
+                    result[var][m] = v0 + w * (v1 - v0)
+
+        return xr.Dataset(
+            {
+                var: ("time", values, self.attrs.get(var, {}))
+                for var, values in result.items()
+            },
+            coords={"time": times},
+        )
+
+
+def _main():
+    parser = argparse.ArgumentParser(prog="position_lookup")
+    parser.add_argument("--root", "-r", default=ROOT)
+    parser.add_argument("--index", "-i", default="position_index.json")
+    parser.add_argument(
+        "times",
+        nargs="*",
+        help="ISO times to look up (build the index if none are given)",
+    )
+    args = parser.parse_args()
+
+    if not args.times:
+        with open(args.index, "w") as fp:
+            json.dump(build_index(args.root), fp)
+    else:
+        with open(args.index) as fp:
+            lookup = PositionLookup(json.load(fp))
+
+        print(lookup(np.array(args.times, dtype="datetime64[ns]")).to_dataframe())
+
+
+if __name__ == "__main__":
+    _main()
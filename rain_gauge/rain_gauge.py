@@ -3,10 +3,12 @@ import pathlib
 
 import fsspec
 import numcodecs
-import numpy as np
 import pandas as pd
 import xarray as xr
 
+from data2ipfs.categorical import encode_categorical
+from data2ipfs.encoding import add_fixed_point, add_narrowing, add_time_encoding
+
 
 def get_chunks(dimensions):
     match dimensions:
@@ -22,24 +24,24 @@ def get_encoding(dataset):
     numcodecs.blosc.set_nthreads(1)  # IMPORTANT FOR DETERMINISTIC CIDs
     codec = numcodecs.Blosc("zstd", shuffle=1, clevel=6)
 
-    return {
+    encoding = {
         var: {
             "chunks": get_chunks(dataset[var].dims),
-            "compressor": None
-            if isinstance(dataset[var].dtype, np.dtypes.StrDType)
-            else codec,
+            "compressor": codec,
         }
         for var in dataset.variables
         if var not in dataset.dims
     }
 
+    return add_time_encoding(dataset, add_narrowing(dataset, encoding))
+
 
 # +
 def _main():
     # Parse CSV log
     root = "ipfs://QmdxMqRNRKrp9sWPCumSRMoaBKKAMTASSymYVUDswokH73"
     df = pd.read_csv(
-        fsspec.open_local(f"simplecache::{root}"),
+        fsspec.open_local(f"cidcache::{root}"),
         sep=";",
     )
 
@@ -95,10 +97,15 @@ def _main():
     ds.attrs["license"] = "CC-BY-4.0"
     ds.attrs["history"] = "Converted to Zarr by Lukas Kluft (lukas.kluft@mpimet.mpg.de)"
 
+    # Store strings as categorical codes
+    ds, report = encode_categorical(ds)
+    for var, kind in report.items():
+        print(f"{var}: {kind}")
+
     # Store to Zarr
     ds.to_zarr(
         "M203_Niederschlag_Stand_240923-2227.zarr",
-        encoding=get_encoding(ds),
+        encoding=add_fixed_point(ds, get_encoding(ds), {"Lat": 1e-6, "Long": 1e-6}),
         mode="w",
         zarr_format=2,
     )
@@ -0,0 +1,46 @@
+import numpy as np
+import xarray as xr
+
+from data2ipfs.align import merge_sorted
+
+
+def _product(var, times, height=(0, 1)):
+    return xr.Dataset(
+        {var: (("time", "height"), np.arange(len(times) * len(height)).reshape(-1, 2))},
+        coords={
+            "time": np.array(times, dtype="datetime64[s]").astype("datetime64[ns]"),
+            "height": list(height),
+        },
+    )
+
+
+def test_merge_sorted_matches_outer_merge():
+    a = _product("a", ["2024-08-11T00:00", "2024-08-11T00:01", "2024-08-11T00:03"])
+    b = _product("b", ["2024-08-11T00:01", "2024-08-11T00:02"])
+    b["a"] = b.b * 10  # taken from the first product
+
+    ds, report = merge_sorted({"a": a, "b": b})
+
+    expected = xr.merge([a, b.drop_vars("a")], join="outer")
+    xr.testing.assert_identical(ds, expected)
+    assert report["b"] == {"times": 2, "duplicates": 0, "unsorted": False, "missing": 2}
+
+
+def test_merge_sorted_drops_duplicates():
+    a = _product("a", ["2024-08-11T00:02", "2024-08-11T00:00", "2024-08-11T00:02"])
+
+    ds, report = merge_sorted({"a": a})
+
+    assert report["a"] == {"times": 3, "duplicates": 1, "unsorted": True, "missing": 0}
+    np.testing.assert_array_equal(ds.time, np.unique(a.time))
+    np.testing.assert_array_equal(ds.a, [[2, 3], [0, 1]])
+
+
+def test_merge_sorted_joins_other_indexes():
+    a = _product("a", ["2024-08-11T00:00", "2024-08-11T00:01"])
+    b = _product("b", ["2024-08-11T00:01"], height=(0, 2))
+
+    ds, _ = merge_sorted({"a": a, "b": b})
+
+    xr.testing.assert_identical(ds, xr.merge([a, b], join="outer"))
+    np.testing.assert_array_equal(ds.height, [0, 1, 2])
@@ -0,0 +1,125 @@
+import hashlib
+import pathlib
+
+import numcodecs
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+
+from data2ipfs.append import Appender
+from data2ipfs.bitround import add_bitround, apply_bitround
+from data2ipfs.encoding import add_time_encoding
+
+
+def _digests(store):
+    return {
+        str(f.relative_to(store)): hashlib.sha256(f.read_bytes()).hexdigest()
+        for f in sorted(pathlib.Path(store).rglob("*"))
+        if f.is_file()
+    }
+
+
+def _days(path, times, noise=None):
+    """Write one netCDF file per day with the given `times` and `noise`."""
+    rng = np.random.default_rng(0)
+    paths = []
+    for day, offsets in enumerate(times):
+        time = np.datetime64("2024-08-10") + np.timedelta64(day, "D") + offsets
+        beta = np.sin(np.linspace(0, 3, time.size))[:, None] * [1.0, 2.0, 3.0]
+        beta += (1e-3 if noise is None else noise[day]) * rng.normal(size=beta.shape)
+        paths.append(path / f"day{day}.nc")
+        xr.Dataset(
+            {
+                "beta": (("time", "range"), beta),
+                "cbh": ("time", rng.integers(0, 3000, time.size)),
+            },
+            coords={"time": time, "range": [15.0, 30.0, 45.0]},
+            attrs={"title": "ceilometer", "day": day},
+        ).to_netcdf(paths[-1])
+
+    return paths
+
+
+def get_encoding(dataset):
+    numcodecs.blosc.set_nthreads(1)
+    codec = numcodecs.Blosc("zstd", shuffle=1, clevel=6)
+    chunks = {"time": 16, "range": 3}
+
+    encoding = {
+        var: {
+            "chunks": tuple(chunks[d] for d in dataset[var].dims),
+            "compressor": codec,
+        }
+        for var in dataset.variables
+        if var not in dataset.dims
+    }
+
+    return add_bitround(dataset, add_time_encoding(dataset, encoding))
+
+
+def _convert(store, paths, append, bitround=None):
+    appender = Appender(store, paths, append=append, bitround=bitround)
+    if appender.up_to_date:
+        return appender
+
+    ds = appender.open_mfdataset(combine_attrs="drop_conflicts")
+    ds, _ = apply_bitround(ds, appender.bitround)
+    ds.attrs["history"] = "converted"
+    appender.to_zarr(ds.chunk(time=-1), encoding=get_encoding(ds), zarr_format=2)
+
+    return appender
+
+
+REGULAR = pd.to_timedelta(np.arange(200), "min").values
+IRREGULAR = pd.to_timedelta(np.cumsum(np.arange(1, 21)), "min").values
+
+
+@pytest.mark.parametrize(
+    "times, appended",
+    [
+        # Partial last chunk (200 values in chunks of 16) is merged
+        ([REGULAR, REGULAR, REGULAR], True),
+        # The gaps of the last day drop the Delta filter of time
+        ([REGULAR, IRREGULAR], False),
+    ],
+)
+def test_append_is_identical_to_rebuild(tmp_path, times, appended):
+    paths = _days(tmp_path, times)
+
+    _convert(tmp_path / "rebuild.zarr", paths, append=False)
+    for n in range(1, len(paths) + 1):
+        appender = _convert(tmp_path / "append.zarr", paths[:n], append=True)
+    assert appender.append == appended
+    assert _convert(tmp_path / "append.zarr", paths, append=True).up_to_date
+
+    assert _digests(tmp_path / "append.zarr") == _digests(tmp_path / "rebuild.zarr")
+    xr.testing.assert_identical(
+        xr.open_zarr(tmp_path / "append.zarr").load(),
+        xr.open_mfdataset(paths, combine_attrs="drop_conflicts")
+        .load()
+        .assign_attrs(history="converted"),
+    )
+
+
+@pytest.mark.parametrize(
+    "noise, appended",
+    [
+        ([1e-3, 1e-3, 1e-3], True),
+        # The last day needs more mantissa bits than the others
+        ([1e-3, 1e-3, 1e-6], False),
+    ],
+)
+def test_append_with_bitround(tmp_path, noise, appended):
+    paths = _days(tmp_path, [REGULAR] * len(noise), noise)
+    config = {"beta": 0.99}
+
+    _convert(tmp_path / "rebuild.zarr", paths, append=False, bitround=config)
+    for n in range(1, len(paths) + 1):
+        appender = _convert(
+            tmp_path / "append.zarr", paths[:n], append=True, bitround=config
+        )
+    assert appender.append == appended
+
+    assert _digests(tmp_path / "append.zarr") == _digests(tmp_path / "rebuild.zarr")
+    assert "bitround_keepbits" in xr.open_zarr(tmp_path / "append.zarr").beta.attrs
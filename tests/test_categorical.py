@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+import xarray as xr
+
+from data2ipfs.categorical import decode_categorical, encode_categorical
+
+
+def _roundtrip(ds, tmp_path):
+    ds.to_zarr(tmp_path / "out.zarr", zarr_format=2, mode="w")
+    return decode_categorical(xr.open_zarr(tmp_path / "out.zarr")).load()
+
+
+@pytest.mark.parametrize("dtype", ["S8", "U8"])
+def test_categorical(tmp_path, dtype):
+    station = np.array(["ship", "buoy", "ship b"] * 100, dtype=dtype)
+    ds = xr.Dataset({"station": ("time", station)})
+
+    encoded, report = encode_categorical(ds)
+    assert report == {"station": "categorical (3 values)"}
+    assert encoded.station.dtype == np.int8
+    assert encoded.station.attrs["flag_meanings"] == "buoy ship ship_b"
+    assert "_FillValue" not in encoded.station.attrs
+
+    xr.testing.assert_identical(_roundtrip(encoded, tmp_path), ds)
+
+
+def test_missing_values(tmp_path):
+    values = np.array(["a", None, "b", np.nan] * 100, dtype=object)
+    ds = xr.Dataset({"flag": ("time", values)})
+
+    encoded, _ = encode_categorical(ds)
+    assert encoded.flag.attrs["_FillValue"] == -1
+    assert -1 not in encoded.flag.attrs["flag_values"]
+
+    # Generic readers see the missing codes as masked
+    encoded.to_zarr(tmp_path / "out.zarr", zarr_format=2, mode="w")
+    assert int(xr.open_zarr(tmp_path / "out.zarr").flag.isnull().sum()) == 200
+    xr.testing.assert_identical(_roundtrip(encoded, tmp_path), ds)
+    xr.testing.assert_identical(decode_categorical(encoded), ds)
+
+
+@pytest.mark.parametrize("dtype", ["S8", "U8"])
+def test_variable_length(tmp_path, dtype):
+    values = np.array([f"id{i}" for i in range(100)], dtype=dtype)
+    ds = xr.Dataset({"id": ("time", values)})
+
+    encoded, report = encode_categorical(ds)
+    assert report == {"id": "variable-length"}
+    assert encoded.id.dtype == object
+    assert all(isinstance(v, str) for v in encoded.id.values)
+
+    encoded.to_zarr(tmp_path / "out.zarr", zarr_format=2, mode="w")
+    result = xr.open_zarr(tmp_path / "out.zarr").id.values
+    np.testing.assert_array_equal(result, values.astype("U8"))
@@ -0,0 +1,101 @@
+import concurrent.futures
+import hashlib
+import os
+import time
+
+from fsspec.implementations.memory import MemoryFileSystem
+
+from data2ipfs.cidcache import CIDCacheFileSystem
+
+
+class ContentFileSystem(MemoryFileSystem):
+    """Memory file system whose `ukey` is a digest of the content, like a CID."""
+
+    cachable = False
+    store = {}
+    pseudo_dirs = [""]
+
+    def __init__(self, delay=0, **kwargs):
+        super().__init__(**kwargs)
+        self.delay = delay
+        self.fetched = []
+
+    def ukey(self, path):
+        return hashlib.sha256(self.cat_file(path)).hexdigest()
+
+    def get_file(self, rpath, lpath, **kwargs):
+        self.fetched.append(rpath)
+        data = self.cat_file(rpath)
+        with open(lpath, "wb") as fp:
+            # Write in two parts, so that concurrent downloads interleave
+            fp.write(data[: len(data) // 2])
+            time.sleep(self.delay)
+            fp.write(data[len(data) // 2 :])
+
+
+def _cidcache(storage, source, **kwargs):
+    return CIDCacheFileSystem(
+        fs=source, cache_storage=str(storage), skip_instance_cache=True, **kwargs
+    )
+
+
+def _cached(storage):
+    return {e.name: e.stat().st_size for e in os.scandir(storage)}
+
+
+def test_cache_hit_by_cid(tmp_path):
+    source = ContentFileSystem()
+    source.pipe({"/hit/a.nc": b"a" * 100, "/hit/copy.nc": b"a" * 100})
+
+    fs = _cidcache(tmp_path, source)
+    assert fs.cat("/hit/a.nc") == b"a" * 100
+    assert fs.cat("/hit/a.nc") == b"a" * 100
+    # Identical content has the same CID, wherever it is
+    assert fs.cat("/hit/copy.nc") == b"a" * 100
+    assert source.fetched == ["/hit/a.nc"]
+    assert _cached(tmp_path) == {hashlib.sha256(b"a" * 100).hexdigest(): 100}
+
+    # A new run resolves the path again and fetches the changed content
+    source.pipe("/hit/a.nc", b"b" * 100)
+    fs = _cidcache(tmp_path, source)
+    assert fs.cat("/hit/a.nc") == b"b" * 100
+    assert source.fetched == ["/hit/a.nc", "/hit/a.nc"]
+    assert len(_cached(tmp_path)) == 2
+
+
+def test_evict_least_recently_used(tmp_path):
+    source = ContentFileSystem()
+    source.pipe({f"/lru/{name}.nc": name.encode() * 100 for name in "abc"})
+    fs = _cidcache(tmp_path, source, max_size=250)
+
+    fs.cat("/lru/a.nc")
+    fs.cat("/lru/b.nc")
+    for mtime, name in enumerate("ab"):
+        fn = tmp_path / fs._mapper(f"/lru/{name}.nc")
+        os.utime(fn, (mtime, mtime))
+
+    fs.cat("/lru/a.nc")  # a cache hit makes `a` the most recently used file
+    fs.cat("/lru/c.nc")
+    assert set(_cached(tmp_path)) == {
+        fs._mapper("/lru/a.nc"),
+        fs._mapper("/lru/c.nc"),
+    }
+    assert source.fetched == ["/lru/a.nc", "/lru/b.nc", "/lru/c.nc"]
+
+
+def test_concurrent_downloads(tmp_path):
+    data = os.urandom(2**20)
+    source = ContentFileSystem(delay=0.1)
+    source.pipe("/concurrent/a.nc", data)
+
+    def read(_):
+        # Every process has its own file system instance
+        with _cidcache(tmp_path, source).open("/concurrent/a.nc") as fp:
+            return fp.read()
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=8) as pool:
+        assert all(d == data for d in pool.map(read, range(8)))
+
+    # Partial downloads are never visible and never left behind
+    assert _cached(tmp_path) == {hashlib.sha256(data).hexdigest(): len(data)}
+    assert len(source.fetched) > 1
@@ -0,0 +1,25 @@
+import numpy as np
+import xarray as xr
+
+from data2ipfs.dedup import analyze
+
+
+def test_analyze(tmp_path):
+    values = np.random.default_rng(0).normal(size=20000)
+    values[5000:5100] = np.nan
+    ds = xr.Dataset({"v": ("x", values)})
+    encoding = {"v": {"chunks": (4096,)}}
+
+    stores = [str(tmp_path / f"{name}.zarr") for name in ("full", "copy", "part")]
+    ds.to_zarr(stores[0], encoding=encoding, zarr_format=2, mode="w")
+    ds.to_zarr(stores[1], encoding=encoding, zarr_format=2, mode="w")
+    ds.isel(x=slice(4000, 9000)).to_zarr(stores[2], zarr_format=2, mode="w")
+
+    report = analyze(stores)
+
+    assert [f"{stores[0]}/v", f"{stores[1]}/v"] in report["shared"]
+    (found,) = report["slices"]
+    assert found["slice"] == f"{stores[2]}/v"
+    assert found["of"] == f"{stores[0]}/v"
+    assert found["offset"] == 4000
+    assert not found["aligned"]
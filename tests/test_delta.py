@@ -0,0 +1,57 @@
+import subprocess
+import sys
+
+import numpy as np
+import xarray as xr
+
+from data2ipfs.delta import add_delta_filter, encode_deltas, open_dataset
+
+
+def test_delta_roundtrip(tmp_path):
+    rng = np.random.default_rng(0)
+    ref = xr.Dataset(
+        {
+            "beta": (("time", "height"), rng.normal(size=(100, 8))),
+            "other": (("time", "height"), rng.normal(size=(100, 8))),
+        },
+        coords={"time": np.arange(100), "height": np.arange(8)},
+    )
+    ds = ref.copy()
+    ds["beta"] = ref.beta.where(ref.beta > 1.5, ref.beta * (1 + 1e-12))
+    ds["other"] = ref.other + rng.normal(size=(100, 8))
+    ref.to_zarr(tmp_path / "v0.zarr", zarr_format=2, mode="w")
+
+    encoded, report = encode_deltas(ds, ref, "v0.zarr")
+    assert report["beta"].startswith("delta")
+    assert report["other"] == "different"
+
+    encoding = add_delta_filter(encoded, {})
+    encoded.to_zarr(tmp_path / "v1.zarr", encoding=encoding, zarr_format=2, mode="w")
+
+    xr.testing.assert_identical(open_dataset(tmp_path / "v1.zarr").load(), ds)
+
+
+def test_generic_readers_fail(tmp_path):
+    ref = xr.Dataset({"beta": ("time", np.linspace(0, 1, 100))})
+    ds = ref.copy()
+    ds["beta"] = ref.beta + 1e-12
+    ref.to_zarr(tmp_path / "v0.zarr", zarr_format=2, mode="w")
+    encoded, _ = encode_deltas(ds, ref, "v0.zarr", variables=["beta"])
+    encoded.to_zarr(
+        tmp_path / "v1.zarr",
+        encoding=add_delta_filter(encoded, {}),
+        zarr_format=2,
+        mode="w",
+    )
+
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            f"import xarray; xarray.open_zarr({str(tmp_path / 'v1.zarr')!r}).load()",
+        ],
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode != 0
+    assert "data2ipfs.xor_delta" in result.stderr
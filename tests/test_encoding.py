@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+import xarray as xr
+
+from data2ipfs.encoding import (
+    add_fixed_point,
+    add_narrowing,
+    add_time_encoding,
+    fixed_point_encoding,
+    narrow_encoding,
+)
+
+
+def _roundtrip(ds, encoding, tmp_path):
+    ds.to_zarr(tmp_path / "out.zarr", encoding=encoding, zarr_format=2, mode="w")
+    return xr.open_zarr(tmp_path / "out.zarr").load()
+
+
+def test_fixed_point(tmp_path):
+    lat = np.linspace(-10, 15, 10001)
+    lat[5] = np.nan
+    ds = xr.Dataset({"lat": ("time", lat)})
+
+    encoding = add_fixed_point(ds, {}, {"lat": 1e-6})
+    assert encoding["lat"]["dtype"] == "<i4"
+    assert encoding["lat"]["filters"]
+
+    result = _roundtrip(ds, encoding, tmp_path)
+    np.testing.assert_allclose(result.lat, lat, atol=5e-7, rtol=0)
+    assert np.isnan(result.lat[5])
+
+
+@pytest.mark.parametrize(
+    "values, dtype",
+    [
+        ([-12.7, 12.7, np.nan], "<i1"),
+        # -12.8 would be the reserved fill value of int8
+        ([-12.8, 12.7], "<i2"),
+        ([1.0, 2.0**40], "<i8"),
+    ],
+)
+def test_fixed_point_dtype(values, dtype):
+    da = xr.DataArray(np.array(values), dims="x", name="v")
+    assert fixed_point_encoding(da, 0.1 if dtype != "<i8" else 1.0)["dtype"] == dtype
+
+
+@pytest.mark.parametrize("values", [[2.0**63], [np.inf], [1e300]])
+def test_fixed_point_overflow(values):
+    da = xr.DataArray(np.array(values), dims="x", name="v")
+    with pytest.raises(ValueError):
+        fixed_point_encoding(da, 1.0)
+
+
+def test_time_encoding(tmp_path):
+    time = np.datetime64("2024-08-11T00:00") + np.arange(1000) * np.timedelta64(1, "s")
+    time = np.concatenate([time, [np.datetime64("NaT")]])
+    ds = xr.Dataset(coords={"time": ("time", time.astype("datetime64[ns]"))})
+
+    encoding = add_time_encoding(ds, {})
+    assert encoding["time"]["units"] == "seconds since 2024-08-11"
+    assert encoding["time"]["dtype"] == "<i2"
+
+    result = _roundtrip(ds, encoding, tmp_path)
+    np.testing.assert_array_equal(result.time.values, ds.time.values)
+
+
+def test_narrowing(tmp_path):
+    masked = xr.DataArray([1.0, np.nan, 300.0], dims="x")
+    masked.encoding = {"dtype": np.dtype("<i4")}
+    ds = xr.Dataset(
+        {
+            "count": ("x", np.array([0, 1, 200], dtype="i8")),
+            "masked": masked,
+            "single": ("x", np.array([0.5, 1.25, 2.0])),
+            "noisy": ("x", np.array([0.1, 0.2, 0.3])),
+        }
+    )
+
+    encoding = add_narrowing(ds, {})
+    assert encoding["count"]["dtype"] == np.dtype("<i2")
+    assert encoding["masked"]["dtype"] == np.dtype("<i2")
+    assert encoding["single"]["dtype"] == np.dtype("<f4")
+    assert "noisy" not in encoding
+
+    xr.testing.assert_identical(_roundtrip(ds, encoding, tmp_path), ds)
+
+
+def test_narrowing_keeps_cf_values():
+    da = xr.DataArray(np.array([1, 2], dtype="i8"), dims="x")
+    da.attrs["valid_max"] = 1000
+    assert narrow_encoding(da) == {"dtype": np.dtype("<i2")}
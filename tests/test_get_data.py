@@ -0,0 +1,163 @@
+import base64
+import hashlib
+import http.server
+import json
+import pathlib
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, str(pathlib.Path(__file__).parents[1] / "SEA-POL"))
+import get_data  # noqa: E402
+
+
+FILES = {
+    "/level4/a.nc": bytes(range(256)) * 1000,
+    "/level4/sub/b.nc": b"b" * 5000,
+}
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    files = {}
+    options = {}
+    requests = []
+
+    def log_message(self, *args):
+        pass
+
+    def _index(self):
+        prefix = self.path
+        names = {
+            p[len(prefix) :].split("/")[0] + ("/" if "/" in p[len(prefix) :] else "")
+            for p in self.files
+            if p.startswith(prefix)
+        }
+        links = "".join(f'<a href="{n}">{n}</a>' for n in sorted(names))
+        return f'<a href="../">Parent</a>{links}'.encode()
+
+    def _headers(self, data, status=200, offset=0):
+        self.send_response(status)
+        if "etag" in self.options:
+            self.send_header("ETag", self.options["etag"])
+        if "digest" in self.options:
+            digest = base64.b64encode(self.options["digest"]).decode()
+            self.send_header("Repr-Digest", f"sha-256=:{digest}:")
+        if status == 206:
+            self.send_header(
+                "Content-Range", f"bytes {offset}-{len(data) - 1}/{len(data)}"
+            )
+        if self.options.get("content_length", True):
+            self.send_header("Content-Length", str(len(data) - offset))
+        self.end_headers()
+
+    def _get(self, body):
+        if self.path.endswith("/"):
+            data = self._index()
+            self._headers(data)
+            return data if body else None
+
+        data = self.files[self.path]
+        offset = 0
+        if (
+            "Range" in self.headers
+            and self.options.get("ranges", True)
+            and self.headers.get("If-Range") == self.options.get("etag")
+        ):
+            offset = int(self.headers["Range"].removeprefix("bytes=").rstrip("-"))
+        self._headers(data, 206 if offset else 200, offset)
+        return data[offset:] if body else None
+
+    def do_HEAD(self):
+        self._get(body=False)
+
+    def do_GET(self):
+        self.requests.append((self.path, dict(self.headers)))
+        self.wfile.write(self._get(body=True))
+
+
+@pytest.fixture
+def server():
+    Handler.files = dict(FILES)
+    Handler.options = {"etag": '"v1"'}
+    Handler.requests = []
+    httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_port}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_fetch_all(server, tmp_path):
+    manifest = get_data.fetch_all(f"{server}/level4/", tmp_path, jobs=2)
+
+    assert (tmp_path / "a.nc").read_bytes() == FILES["/level4/a.nc"]
+    assert (tmp_path / "b.nc").read_bytes() == FILES["/level4/sub/b.nc"]
+    entry = manifest[f"{server}/level4/a.nc"]
+    assert entry["sha256"] == hashlib.sha256(FILES["/level4/a.nc"]).hexdigest()
+    with open(tmp_path / "download_manifest.json") as fp:
+        assert json.load(fp) == manifest
+
+    Handler.requests.clear()
+    get_data.fetch_all(f"{server}/level4/", tmp_path, jobs=2, verify=True)
+    assert not [path for path, _ in Handler.requests if path.endswith(".nc")]
+
+
+def _partial(tmp_path, data, validator):
+    (tmp_path / "a.nc.part").write_bytes(data[:1000])
+    with open(tmp_path / "a.nc.part.json", "w") as fp:
+        json.dump({"validator": validator}, fp)
+
+
+def test_resume(server, tmp_path):
+    _partial(tmp_path, FILES["/level4/a.nc"], '"v1"')
+
+    get_data.fetch(f"{server}/level4/a.nc", tmp_path)
+
+    ((_, headers),) = Handler.requests
+    assert headers["Range"] == "bytes=1000-"
+    assert headers["If-Range"] == '"v1"'
+    assert (tmp_path / "a.nc").read_bytes() == FILES["/level4/a.nc"]
+    assert not (tmp_path / "a.nc.part.json").exists()
+
+
+@pytest.mark.parametrize("validator", ['"v0"', None])
+def test_restart_changed_file(server, tmp_path, validator):
+    _partial(tmp_path, b"x" * len(FILES["/level4/a.nc"]), validator)
+
+    get_data.fetch(f"{server}/level4/a.nc", tmp_path)
+
+    ((_, headers),) = Handler.requests
+    assert "Range" not in headers
+    assert (tmp_path / "a.nc").read_bytes() == FILES["/level4/a.nc"]
+
+
+def test_restart_on_full_response(server, tmp_path):
+    Handler.options["ranges"] = False
+    _partial(tmp_path, FILES["/level4/a.nc"], '"v1"')
+
+    get_data.fetch(f"{server}/level4/a.nc", tmp_path)
+
+    assert (tmp_path / "a.nc").read_bytes() == FILES["/level4/a.nc"]
+
+
+def test_without_content_length(server, tmp_path):
+    Handler.options["content_length"] = False
+
+    entry, fetched = get_data.fetch(f"{server}/level4/a.nc", tmp_path)
+
+    assert fetched and entry["size"] is None
+    assert (tmp_path / "a.nc").read_bytes() == FILES["/level4/a.nc"]
+
+
+def test_digest(server, tmp_path):
+    Handler.options["digest"] = hashlib.sha256(FILES["/level4/a.nc"]).digest()
+    entry, _ = get_data.fetch(f"{server}/level4/a.nc", tmp_path)
+    assert entry["digest"] == entry["sha256"]
+
+    Handler.options["digest"] = hashlib.sha256(b"other").digest()
+    (tmp_path / "a.nc").unlink()
+    with pytest.raises(OSError, match="Checksum mismatch"):
+        get_data.fetch(f"{server}/level4/a.nc", tmp_path, retries=1)
+    assert not (tmp_path / "a.nc").exists()
@@ -0,0 +1,60 @@
+import pathlib
+import sys
+
+import numpy as np
+import orcestra.io
+import pytest
+import xarray as xr
+
+ROOT = pathlib.Path(__file__).parents[1]
+sys.path.insert(0, str(ROOT / "position_attitude"))
+import igi_reader  # noqa: E402
+
+
+def _table(path, skip_header, ncols, delimiter, rows=500):
+    """Write a position file that crosses midnight, with an empty field."""
+    rng = np.random.default_rng(0)
+    seconds = (86_300 + np.arange(rows) * 0.5) % 86_400
+    data = np.column_stack([seconds, rng.normal(size=(rows, ncols - 1)) * 100])
+
+    lines = [f"header line {i}" for i in range(skip_header)]
+    for row in data:
+        lines.append(delimiter.join(f"{v:.6f}" for v in row))
+    if delimiter == ",":
+        fields = lines[skip_header + 10].split(",")
+        fields[3] = ""
+        lines[skip_header + 10] = ",".join(fields)
+    path.write_text("\n".join(lines) + "\n")
+
+    return path
+
+
+@pytest.mark.parametrize("skip_header", [83, 99])
+def test_read_igi_matches_orcestra(tmp_path, skip_header):
+    txtfile = _table(tmp_path / "igi.txt", skip_header, 13, ",")
+
+    ds = igi_reader.read_igi(txtfile, "2024-08-11", skip_header=skip_header)
+
+    xr.testing.assert_identical(
+        ds, orcestra.io.read_igi(txtfile, "2024-08-11", skip_header=skip_header)
+    )
+    assert ds.IRS_ALT.isnull().sum() == 1
+    assert ds.time.diff("time").astype(int).min() > 0  # crossed midnight
+
+
+def test_read_bahamas_100hz_matches_orcestra(tmp_path):
+    txtfile = _table(tmp_path / "bahamas.txt", 80, 7, " ")
+
+    xr.testing.assert_identical(
+        igi_reader.read_bahamas_100hz(txtfile, "2024-08-11"),
+        orcestra.io.read_bahamas_100hz(txtfile, "2024-08-11"),
+    )
+
+
+def test_read_table_in_blocks(tmp_path):
+    txtfile = _table(tmp_path / "igi.txt", 83, 13, ",")
+
+    np.testing.assert_array_equal(
+        igi_reader.read_table(txtfile, 83, ",", 13, blocksize=100),
+        np.genfromtxt(txtfile, skip_header=83, delimiter=","),
+    )
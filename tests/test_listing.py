@@ -0,0 +1,137 @@
+import types
+
+import pytest
+
+from data2ipfs import listing
+
+
+class StubGateway:
+    """Gateway that lists a fixed tree of directories and counts requests."""
+
+    def __init__(self, tree):
+        self.tree = tree
+        self.requests = []
+
+    async def ls(self, path, session, detail=True):
+        self.requests.append(path)
+        entries = self.tree[path]
+        if detail:
+            return [
+                {"name": f"{path}/{name}", "type": kind, "size": 0}
+                for name, kind in entries.items()
+            ]
+        return [f"{path}/{name}" for name in entries]
+
+
+class StubIPFSFileSystem(listing.CachedIPFSFileSystem):
+    async def set_session(self):
+        return None  # all requests go to the stub gateway
+
+
+class StubIPNSFileSystem(listing.CachedIPNSFileSystem):
+    """IPNS file system whose name points to `root`."""
+
+    root = None
+    resolved = []
+
+    async def set_session(self):
+        return None
+
+    async def _info(self, path, **kwargs):
+        self.resolved.append(path)
+        return {"name": path, "CID": self.root, "type": "directory"}
+
+
+TREE = {
+    "bafyold": {"raw": "directory"},
+    "bafyold/raw": {"a.nc": "file"},
+    "bafynew": {"raw": "directory"},
+    "bafynew/raw": {"a.nc": "file", "b.nc": "file"},
+    "bafyflights": {"HALO-20240811a": "directory", "HALO-20240813a": "directory"},
+    "bafyflights/HALO-20240811a": {"x.nc": "file", "x.txt": "file"},
+    "bafyflights/HALO-20240813a": {"y.nc": "file"},
+}
+
+
+@pytest.fixture
+def gateway(monkeypatch):
+    gateway = StubGateway(TREE)
+    monkeypatch.setattr(listing, "get_gateway", lambda protocol, addr: gateway)
+    StubIPNSFileSystem.resolved = []
+    return gateway
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = types.SimpleNamespace(now=1_000_000.0)
+    clock.time = lambda: clock.now
+    monkeypatch.setattr(listing, "time", clock)
+    return clock
+
+
+def _ipfs(storage):
+    return StubIPFSFileSystem(cache_storage=str(storage), skip_instance_cache=True)
+
+
+def _ipns(storage, **kwargs):
+    return StubIPNSFileSystem(
+        cache_storage=str(storage), skip_instance_cache=True, **kwargs
+    )
+
+
+def test_ipfs_listings_are_never_refetched(tmp_path, gateway, clock):
+    assert _ipfs(tmp_path).ls("ipfs://bafynew/raw", detail=False) == [
+        "bafynew/raw/a.nc",
+        "bafynew/raw/b.nc",
+    ]
+    clock.now += 10 * listing.TTL
+    # Later runs use the listing on disk, with and without details
+    for _ in range(2):
+        fs = _ipfs(tmp_path)
+        assert fs.ls("bafynew/raw", detail=False) == [
+            "bafynew/raw/a.nc",
+            "bafynew/raw/b.nc",
+        ]
+        assert [e["type"] for e in fs.ls("bafynew/raw")] == ["file", "file"]
+    assert gateway.requests == ["bafynew/raw", "bafynew/raw"]
+
+
+def test_ipns_root_expires_after_ttl(tmp_path, gateway, clock):
+    StubIPNSFileSystem.root = "bafyold"
+    assert _ipns(tmp_path).ls("example.org/raw", detail=False) == [
+        "example.org/raw/a.nc"
+    ]
+
+    # A new root is only seen once the resolved one expired, in any run
+    StubIPNSFileSystem.root = "bafynew"
+    clock.now += listing.TTL - 1
+    assert _ipns(tmp_path).ls("example.org/raw", detail=False) == [
+        "example.org/raw/a.nc"
+    ]
+    assert StubIPNSFileSystem.resolved == ["example.org"]
+
+    clock.now += 2
+    assert _ipns(tmp_path).ls("example.org/raw", detail=False) == [
+        "example.org/raw/a.nc",
+        "example.org/raw/b.nc",
+    ]
+    assert StubIPNSFileSystem.resolved == ["example.org", "example.org"]
+
+    clock.now += 1
+    assert _ipns(tmp_path, ttl=0).ls("example.org/raw", detail=False)
+    assert len(StubIPNSFileSystem.resolved) == 3
+    assert gateway.requests == ["bafyold/raw", "bafynew/raw"]
+
+
+def test_glob_per_level(tmp_path, gateway, clock):
+    StubIPNSFileSystem.root = "bafyflights"
+    fs = _ipns(tmp_path)
+    assert fs.glob("example.org/HALO-2024????a/*.nc") == [
+        "example.org/HALO-20240811a/x.nc",
+        "example.org/HALO-20240813a/y.nc",
+    ]
+    assert sorted(gateway.requests) == [
+        "bafyflights",
+        "bafyflights/HALO-20240811a",
+        "bafyflights/HALO-20240813a",
+    ]
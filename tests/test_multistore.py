@@ -0,0 +1,42 @@
+import time
+
+import numpy as np
+import xarray as xr
+
+from data2ipfs import multistore
+from data2ipfs.multistore import open_stores
+
+
+def test_open_stores_in_order(tmp_path):
+    urls = []
+    for day in range(8):
+        urls.append(str(tmp_path / f"day{day}.zarr"))
+        xr.Dataset(
+            {"a": ("time", np.full(4, day))},
+            coords={"time": np.arange(4) + 4 * day},
+        ).to_zarr(urls[-1], zarr_format=2)
+
+    def slow_first(ds):
+        # The first stores finish last
+        time.sleep(0.02 * (8 - int(ds.a[0])))
+        return ds
+
+    datasets = open_stores(urls, preprocess=slow_first, max_workers=8)
+    assert [int(ds.a[0]) for ds in datasets] == list(range(8))
+    assert all(ds.a.chunks is not None for ds in datasets)  # lazy
+
+    xr.testing.assert_identical(
+        xr.concat(datasets, dim="time").load(),
+        xr.open_mfdataset(urls, engine="zarr").load(),
+    )
+
+
+class StubFileSystem:
+    def ls(self, path, detail=True):
+        return [f"{path}/.zattrs", f"{path}/.zgroup", f"{path}/.zmetadata"]
+
+
+def test_consolidated_metadata_from_listing(tmp_path, monkeypatch):
+    monkeypatch.setattr(multistore, "filesystem", lambda protocol: StubFileSystem())
+    assert multistore.has_consolidated_metadata("ipfs://bafyroot/a.zarr/")
+    assert multistore.has_consolidated_metadata(str(tmp_path / "a.zarr")) is None
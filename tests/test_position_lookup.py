@@ -0,0 +1,64 @@
+import pathlib
+import sys
+
+import numpy as np
+import xarray as xr
+
+from data2ipfs.timeindex import write_time_index
+
+ROOT = pathlib.Path(__file__).parents[1]
+sys.path.insert(0, str(ROOT / "position_attitude"))
+from position_lookup import PositionLookup, build_index  # noqa: E402
+
+
+def _flight(store, start, heading, lon, roll):
+    time = np.datetime64(start, "ns") + np.arange(len(heading)) * np.timedelta64(1, "s")
+    n = len(heading)
+    xr.Dataset(
+        {
+            "lat": ("time", np.linspace(10, 11, n), {"units": "degrees_north"}),
+            "lon": ("time", np.asarray(lon, dtype="f8"), {"units": "degrees_east"}),
+            "alt": ("time", np.full(n, 1e4)),
+            "roll": ("time", np.asarray(roll, dtype="f8")),
+            "pitch": ("time", np.zeros(n)),
+            "heading": ("time", np.asarray(heading, dtype="f8")),
+        },
+        coords={"time": time},
+    ).to_zarr(store, encoding={"lat": {"chunks": (2,)}}, zarr_format=2)
+    write_time_index(store)
+
+
+def test_heading_wraps_at_north(tmp_path):
+    _flight(
+        tmp_path / "HALO-20240811a.zarr",
+        "2024-08-11T12:00:00",
+        heading=[358, 359, 1, 3],
+        lon=[-1, -0.5, 0.5, 1],
+        roll=[-4, -2, 2, 4],
+    )
+    _flight(
+        tmp_path / "HALO-20240813a.zarr",
+        "2024-08-13T12:00:00",
+        heading=[1, 359],
+        lon=[-179, -178],
+        roll=[0, -8],
+    )
+    lookup = PositionLookup(build_index(str(tmp_path)))
+
+    times = np.array(
+        [
+            "2024-08-11T12:00:01.5",  # 359 -> 1
+            "2024-08-11T12:00:01.25",
+            "2024-08-11T12:00:02.5",
+            "2024-08-13T12:00:00.75",  # 1 -> 359
+            "2024-08-12T12:00:00",  # between flights
+        ],
+        dtype="datetime64[ns]",
+    )
+    ds = lookup(times)
+
+    np.testing.assert_allclose(ds.heading, [0, 359.5, 2, 359.5, np.nan])
+    # Other variables are neither interpolated along an arc nor wrapped
+    np.testing.assert_allclose(ds.lon, [0, -0.25, 0.75, -178.25, np.nan])
+    np.testing.assert_allclose(ds["roll"], [0, -1, 3, -6, np.nan])
+    assert ds.lon.attrs == {"units": "degrees_east"}
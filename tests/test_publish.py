@@ -0,0 +1,143 @@
+import io
+import os
+
+import pytest
+from ipfsspec.car import read_car
+from ipfsspec.unixfsv1 import Data, DataType, PBNode
+from multiformats import CID
+
+from data2ipfs import publish
+
+
+EMPTY_DIRECTORY = "bafybeiczsscdsbs7ffqz55asqdf3smv6klcw3gofszvwlyarci47bgf354"
+
+
+def _write(root, files):
+    for rel, data in files.items():
+        path = root / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+
+
+def _blocks(store):
+    """Return all blocks of a local directory by CID."""
+    tree = publish.local_tree(store, chunk_size=64)
+    blocks = {}
+    for rel, entry in tree.items():
+        if entry["type"] == "directory":
+            blocks[entry["cid"]] = entry["block"]
+            blocks.update(dict(entry["shards"]))
+        else:
+            path = os.path.join(store, rel)
+            for cid, block, _ in publish.file_blocks(path, chunk_size=64):
+                blocks[cid] = block
+
+    return tree, blocks
+
+
+def _links(cid, blocks):
+    if cid.codec.name == "raw":
+        return []
+    return [CID.decode(link.Hash) for link in PBNode.loads(blocks[cid]).Links]
+
+
+@pytest.fixture
+def remote(monkeypatch):
+    blocks = {}
+
+    class Remote(publish._Remote):
+        def __init__(self, protocol):
+            pass
+
+        def fetch(self, path, protocol="ipfs"):
+            cid = CID.decode(path)
+            return cid, blocks[cid]
+
+    monkeypatch.setattr(publish, "_Remote", Remote)
+    return blocks
+
+
+@pytest.mark.parametrize(
+    "data",
+    [b"", b"hello", b"0.0.0", bytes(range(16)), bytes(range(23)), b"x" * 100],
+)
+def test_murmur3(data):
+    expected = {
+        b"": 0,
+        b"hello": 0xCBD8A7B341BD9B02,
+        b"0.0.0": 0x12BCC4143FA6AA0E,
+        bytes(range(16)): 0x444924B591903F30,
+        bytes(range(23)): 0xB9A1376F153581DB,
+        b"x" * 100: 0x0404E50288596AE2,
+    }
+    assert publish.murmur3_64(data) == expected[data]
+
+
+def test_empty_directory(tmp_path):
+    tree = publish.local_tree(tmp_path)
+    assert str(tree[""]["cid"]) == EMPTY_DIRECTORY
+
+
+def test_file_blocks(tmp_path):
+    _write(tmp_path, {"a": bytes(range(256)) * 100})
+    *leaves, (root, block, tsize) = publish.file_blocks(tmp_path / "a", 1000)
+
+    node = PBNode.loads(block)
+    assert Data.loads(node.Data).filesize == 25600
+    assert tsize == len(block) + sum(len(b) for _, b, _ in leaves)
+    assert root.codec.name == "dag-pb"
+
+
+def test_sharded_directory(tmp_path, monkeypatch):
+    monkeypatch.setattr(publish, "SHARDING_THRESHOLD", 2**10)
+    names = [f"{i}.0" for i in range(300)]
+    _write(tmp_path, {name: name.encode() for name in names})
+
+    tree = publish.local_tree(tmp_path)
+    root = tree[""]
+    data = Data.loads(PBNode.loads(root["block"]).Data)
+    assert data.Type == DataType.HAMTShard
+    assert data.fanout == 256 and data.hashType == 0x22
+    assert root["shards"]
+
+    blocks = {root["cid"]: root["block"], **dict(root["shards"])}
+    remote = publish._Remote.__new__(publish._Remote)
+    remote.fetch = lambda path: (CID.decode(path), blocks[CID.decode(path)])
+    entries = remote.entries(root["cid"], root["block"])
+    assert entries == {name: tree[name]["cid"] for name in names}
+
+
+@pytest.mark.parametrize("threshold", [2**18, 2**9])
+def test_diff_and_car(tmp_path, remote, monkeypatch, threshold):
+    monkeypatch.setattr(publish, "SHARDING_THRESHOLD", threshold)
+    files = {f"x/{i}": bytes([i]) * 100 for i in range(40)}
+    files |= {".zattrs": b"{}", "y/0": b"y" * 1000, "z/0": b"z"}
+    _write(tmp_path / "old", files)
+    old, blocks = _blocks(tmp_path / "old")
+    remote.update(blocks)
+
+    files |= {"x/3": b"changed", "x/40": b"added", ".zattrs": b'{"a": 1}'}
+    del files["z/0"]
+    _write(tmp_path / "new", files)
+
+    tree, changes = publish.diff(
+        tmp_path / "new", f"ipfs://{old['']['cid']}", chunk_size=64
+    )
+    assert sorted(changes["added"]) == ["x/40"]
+    assert sorted(changes["changed"]) == [".zattrs", "x/3"]
+    assert changes["removed"] == ["z"]
+    assert sorted(changes["directories"]) == ["", "x"]
+
+    fp = io.BytesIO()
+    publish.write_car(fp, tmp_path / "new", tree, changes, chunk_size=64)
+    roots, car = read_car(fp.getvalue())
+    assert list(roots) == [tree[""]["cid"]]
+
+    # The CAR completes the new version on a node with the old one
+    available = {**blocks, **{cid: block for cid, block, _ in car}}
+    _, expected = _blocks(tmp_path / "new")
+    todo = [tree[""]["cid"]]
+    while todo:
+        cid = todo.pop()
+        assert available[cid] == expected[cid]
+        todo += _links(cid, available)
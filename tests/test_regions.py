@@ -0,0 +1,119 @@
+import hashlib
+import json
+import os
+import pathlib
+import subprocess
+import sys
+
+import numpy as np
+import xarray as xr
+
+from data2ipfs import regions
+
+
+ROOT = pathlib.Path(__file__).parents[1]
+SEA_POL = ROOT / "SEA-POL" / "sea_pol.py"
+
+sys.path.insert(0, str(SEA_POL.parent))
+import sea_pol  # noqa: E402
+
+
+def _digests(store):
+    return {
+        str(f.relative_to(store)): hashlib.sha256(f.read_bytes()).hexdigest()
+        for f in sorted(pathlib.Path(store).rglob("*"))
+        if f.is_file()
+    }
+
+
+def _level4(path):
+    rng = np.random.default_rng(0)
+    dbz = rng.normal(size=(1000, 20, 20)).astype("f4")
+    dbz[:300] = np.nan  # chunks that are not written at all
+    xr.Dataset(
+        {
+            "DBZ": (("time", "Y", "X"), dbz),
+            "elevation": ("time", rng.normal(size=1000)),
+        },
+        coords={"time": np.arange(1000), "Y": np.arange(20), "X": np.arange(20)},
+        attrs={"creator_name": "A and B"},
+    ).to_netcdf(path / "PICCOLO_level4_rainrate_2D.nc")
+
+
+def _sea_pol(*args, cwd):
+    subprocess.run(
+        [sys.executable, SEA_POL, *args],
+        cwd=cwd,
+        env={**os.environ, "PYTHONPATH": str(ROOT)},
+        check=True,
+        capture_output=True,
+    )
+
+
+def test_distributed_is_identical(tmp_path):
+    (tmp_path / "data").mkdir()
+    _level4(tmp_path / "data")
+
+    sea_pol.convert(
+        tmp_path / "data" / "PICCOLO_level4_rainrate_2D.nc", tmp_path / "single"
+    )
+
+    args = ("--data", "data", "--products", "distributed", "--distributed")
+    _sea_pol(*args, "plan", cwd=tmp_path)
+    workers = [
+        subprocess.Popen(
+            [sys.executable, SEA_POL, *args, "work"],
+            cwd=tmp_path,
+            env={**os.environ, "PYTHONPATH": str(ROOT)},
+            stdout=subprocess.PIPE,
+        )
+        for _ in range(4)
+    ]
+    written = 0
+    for worker in workers:
+        stdout, _ = worker.communicate()
+        assert worker.returncode == 0
+        written += int(stdout.split()[-2])
+
+    manifest = tmp_path / "distributed" / "PICCOLO_level4_rainrate_2D.regions.json"
+    with open(manifest) as fp:
+        assert written == len(json.load(fp)["regions"]) > 1
+    assert regions.status(manifest)["done"] == written
+
+    store = "PICCOLO_level4_rainrate_2D.zarr"
+    assert _digests(tmp_path / "distributed" / store) == _digests(
+        tmp_path / "single" / store
+    )
+
+
+def test_retry_failed_region(tmp_path):
+    ds = xr.Dataset({"a": (("time", "x"), np.arange(40.0).reshape(20, 2))})
+    encoding = {"a": {"chunks": (5, 2)}}
+    manifest = tmp_path / "out.regions.json"
+    assert (
+        regions.plan(ds, tmp_path / "out.zarr", manifest, encoding, zarr_format=2) == 4
+    )
+
+    broken = ds.rename(a="b")  # workers fail to find the variable
+    assert regions.work(broken, manifest, max_attempts=2) == 0
+    assert regions.status(manifest, max_attempts=2)["failed"] == 4
+
+    assert regions.work(ds, manifest, max_attempts=3) == 4
+    xr.testing.assert_identical(xr.open_zarr(tmp_path / "out.zarr").load(), ds)
+
+
+def test_stale_claim_is_released_once(tmp_path):
+    lock = tmp_path / "0.lock"
+    lock.touch()
+    os.utime(lock, (0, 0))
+    stale = lock.stat()
+
+    # The first worker releases the stale claim and claims the region again
+    assert regions._claim(tmp_path, 1, timeout=60, max_attempts=3) == 0
+    claim = lock.read_text()
+
+    # Another worker that found the same stale lock leaves the new claim alone
+    assert not regions._release_stale(tmp_path, 0, stale)
+    assert lock.read_text() == claim
+    assert regions._failures(tmp_path, 0) == 1
+    assert sorted(f.name for f in tmp_path.iterdir()) == ["0.failed-0", "0.lock"]
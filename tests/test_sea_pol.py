@@ -0,0 +1,57 @@
+import pathlib
+import sys
+
+import numpy as np
+import xarray as xr
+
+ROOT = pathlib.Path(__file__).parents[1]
+sys.path.insert(0, str(ROOT / "SEA-POL"))
+import sea_pol  # noqa: E402
+
+
+def _level4(path):
+    rng = np.random.default_rng(0)
+    dbz = rng.normal(size=(256, 20, 20)).astype("f4")
+    pid = rng.integers(0, 10, size=dbz.shape).astype("i2")
+    for values in (dbz, pid):
+        values[:128] = sea_pol.NOT_SCANNED  # two chunks along time
+        values[200:, :5] = sea_pol.NOT_SCANNED  # blanking sector
+        values[200:, -5:] = sea_pol.EMPTY
+
+    ncfile = path / "PICCOLO_level4_rainrate_2D.nc"
+    xr.Dataset(
+        {
+            "DBZ": (("time", "Y", "X"), dbz),
+            "PID": (("time", "Y", "X"), pid),
+            "elevation": ("time", rng.normal(size=256)),
+        },
+        coords={"time": np.arange(256), "Y": np.arange(20), "X": np.arange(20)},
+        attrs={"creator_name": "A and B"},
+    ).to_netcdf(ncfile)
+
+    return ncfile
+
+
+def test_not_scanned_reads_as_missing(tmp_path):
+    ncfile = _level4(tmp_path)
+    entry = sea_pol.convert(ncfile, tmp_path / "new")
+    assert entry["skipped_chunks"] == 4
+
+    # As written before "not scanned" was declared as _FillValue
+    ds = sea_pol.open_level4(ncfile)
+    encoding = sea_pol.get_encoding(ds)
+    for enc in encoding.values():
+        enc.pop("_FillValue", None)
+    ds.to_zarr(tmp_path / "old.zarr", encoding=encoding, zarr_format=2)
+
+    new = xr.open_zarr(entry["store"])
+    old = xr.open_zarr(tmp_path / "old.zarr")
+    for var in ("DBZ", "PID"):
+        not_scanned = old[var] == sea_pol.NOT_SCANNED
+        assert not_scanned.any()
+        xr.testing.assert_equal(new[var].isnull(), not_scanned)
+        xr.testing.assert_equal(
+            new[var].where(~not_scanned), old[var].where(~not_scanned)
+        )
+        assert new[var].attrs["comment"] == sea_pol.NOT_SCANNED_COMMENT
+    xr.testing.assert_identical(new.elevation, old.elevation)
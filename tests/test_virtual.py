@@ -0,0 +1,80 @@
+import json
+
+import fsspec
+import netCDF4
+import numpy as np
+import pytest
+import xarray as xr
+
+from data2ipfs.cidcache import CIDCacheFileSystem
+from data2ipfs.virtual import open_references, write_references
+
+
+@pytest.fixture(autouse=True)
+def cidcache(tmp_path, monkeypatch):
+    # Registered by the entry point of the installed package
+    fsspec.register_implementation("cidcache", CIDCacheFileSystem, clobber=True)
+    monkeypatch.setenv("DATA2IPFS_CACHE", str(tmp_path / "cache"))
+    CIDCacheFileSystem.clear_instance_cache()
+
+
+def _netcdf(path):
+    rng = np.random.default_rng(0)
+    with netCDF4.Dataset(path, "w") as nc:
+        nc.title = "thermosalinograph"
+        nc.createDimension("TIME", 100)
+        nc.createDimension("DEPTH", 4)
+
+        time = nc.createVariable("TIME", "f8", ("TIME",), contiguous=True)
+        time.units = "days since 1950-01-01"
+        time[:] = 27_000 + np.arange(100) / 1440 + 1e-7
+
+        temp = nc.createVariable(
+            "TEMP",
+            "f4",
+            ("TIME", "DEPTH"),
+            chunksizes=(16, 4),
+            zlib=True,
+            shuffle=True,
+            fletcher32=True,
+            fill_value=np.float32(-999),
+        )
+        temp.units = "degree_Celsius"
+        temp[:] = rng.normal(size=(100, 4))
+        temp[:10] = np.ma.masked
+
+        psal = nc.createVariable("PSAL", "f8", ("TIME",), contiguous=True)
+        psal[:] = rng.normal(size=100)
+
+        # Without a _FillValue and with chunks that are never written
+        cndc = nc.createVariable("CNDC", "i2", ("TIME",), chunksizes=(16,))
+        cndc[:20] = np.arange(20)
+
+        name = nc.createVariable("NAME", str, ("TIME",))
+        name[:] = np.array([f"station {i % 3}" for i in range(100)], dtype=object)
+
+
+def test_references_round_trip(tmp_path):
+    path = tmp_path / "tsal.nc"
+    _netcdf(path)
+
+    ds = xr.open_dataset(path)
+    ds.attrs["license"] = "CC-BY-4.0"
+    ds.TEMP.attrs["long_name"] = "sea water temperature"
+    ds["TIME"] = ds.TIME.dt.round("1s")
+
+    manifest = tmp_path / "tsal.zarr.json"
+    write_references(ds, str(path), manifest, inline=("TIME",))
+    with open(manifest) as fp:
+        refs = json.load(fp)["refs"]
+
+    # Chunks of the file are referenced, changed and vlen variables inlined
+    assert refs["TEMP/0.0"][0] == str(path)
+    assert refs["PSAL/0"][0] == str(path)
+    for var in ("TIME", "NAME", "CNDC"):
+        assert refs[f"{var}/0"].startswith("base64:")
+
+    virtual = open_references(str(manifest)).load()
+    xr.testing.assert_identical(virtual, ds.load())
+    assert virtual.TEMP[:10].isnull().all()
+    assert (virtual.CNDC[20:] == netCDF4.default_fillvals["i2"]).all()
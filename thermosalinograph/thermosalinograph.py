@@ -1,8 +1,13 @@
+import argparse
+
 import fsspec
 import numcodecs
 import numpy as np
 import xarray as xr
 
+from data2ipfs.encoding import add_time_encoding
+from data2ipfs.virtual import write_references
+
 
 def get_chunks(dimensions):
     match dimensions:
@@ -27,7 +32,7 @@ def get_encoding(dataset):
     numcodecs.blosc.set_nthreads(1)  # IMPORTANT FOR DETERMINISTIC CIDs
     codec = numcodecs.Blosc("zstd", shuffle=1, clevel=6)
 
-    return {
+    encoding = {
         var: {
             "chunks": get_chunks(dataset[var].dims),
             "compressor": codec,
@@ -36,29 +41,43 @@ def get_encoding(dataset):
         if var not in dataset.dims
     }
 
+    return add_time_encoding(dataset, encoding)
 
-def main():
-    cid = "Qmcc91KSJ18iZGzGzS1vcDfS2XGxVmhvRQtUEoeo6MwRSw"
+
+def main(virtual=False):
+    url = "ipfs://Qmcc91KSJ18iZGzGzS1vcDfS2XGxVmhvRQtUEoeo6MwRSw"
     ds = xr.open_dataset(
-        fsspec.open_local(f"simplecache::ipfs://{cid}"),
+        fsspec.open_local(f"cidcache::{url}"),
         engine="netcdf4",
         chunks={"time": -1},
-    ).load()
+    )
 
     # Round to original temporal resolution of 1-min (see ASCII data)
     ds = ds.assign_coords(
         TIME=(ds.TIME + np.timedelta64(500, "ms")).astype("datetime64[m]")
     )
-    ds.TIME.encoding["units"] = "minutes since 1970-01-01"
-    ds.TIME.encoding["dtype"] = "<i4"
 
     ds.attrs["references"] = ds.attrs["references"].replace("\n", "")
     ds.attrs["license"] = "CC-BY-4.0"
 
+    if virtual:
+        # The rounded times differ from the input and are stored in the manifest
+        write_references(ds, url, "met_203_1_tsal.zarr.json", inline=("TIME",))
+        return
+
+    ds = ds.load()
     ds.to_zarr(
         "met_203_1_tsal.zarr", mode="w", encoding=get_encoding(ds), zarr_format=2
     )
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(prog="thermosalinograph")
+    parser.add_argument(
+        "--virtual",
+        action="store_true",
+        help="write a reference manifest to the chunks of the input instead",
+    )
+    args = parser.parse_args()
+
+    main(virtual=args.virtual)
@@ -1,12 +1,14 @@
 import numcodecs
 import xarray as xr
 
+from data2ipfs.encoding import add_time_encoding
+
 
 def get_encoding(dataset):
     numcodecs.blosc.set_nthreads(1)  # IMPORTANT FOR DETERMINISTIC CIDs
     codec = numcodecs.Blosc("zstd", shuffle=1, clevel=6)
 
-    return {
+    encoding = {
         var: {
             "chunks": (2**18,),
             "compressor": codec,
@@ -16,6 +18,8 @@ def get_encoding(dataset):
         for var in dataset.variables
     }
 
+    return add_time_encoding(dataset, encoding)
+
 
 def main():
     ds = xr.open_dataset(